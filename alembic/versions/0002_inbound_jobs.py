@@ -0,0 +1,63 @@
+"""inbound jobs queue"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0002_inbound_jobs"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "inbound_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("instance_id", sa.String(), nullable=True),
+        sa.Column("sender", sa.String(), nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("wa_message_id", sa.String(), nullable=True),
+        sa.Column(
+            "status",
+            sa.Enum("pending", "running", "done", "failed", name="job_status"),
+            nullable=False,
+        ),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("available_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("locked_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_inbound_jobs_pending",
+        "inbound_jobs",
+        ["available_at", "id"],
+        unique=False,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+    op.create_index(
+        "ix_inbound_jobs_sender",
+        "inbound_jobs",
+        ["sender", "instance_id"],
+        unique=False,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+    op.create_index(
+        "uq_inbound_jobs_wa_id",
+        "inbound_jobs",
+        ["wa_message_id"],
+        unique=True,
+        postgresql_where=sa.text("wa_message_id IS NOT NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("uq_inbound_jobs_wa_id", table_name="inbound_jobs")
+    op.drop_index("ix_inbound_jobs_sender", table_name="inbound_jobs")
+    op.drop_index("ix_inbound_jobs_pending", table_name="inbound_jobs")
+    op.drop_table("inbound_jobs")
+    sa.Enum(name="job_status").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,21 @@
+"""conversation rolling summary"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0003_conversation_summary"
+down_revision = "0002_inbound_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("conversations", sa.Column("summary_text", sa.Text(), nullable=True))
+    op.add_column("conversations", sa.Column("summary_until_message_id", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("conversations", "summary_until_message_id")
+    op.drop_column("conversations", "summary_text")
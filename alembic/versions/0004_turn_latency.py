@@ -0,0 +1,39 @@
+"""turn latency ledger"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0004_turn_latency"
+down_revision = "0003_conversation_summary"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "turn_latency",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("conversation_id", sa.Integer(), nullable=False),
+        sa.Column("message_id", sa.Integer(), nullable=True),
+        sa.Column("received_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("debounce_fired_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("turn_started_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("turn_ended_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("first_sent_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("sent_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("agent_path", sa.String(), nullable=False),
+        sa.Column("inbound_count", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("outcome", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["conversation_id"], ["conversations.id"]),
+        sa.ForeignKeyConstraint(["message_id"], ["messages.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_turn_latency_received", "turn_latency", ["received_at"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_turn_latency_received", table_name="turn_latency")
+    op.drop_table("turn_latency")
@@ -0,0 +1,39 @@
+"""one open conversation per client"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0005_open_conversation_unique"
+down_revision = "0004_turn_latency"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # conversas abertas duplicadas (corrida da ingestao): fica so a mais recente de cada cliente
+    op.execute(
+        """
+        UPDATE conversations c
+        SET status = 'closed', updated_at = now()
+        WHERE c.status = 'open'
+          AND EXISTS (
+              SELECT 1 FROM conversations newer
+              WHERE newer.client_id = c.client_id
+                AND newer.status = 'open'
+                AND (newer.last_activity_at, newer.id) > (c.last_activity_at, c.id)
+          )
+        """
+    )
+    op.create_index(
+        "uq_conversations_client_open",
+        "conversations",
+        ["client_id"],
+        unique=True,
+        postgresql_where=sa.text("status = 'open'"),
+    )
+
+
+def downgrade():
+    op.drop_index("uq_conversations_client_open", table_name="conversations")
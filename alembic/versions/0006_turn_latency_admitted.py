@@ -0,0 +1,19 @@
+"""turn latency admission timestamp"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0006_turn_latency_admitted"
+down_revision = "0005_open_conversation_unique"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("turn_latency", sa.Column("admitted_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column("turn_latency", "admitted_at")
@@ -0,0 +1,80 @@
+"""Serializacao de turnos por conversa (um ator/caixa de entrada por conversa)."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class ActorStats:
+    """Contadores de turnos executados e agrupados."""
+
+    turns: int = 0
+    folded: int = 0
+    queued_behind_turn: int = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"turns": self.turns, "folded": self.folded, "queued_behind_turn": self.queued_behind_turn}
+
+
+class _Actor:
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.latest = 0
+        self.refs = 0
+
+
+class ConversationActors:
+    """
+    Garante no maximo um turno em andamento por conversa.
+
+    Pedidos de turno que chegam enquanto outro esta em execucao esperam na fila da
+    conversa (FIFO). Quando o turno atual termina, so o pedido mais recente roda: os
+    anteriores sao agrupados nele, pois o turno le o historico no momento em que comeca
+    e ja enxerga todas as mensagens que chegaram no meio. Como o envio acontece dentro
+    do turno, as respostas saem na ordem. O ator e descartado assim que fica ocioso.
+    """
+
+    def __init__(self) -> None:
+        self.stats = ActorStats()
+        self._actors: dict[Hashable, _Actor] = {}
+
+    def active(self) -> int:
+        """Quantidade de conversas com turno em andamento ou na fila."""
+        return len(self._actors)
+
+    def busy(self, key: Hashable) -> bool:
+        """Indica se a conversa tem turno em execucao."""
+        actor = self._actors.get(key)
+        return actor is not None and actor.lock.locked()
+
+    async def run(self, key: Hashable, turn: Callable[[], Awaitable[T]]) -> Optional[T]:
+        """Executa `turn` serializado na conversa; devolve None se foi agrupado em um turno posterior."""
+        actor = self._actors.get(key)
+        if actor is None:
+            actor = _Actor()
+            self._actors[key] = actor
+        actor.latest += 1
+        ticket = actor.latest
+        actor.refs += 1
+        if actor.lock.locked():
+            self.stats.queued_behind_turn += 1
+
+        try:
+            async with actor.lock:
+                if ticket != actor.latest:
+                    self.stats.folded += 1
+                    logger.debug("Turno agrupado no proximo da conversa", extra={"conversation_key": key})
+                    return None
+                self.stats.turns += 1
+                return await turn()
+        finally:
+            actor.refs -= 1
+            if actor.refs == 0 and self._actors.get(key) is actor:
+                del self._actors[key]
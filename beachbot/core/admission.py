@@ -0,0 +1,175 @@
+"""Controle de admissao dos turnos do LLM (limite de concorrencia + fila com prioridade)."""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERVIEW = 0
+PRIORITY_DEFAULT = 1
+
+
+class AdmissionRejected(Exception):
+    """Turno nao admitido (fila cheia ou espera acima do limite)."""
+
+
+@dataclass
+class AdmissionStats:
+    """Contadores de admissao e tempo de espera na fila."""
+
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    queued: int = 0
+    wait_sum: float = 0.0
+    max_wait: float = 0.0
+    recent_waits: deque = field(default_factory=lambda: deque(maxlen=512))
+
+    def record_wait(self, seconds: float) -> None:
+        self.queued += 1
+        self.wait_sum += seconds
+        self.max_wait = max(self.max_wait, seconds)
+        self.recent_waits.append(seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        waits = sorted(self.recent_waits)
+
+        def _pct(q: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(int(q * len(waits)), len(waits) - 1)] * 1000, 1)
+
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "queued": self.queued,
+            "avg_wait_ms": round(self.wait_sum / self.queued * 1000, 1) if self.queued else 0.0,
+            "p50_wait_ms": _pct(0.50),
+            "p95_wait_ms": _pct(0.95),
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+class AdmissionController:
+    """
+    Limita quantos turnos rodam ao mesmo tempo na rede de agentes.
+
+    Acima do limite, os pedidos esperam numa fila limitada ordenada por prioridade
+    (conversas no meio da entrevista passam na frente) e por ordem de chegada. Com a
+    fila cheia, um pedido de prioridade maior desloca o ultimo de prioridade menor;
+    caso contrario o proprio pedido e recusado com `AdmissionRejected`.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, *, max_wait: Optional[float] = None) -> None:
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.stats = AdmissionStats()
+        self._in_flight = 0
+        self._queue: list[list[Any]] = []
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        max_wait = float(os.getenv("TURN_QUEUE_TIMEOUT_SECONDS", "60"))
+        return cls(
+            max_concurrent=int(os.getenv("TURN_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.getenv("TURN_MAX_QUEUE", "32")),
+            max_wait=max_wait if max_wait > 0 else None,
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for entry in self._queue if not entry[2].done())
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            **self.stats.snapshot(),
+            "in_flight": self._in_flight,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
+
+    @asynccontextmanager
+    async def slot(self, *, priority: int = PRIORITY_DEFAULT) -> AsyncIterator[None]:
+        """Reserva uma vaga para o turno (espera na fila se necessario)."""
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int) -> None:
+        if self._in_flight < self.max_concurrent and not self.waiting:
+            self._in_flight += 1
+            self.stats.admitted += 1
+            return
+
+        if self.waiting >= self.max_queue and not self._displace(priority):
+            self.stats.rejected += 1
+            raise AdmissionRejected("fila de turnos cheia")
+
+        loop = asyncio.get_running_loop()
+        waiter: asyncio.Future = loop.create_future()
+        heapq.heappush(self._queue, [priority, next(self._seq), waiter])
+        started = time.monotonic()
+        try:
+            if self.max_wait is None:
+                await waiter
+            else:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            # a vaga pode ter chegado junto com o timeout: nesse caso aproveita
+            if not _granted(waiter):
+                waiter.cancel()
+                self.stats.timed_out += 1
+                raise AdmissionRejected("tempo de espera na fila esgotado") from None
+        except asyncio.CancelledError:
+            if _granted(waiter):
+                self._release()
+            else:
+                waiter.cancel()
+            raise
+        except AdmissionRejected:
+            self.stats.rejected += 1
+            raise
+
+        self.stats.admitted += 1
+        self.stats.record_wait(time.monotonic() - started)
+
+    def _displace(self, priority: int) -> bool:
+        """Recusa o ultimo pedido de prioridade menor para abrir espaco; devolve se conseguiu."""
+        candidates = [entry for entry in self._queue if not entry[2].done() and entry[0] > priority]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda entry: (entry[0], entry[1]))
+        victim[2].set_exception(AdmissionRejected("deslocado por conversa prioritaria"))
+        return True
+
+    def _release(self) -> None:
+        while self._queue:
+            _, _, waiter = heapq.heappop(self._queue)
+            if not waiter.done():
+                # repassa a vaga direto para o proximo da fila
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+
+def _granted(waiter: asyncio.Future) -> bool:
+    return waiter.done() and not waiter.cancelled() and waiter.exception() is None
@@ -0,0 +1,283 @@
+"""Cache semantico das respostas do Knowledge Agent (perguntas frequentes)."""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+from beachbot.core.router import normalize
+from beachbot.rag.embeddings import Embedder, openai_embedder
+from beachbot.rag.index import index_paths
+from beachbot.rag.retriever import knowledge_embeddings_path
+
+logger = logging.getLogger(__name__)
+
+# termos que mudam a resposta mesmo com perguntas quase identicas ("plano mensal" x "trimestral")
+FACET_WORDS = frozenset(
+    {
+        "diaria", "avulsa", "avulso", "mensal", "mensais", "bimestral", "trimestral", "trimestrais",
+        "semestral", "semestrais", "anual", "anuais",
+        "segunda", "terca", "quarta", "quinta", "sexta", "sabado", "sabados", "domingo", "domingos", "feriado", "feriados",
+        "manha", "tarde", "noite", "iniciante", "iniciantes", "intermediario", "avancado", "infantil", "kids", "adulto",
+        "adultos", "feminino", "masculino", "individual", "particular", "dupla", "grupo",
+        "beach", "tennis", "tenis", "volei", "futevolei",
+    }
+)
+# a pergunta fala da situacao do proprio usuario: a resposta nao vale para outra pessoa
+PERSONAL_WORDS = frozenset({"meu", "minha", "meus", "minhas", "comigo", "mim"})
+# cumprimentos (texto normalizado) que nao mudam o sentido da pergunta seguinte
+GREETINGS = (
+    "oi", "oii", "oiii", "ola", "opa", "ei", "e ai", "eai", "hey", "bom dia", "boa tarde", "boa noite",
+    "tudo bem", "tudo bom", "td bem", "como vai", "blz", "beleza",
+)
+_GREETING_RUN = re.compile(r"^(?:(?:%s)(?: |$))+" % "|".join(re.escape(g) for g in sorted(GREETINGS, key=len, reverse=True)))
+# "Oi, Maria! ..." -> resposta chama o usuario pelo nome
+_NAMED_GREETING = re.compile(
+    r"^\W*(?:oi|ola|olá|opa|ei|bom dia|boa tarde|boa noite|obrigad[oa])\W+(\w+)\s*[,!.]", re.IGNORECASE
+)
+
+
+def strip_greeting(text: str) -> str:
+    """Texto normalizado sem os cumprimentos do inicio ("oi, boa tarde! qual o valor" -> "qual o valor")."""
+    normalized = normalize(text)
+    match = _GREETING_RUN.match(normalized)
+    return normalized[match.end():].strip() if match else normalized
+
+
+def is_greeting(text: str) -> bool:
+    return bool(normalize(text)) and not strip_greeting(text)
+
+
+def standalone_question(history_messages: list[dict[str, str]]) -> Optional[str]:
+    """
+    Pergunta da rajada pendente que nao depende da conversa, ou None.
+
+    So ela pode ser chave global do cache: um seguimento ("e o trimestral?") so faz
+    sentido com o contexto da conversa. Antes da rajada pode haver apenas cumprimentos
+    do usuario e as respostas do bot a eles ("oi" / "Ola! Como posso ajudar?"); resumo
+    ou qualquer outra mensagem do usuario tornam a pergunta dependente do contexto.
+    Os cumprimentos saem da chave.
+    """
+    cut = len(history_messages)
+    while cut and history_messages[cut - 1]["role"] == "user":
+        cut -= 1
+    for message in history_messages[:cut]:
+        if message["role"] == "user" and is_greeting(message["content"]):
+            continue
+        if message["role"] != "assistant":
+            return None
+    question = " ".join(part for part in (strip_greeting(m["content"]) for m in history_messages[cut:]) if part)
+    return question or None
+
+
+def facets(text: str) -> frozenset[str]:
+    """Termos discriminantes da pergunta (periodos, dias, niveis, modalidades e numeros)."""
+    return frozenset(
+        token for token in normalize(text).split() if token in FACET_WORDS or any(ch.isdigit() for ch in token)
+    )
+
+
+def is_personal_question(question: str) -> bool:
+    return any(token in PERSONAL_WORDS for token in normalize(question).split())
+
+
+def names_user(answer: str, *, phone: Optional[str] = None) -> bool:
+    """Resposta dirigida a um usuario: chama pelo nome ou repete o telefone dele."""
+    match = _NAMED_GREETING.match(answer)
+    if match and match.group(1)[:1].isupper():
+        return True
+    digits = re.sub(r"\D", "", phone or "")
+    return len(digits) >= 8 and digits[-8:] in re.sub(r"\D", "", answer)
+
+
+@dataclass
+class AnswerCacheStats:
+    lookups: int = 0
+    hits: int = 0
+    stores: int = 0
+    personal: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    errors: int = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "stores": self.stores,
+            "personal": self.personal,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+@dataclass
+class _Entry:
+    question: str
+    facets: frozenset[str]
+    vector: np.ndarray
+    answer: str
+    created: float
+    hits: int = 0
+
+
+class AnswerCache:
+    """
+    Respostas do Knowledge Agent indexadas pelo embedding da pergunta normalizada.
+
+    Uma pergunta nova reaproveita a resposta guardada quando a similaridade de cosseno com
+    alguma pergunta anterior passa de `threshold` e os termos discriminantes (`facets`) sao
+    os mesmos. O cache e global, entao so entram perguntas que nao dependem da conversa
+    (`standalone_question`), que nao falam do proprio usuario e cuja resposta nao o chama
+    pelo nome; so guarda respostas do Knowledge Agent, e o handler nao consulta quando o
+    roteador apontou outro agente ou a conversa esta em entrevista. Entradas expiram apos `ttl` segundos e o
+    total e limitado por `max_entries` (LRU). A versao da base (mtime/tamanho do arquivo de
+    embeddings) e conferida a cada consulta: se o arquivo for regerado, o cache e esvaziado.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder],
+        *,
+        threshold: float = 0.93,
+        ttl: float = 86400.0,
+        max_entries: int = 500,
+        min_chars: int = 8,
+        kb_path: Optional[Path] = None,
+    ) -> None:
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.min_chars = min_chars
+        self.kb_path = kb_path
+        self.stats = AnswerCacheStats()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._kb_version = self._read_kb_version()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AnswerCache":
+        enabled = os.getenv("ANSWER_CACHE_ENABLED", "true").strip().lower() in {"1", "true", "yes", "on"}
+        embedder = None
+        if enabled:
+            try:
+                embedder = openai_embedder(os.getenv("ANSWER_CACHE_EMBED_MODEL", "text-embedding-3-small"))
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Cache de respostas desativado: %s", exc)
+        return cls(
+            embedder,
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.93")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400")),
+            max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "500")),
+            kb_path=knowledge_embeddings_path(),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.embedder is not None and self.max_entries > 0
+
+    def accepts(self, question: Optional[str]) -> bool:
+        if not self.enabled or not question or len(normalize(question)) < self.min_chars:
+            return False
+        return not is_personal_question(question)
+
+    async def embed(self, question: str) -> Optional[np.ndarray]:
+        """Vetor unitario da pergunta normalizada (None se o cache estiver desligado ou a API falhar)."""
+        if not self.accepts(question):
+            return None
+        try:
+            vector = np.asarray(await self.embedder(normalize(question)), dtype=np.float32)
+        except Exception as exc:  # noqa: BLE001
+            self.stats.errors += 1
+            logger.warning("Falha ao gerar embedding da pergunta: %s", exc)
+            return None
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def lookup(self, question: str, vector: Optional[np.ndarray]) -> Optional[str]:
+        """Resposta guardada para a pergunta mais parecida acima do limiar, com os mesmos termos discriminantes."""
+        if vector is None:
+            return None
+        wanted = facets(question)
+        with self._lock:
+            self.stats.lookups += 1
+            self._check_kb_version()
+            self._expire()
+            keys = [key for key, entry in self._entries.items() if entry.facets == wanted]
+            if not keys:
+                return None
+            matrix = np.stack([self._entries[key].vector for key in keys])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if float(scores[best]) < self.threshold:
+                return None
+            entry = self._entries[keys[best]]
+            entry.hits += 1
+            self._entries.move_to_end(keys[best])
+            self.stats.hits += 1
+            return entry.answer
+
+    def store(self, question: str, vector: Optional[np.ndarray], answer: str, *, phone: Optional[str] = None) -> None:
+        if vector is None or not answer or not self.accepts(question):
+            return
+        if names_user(answer, phone=phone):
+            self.stats.personal += 1
+            return
+        key = normalize(question)
+        with self._lock:
+            self._check_kb_version()
+            self._entries[key] = _Entry(
+                question=key, facets=facets(question), vector=vector, answer=answer, created=time.monotonic()
+            )
+            self._entries.move_to_end(key)
+            self.stats.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        for key in [key for key, entry in self._entries.items() if entry.created < cutoff]:
+            del self._entries[key]
+            self.stats.expirations += 1
+
+    def _read_kb_version(self) -> Optional[tuple[int, int]]:
+        if self.kb_path is None:
+            return None
+        # o indice .npy tem precedencia; o pickle legado vale enquanto nao for regerado
+        for path in (index_paths(self.kb_path)[0], self.kb_path):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            return (stat.st_mtime_ns, stat.st_size)
+        return None
+
+    def _check_kb_version(self) -> None:
+        version = self._read_kb_version()
+        if version != self._kb_version:
+            if self._entries:
+                logger.info("Base de conhecimento alterada; cache de respostas esvaziado")
+                self.stats.invalidations += 1
+            self._entries.clear()
+            self._kb_version = version
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**self.stats.snapshot(), "entries": len(self._entries), "enabled": self.enabled}
@@ -0,0 +1,142 @@
+"""Prazo por turno e tentativa paralela (hedge) quando a rede de agentes demora demais."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Uma tentativa do turno; recebe o modelo a usar (None = modelos configurados nos agentes)
+Attempt = Callable[[Optional[str]], Awaitable[T]]
+
+# Amostras minimas antes de usar o p95 observado como gatilho do hedge
+MIN_SAMPLES = 20
+
+
+class TurnDeadlineExceeded(Exception):
+    """O turno passou do prazo sem nenhuma tentativa concluir."""
+
+
+@dataclass
+class DeadlineStats:
+    """Turnos, prazos estourados e hedges (iniciados e vencedores)."""
+
+    turns: int = 0
+    deadline_hits: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    recent_durations: deque = field(default_factory=lambda: deque(maxlen=512))
+
+    def p95(self) -> Optional[float]:
+        if len(self.recent_durations) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.recent_durations)
+        return ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)]
+
+    def snapshot(self) -> dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "turns": self.turns,
+            "deadline_hits": self.deadline_hits,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 3) if self.hedges else 0.0,
+            "p95_turn_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class TurnDeadline:
+    """
+    Executa o turno com prazo total e, se ele passar do orcamento de p95, inicia uma segunda
+    tentativa (opcionalmente num modelo mais barato/rapido). A primeira que concluir vence e
+    a outra e cancelada; estourado o prazo, as duas sao canceladas e o turno falha com
+    `TurnDeadlineExceeded` (o handler responde com a mensagem de fallback).
+
+    O gatilho do hedge e fixo (`hedge_after`) ou o p95 dos turnos recentes, nunca abaixo de
+    `hedge_min`. Quem chama decide quando ha hedge e o que a segunda tentativa roda
+    (`hedge_attempt`, por padrao a mesma `attempt`): so turnos que nao podem chegar a
+    ferramentas que gravam dados, e nunca respostas ja sendo entregues (streaming).
+    """
+
+    def __init__(
+        self,
+        *,
+        turn_seconds: float = 60.0,
+        hedge_enabled: bool = True,
+        hedge_after: Optional[float] = None,
+        hedge_min: float = 4.0,
+        hedge_model: Optional[str] = None,
+    ) -> None:
+        self.turn_seconds = turn_seconds
+        self.hedge_enabled = hedge_enabled
+        self.fixed_hedge_after = hedge_after
+        self.hedge_min = hedge_min
+        self.hedge_model = hedge_model
+        self.stats = DeadlineStats()
+
+    @classmethod
+    def from_env(cls) -> "TurnDeadline":
+        hedge_after = os.getenv("TURN_HEDGE_AFTER_SECONDS", "").strip()
+        return cls(
+            turn_seconds=float(os.getenv("TURN_DEADLINE_SECONDS", "60")),
+            hedge_enabled=os.getenv("TURN_HEDGE_ENABLED", "true").lower() in {"1", "true", "yes"},
+            hedge_after=float(hedge_after) if hedge_after else None,
+            hedge_min=float(os.getenv("TURN_HEDGE_MIN_SECONDS", "4")),
+            hedge_model=os.getenv("TURN_HEDGE_MODEL", "").strip() or None,
+        )
+
+    def hedge_after(self) -> float:
+        """Segundos ate o hedge: fixo, p95 observado, ou metade do prazo enquanto faltam amostras."""
+        if self.fixed_hedge_after is not None:
+            return self.fixed_hedge_after
+        p95 = self.stats.p95()
+        return max(p95 if p95 is not None else self.turn_seconds / 2, self.hedge_min)
+
+    async def run(self, attempt: Attempt[T], *, hedge: bool = True, hedge_attempt: Optional[Attempt[T]] = None) -> T:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.stats.turns += 1
+        primary = asyncio.create_task(attempt(None))
+        hedged: Optional[asyncio.Task] = None
+        pending = {primary}
+        try:
+            delay = self.hedge_after()
+            if hedge and self.hedge_enabled and delay < self.turn_seconds:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    hedged = asyncio.create_task((hedge_attempt or attempt)(self.hedge_model))
+                    pending.add(hedged)
+                    self.stats.hedges += 1
+                    logger.info("Turno acima do p95; iniciando hedge", extra={"after_s": round(delay, 2)})
+            error: Optional[BaseException] = None
+            while pending:
+                remaining = started + self.turn_seconds - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        self.stats.recent_durations.append(loop.time() - started)
+                        if task is hedged:
+                            self.stats.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            if not pending and error is not None:
+                raise error
+            self.stats.deadline_hits += 1
+            raise TurnDeadlineExceeded(f"turno sem resposta em {self.turn_seconds:g}s")
+        finally:
+            for task in (primary, hedged):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**self.stats.snapshot(), "hedge_after_s": round(self.hedge_after(), 2), "deadline_s": self.turn_seconds}
@@ -0,0 +1,166 @@
+"""Agendador de debounce por conversa (agrupa rajadas de mensagens em um turno)."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import statistics
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Hashable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DebounceStats:
+    """Contadores de agrupamento de mensagens por turno."""
+
+    messages: int = 0
+    turns: int = 0
+    last_batch: int = 0
+    max_batch: int = 0
+    delay_sum: float = 0.0
+
+    @property
+    def merged(self) -> int:
+        """Mensagens que nao geraram turno proprio (foram agrupadas)."""
+        return max(self.messages - self.turns, 0)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "turns": self.turns,
+            "merged": self.merged,
+            "last_batch": self.last_batch,
+            "max_batch": self.max_batch,
+            "avg_batch": round(self.messages / self.turns, 2) if self.turns else 0.0,
+            "avg_delay_s": round(self.delay_sum / self.messages, 2) if self.messages else 0.0,
+        }
+
+
+@dataclass
+class AdaptiveWindow:
+    """
+    Calcula a janela de debounce a partir do ritmo de digitacao do remetente.
+
+    Usa os intervalos entre mensagens do usuario ja gravadas (`Message.ts`):
+    - remetente novo (pouco historico): janela padrao;
+    - quem costuma mandar uma mensagem so (sem rajadas no historico): janela minima;
+    - quem digita em rajadas: mediana dos intervalos da rajada * `factor`.
+    Se a mensagem atual chegou logo apos a anterior (rajada em andamento), a janela
+    e estendida para cobrir o intervalo atual. O resultado fica entre min e max.
+    """
+
+    min_seconds: float = 3.0
+    max_seconds: float = 15.0
+    default_seconds: float = 15.0
+    factor: float = 2.0
+    min_samples: int = 3
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveWindow":
+        default = float(os.getenv("BUFFER_WINDOW_SECONDS", "15"))
+        return cls(
+            min_seconds=float(os.getenv("BUFFER_MIN_SECONDS", "3")),
+            max_seconds=float(os.getenv("BUFFER_MAX_SECONDS", str(default))),
+            default_seconds=default,
+        )
+
+    def compute(self, timestamps: Sequence[datetime]) -> float:
+        """Janela (em segundos) para a mensagem mais recente de `timestamps`."""
+        ordered = sorted(timestamps)
+        gaps = [(later - earlier).total_seconds() for earlier, later in zip(ordered, ordered[1:])]
+        if not gaps:
+            return self._clamp(self.default_seconds)
+
+        current = gaps[-1]
+        history = gaps[:-1]
+        burst_gaps = [gap for gap in history if gap <= self.max_seconds]
+        if len(history) < self.min_samples:
+            window = self.default_seconds
+        elif not burst_gaps:
+            window = self.min_seconds
+        else:
+            window = statistics.median(burst_gaps) * self.factor
+
+        if current <= self.max_seconds:
+            window = max(window, current * self.factor)
+        return self._clamp(window)
+
+    def _clamp(self, value: float) -> float:
+        return min(max(value, self.min_seconds), self.max_seconds)
+
+
+@dataclass
+class _Slot:
+    waiter: asyncio.Future
+    timer: asyncio.TimerHandle
+    count: int = 0
+
+
+class DebounceScheduler:
+    """
+    Mantem um unico timer reiniciavel por conversa.
+
+    Cada mensagem chama `wait(chave)`. A mensagem anterior da mesma conversa e
+    liberada na hora com 0 (foi agrupada) e o timer recomeca; quando a janela de
+    silencio termina, apenas a ultima chamada recebe o total de mensagens do lote.
+    O estado vive no processo: com varios workers uvicorn, cada um agrupa so o que recebeu.
+    """
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.stats = DebounceStats()
+        self._slots: dict[Hashable, _Slot] = {}
+
+    def pending(self) -> int:
+        """Quantidade de conversas com janela aberta."""
+        return len(self._slots)
+
+    async def wait(self, key: Hashable, *, delay: Optional[float] = None) -> int:
+        """
+        Aguarda a janela de silencio da conversa.
+
+        Retorna o numero de mensagens agrupadas no turno, ou 0 quando uma mensagem
+        mais recente assumiu o turno.
+        """
+        loop = asyncio.get_running_loop()
+        delay = self.delay if delay is None else delay
+        self.stats.messages += 1
+        self.stats.delay_sum += delay
+
+        slot = self._slots.get(key)
+        count = 1
+        if slot is not None:
+            slot.timer.cancel()
+            if not slot.waiter.done():
+                slot.waiter.set_result(0)
+            count = slot.count + 1
+
+        waiter: asyncio.Future = loop.create_future()
+        timer = loop.call_later(delay, self._fire, key, waiter)
+        self._slots[key] = _Slot(waiter=waiter, timer=timer, count=count)
+
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            current = self._slots.get(key)
+            if current is not None and current.waiter is waiter:
+                current.timer.cancel()
+                self._slots.pop(key, None)
+            raise
+
+    def _fire(self, key: Hashable, waiter: asyncio.Future) -> None:
+        slot = self._slots.get(key)
+        if slot is None or slot.waiter is not waiter:
+            return
+        del self._slots[key]
+        if waiter.done():
+            return
+
+        self.stats.turns += 1
+        self.stats.last_batch = slot.count
+        self.stats.max_batch = max(self.stats.max_batch, slot.count)
+        logger.debug("Janela de debounce encerrada", extra={"conversation_key": key, "batch": slot.count})
+        waiter.set_result(slot.count)
@@ -1,23 +1,52 @@
 """Orquestra a interacao entre o webhook/CLI e a rede AtendentePro."""
 from __future__ import annotations
 
-import asyncio
 import logging
 import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Optional
 
-from beachbot.network import build_network, run_turn_async
+from beachbot.core.actors import ConversationActors
+from beachbot.core.admission import PRIORITY_DEFAULT, PRIORITY_INTERVIEW, AdmissionController, AdmissionRejected
+from beachbot.core.answer_cache import AnswerCache, standalone_question
+from beachbot.core.deadline import TurnDeadline, TurnDeadlineExceeded
+from beachbot.core.debounce import AdaptiveWindow, DebounceScheduler
+from beachbot.core.history import HistoryBudget, SummaryRefresher, build_history
+from beachbot.core.presence import DuplicateTracker, Presence, PresencePolicy, PresenceStats, TypingIndicator
+from beachbot.core.router import KeywordRouter
+from beachbot.core.streaming import StreamPolicy, StreamStats, TurnClock
+from beachbot.network import (
+    TurnResult,
+    build_network,
+    find_agent,
+    run_turn_async,
+    run_turn_detailed,
+    run_turn_streamed,
+    summarize_history_async,
+)
+from beachbot.rag.retriever import get_retriever, peek_retriever
+from beachbot.utils.metrics import STAGE_SECONDS, TURNS
 from beachbot.utils.redact import mask_phone
 
 try:
-    from beachbot.storage import db as storage
+    from beachbot.storage import async_db as storage
+    from beachbot.storage.history_cache import history_cache
 except Exception:  # noqa: BLE001
     storage = None
+    history_cache = None
 
 logger = logging.getLogger(__name__)
 
+Deliver = Callable[[str], Awaitable[Optional[bool]]]
+
 FALLBACK_MESSAGE = "Tive um problema aqui, ja ja um atendente te responde."
+BUSY_MESSAGE = "Recebi sua mensagem! Estamos com muitos atendimentos agora, ja ja te respondo."
+INTERVIEW_AGENT = "Interview Agent"
+KNOWLEDGE_AGENT = "Knowledge Agent"
+# Conversas lembradas como "em entrevista" para priorizar na fila de turnos
+INTERVIEW_TRACK_LIMIT = 10_000
 
 
 class HandlerError(Exception):
@@ -31,6 +60,23 @@ class MessageHandler:
         self.network = network
         self.fallback_message = fallback_message
         self.storage_enabled = bool(os.getenv("DATABASE_URL")) and storage is not None and storage.has_engine()
+        self.window = AdaptiveWindow.from_env()
+        self.debouncer = DebounceScheduler(self.window.default_seconds)
+        self.actors = ConversationActors()
+        self.admission = AdmissionController.from_env()
+        self.deadline = TurnDeadline.from_env()
+        self.history_budget = HistoryBudget.from_env()
+        self.summaries = SummaryRefresher(storage, summarize_history_async)
+        self.router = KeywordRouter.from_config()
+        self.answer_cache = AnswerCache.from_env()
+        self.streaming = StreamPolicy.from_env()
+        self.stream_stats = StreamStats()
+        self.presence = PresencePolicy.from_env()
+        self.presence_stats = PresenceStats()
+        self.duplicates = DuplicateTracker.from_env()
+        self._interviewing: OrderedDict[int, None] = OrderedDict()
+        # chegada da primeira mensagem ainda sem resposta, por conversa (registro de latencia)
+        self._arrivals: OrderedDict[int, datetime] = OrderedDict()
 
     @classmethod
     def create(cls, *, triage_mode: str = "prompt", fallback_message: str = FALLBACK_MESSAGE) -> "MessageHandler":
@@ -45,15 +91,25 @@ class MessageHandler:
         message_id: Optional[str] = None,
         instance_id: Optional[str] = None,
         history: Optional[list[dict[str, str]]] = None,
+        deliver: Optional[Deliver] = None,
+        presence: Optional[Presence] = None,
+        replay: bool = False,
     ) -> Optional[str]:
         """
         Processa texto de usuario e retorna resposta do bot.
 
         Se ocorrer erro, devolve fallback amigavel (sem levantar excecao).
         O histórico (se fornecido) é atualizado in-place com os turnos.
+        Se `deliver` for informado, toda resposta devolvida tambem e entregue por ele;
+        no modo com persistencia a entrega acontece dentro do turno serializado da
+        conversa, preservando a ordem de envio.
+        `presence` envia o "digitando..." para o usuario: e renovado do momento em que a
+        janela de silencio fecha (inicio do turno) ate a resposta ser entregue.
+        `replay=True` (job reprocessado da fila) segue para o turno mesmo se a mensagem
+        ja estiver gravada.
         """
         if not text:
-            return self.fallback_message
+            return await self._deliver(self.fallback_message, deliver)
 
         # Se storage estiver habilitado, persiste no Postgres e usa historico do banco.
         if self.storage_enabled and storage is not None:
@@ -61,62 +117,184 @@ class MessageHandler:
             convo_id: Optional[int] = None
             client_id: Optional[int] = None
             try:
-                # Sessao A: persiste a mensagem de entrada
-                session_a = storage.get_session()
-                try:
-                    client = storage.get_or_create_client(session_a, instance_id, sender, ts=ts_msg)
-                    client_id = client.id
-                    convo = storage.get_or_create_open_conversation(session_a, client.id, ts=ts_msg)
-                    convo_id = convo.id
-                    storage.save_message(
-                        session_a,
-                        convo.id,
-                        role="user",
-                        direction="in",
-                        text=text,
-                        ts=ts_msg,
-                        wa_message_id=message_id,
-                    )
-                finally:
-                    session_a.close()
-
-                # Aguarda janela de 15s para agrupar mensagens subsequentes (sem sessao aberta)
-                await asyncio.sleep(15)
-
-                # Sessao B: verifica se chegou mensagem mais recente e responde
-                session_b = storage.get_session()
-                try:
-                    last_activity = (
-                        session_b.query(storage.Conversation.last_activity_at)
-                        .filter(storage.Conversation.id == convo_id)
-                        .scalar()
+                # Sessao A: persiste a mensagem de entrada (cliente, conversa e mensagem em uma ida ao banco)
+                async with storage.get_session() as session_a:
+                    client_id, convo_id, stored_id = await storage.ingest_message(
+                        session_a, instance_id, sender, text, ts=ts_msg, wa_message_id=message_id
                     )
-                    if last_activity and last_activity > ts_msg:
+                    if stored_id is None and not replay:
+                        logger.info(
+                            "Mensagem duplicada ignorada (reentrega do webhook)",
+                            extra={"sender_masked": mask_phone(sender), "message_id": message_id},
+                        )
                         return None
+                    if stored_id is not None:
+                        self.duplicates.observe(
+                            convo_id,
+                            text,
+                            busy=self.actors.busy(convo_id),
+                            interviewing=convo_id in self._interviewing,
+                        )
+                        self._arrivals.setdefault(convo_id, ts_msg)
+                        while len(self._arrivals) > INTERVIEW_TRACK_LIMIT:
+                            self._arrivals.popitem(last=False)
+                    recent_ts = await storage.fetch_recent_user_timestamps(session_a, client_id)
+
+                # Aguarda a janela de silencio da conversa (sem sessao aberta); so a
+                # ultima mensagem da rajada segue para o turno.
+                with STAGE_SECONDS.time("debounce_wait"):
+                    batch = await self.debouncer.wait(convo_id, delay=self.window.compute(recent_ts))
+                if not batch:
+                    return None
+                fired_at = datetime.now(timezone.utc)
 
-                    history_messages = storage.fetch_last_messages(session_b, convo_id, limit=20)
-                    reply = await run_turn_async(self.network, history_messages)
-                    storage.save_message(
-                        session_b,
-                        convo_id,
-                        role="assistant",
-                        direction="out",
-                        text=reply,
-                        ts=datetime.now(timezone.utc),
-                        wa_message_id=None,
+                async def _turn() -> str:
+                    clock = TurnClock()
+                    received_at = self._arrivals.pop(convo_id, ts_msg)
+                    send = clock.wrap(deliver) if deliver is not None else None
+                    typing = TypingIndicator(
+                        presence if self.presence.enabled else None,
+                        refresh_seconds=self.presence.refresh_seconds,
+                        stats=self.presence_stats,
                     )
-                    if client_id is not None:
-                        storage.touch_client_last_seen(session_b, client_id, datetime.now(timezone.utc))
-                    return reply
-                finally:
-                    session_b.close()
+                    self.duplicates.turn_started(convo_id)
+                    # "digitando..." logo que a rajada fecha, antes de historico, cache e fila
+                    typing.start()
+                    try:
+                        # Sessao B: monta historico e responde
+                        async with storage.get_session() as session_b:
+                            with STAGE_SECONDS.time("history"):
+                                turn_history = await build_history(
+                                    storage, session_b, convo_id, budget=self.history_budget
+                                )
+                            history_messages = turn_history.messages
+                            pending = _pending_user_messages(history_messages)
+                            question = " ".join(pending)
+                            start_agent = self._route(convo_id, question)
+                            to_knowledge = getattr(start_agent, "name", None) == KNOWLEDGE_AGENT
+                            # cache global: pergunta sem contexto da conversa (alem de cumprimentos),
+                            # fora de entrevista e que o roteador nao mandou para outro agente
+                            cacheable = convo_id not in self._interviewing and (start_agent is None or to_knowledge)
+                            cache_key = standalone_question(history_messages) if cacheable else None
+                            vector = None
+                            cached = None
+                            admitted_at: Optional[datetime] = None
+                            if self.answer_cache.accepts(cache_key):
+                                vector = await self.answer_cache.embed(cache_key)
+                                cached = self.answer_cache.lookup(cache_key, vector)
+                            if cached is not None:
+                                # FAQ ja respondida: dispensa RAG e a vaga na fila de turnos
+                                result = TurnResult(cached, KNOWLEDGE_AGENT)
+                            else:
+                                try:
+                                    async with self.admission.slot(priority=self._priority(convo_id)):
+                                        started = time.monotonic()
+                                        admitted_at = datetime.now(timezone.utc)
+                                        # o turno inteiro usa a mesma versao do indice (hot reload)
+                                        with get_retriever().pin():
+                                            if self.streaming.enabled and send is not None:
+                                                # paragrafos saem enquanto o agente ainda escreve;
+                                                # sem hedge (o que ja saiu nao pode ser refeito)
+                                                result = await self.deadline.run(
+                                                    lambda model: run_turn_streamed(
+                                                        self.network,
+                                                        history_messages,
+                                                        send,
+                                                        start_agent=start_agent,
+                                                        max_messages=self.streaming.max_messages,
+                                                        min_chars=self.streaming.min_chars,
+                                                        model=model,
+                                                    ),
+                                                    hedge=False,
+                                                )
+                                            else:
+                                                # segunda tentativa so quando o roteador ja apontou o
+                                                # Knowledge, e sem handoffs: a triagem pode levar a
+                                                # entrevista/escalonamento, que gravam dados
+                                                result = await self.deadline.run(
+                                                    lambda model: run_turn_detailed(
+                                                        self.network,
+                                                        history_messages,
+                                                        start_agent=start_agent,
+                                                        model=model,
+                                                    ),
+                                                    hedge=to_knowledge,
+                                                    hedge_attempt=lambda model: run_turn_detailed(
+                                                        self.network,
+                                                        history_messages,
+                                                        start_agent=start_agent,
+                                                        model=model,
+                                                        handoffs=False,
+                                                    ),
+                                                )
+                                        elapsed = time.monotonic() - started
+                                        STAGE_SECONDS.observe(elapsed, "agents")
+                                        self.router.stats.record_latency(
+                                            routed=start_agent is not None,
+                                            agent=result.last_agent,
+                                            seconds=elapsed,
+                                        )
+                                except AdmissionRejected as exc:
+                                    # Modo degradado: avisa o usuario sem gravar, a pergunta segue
+                                    # no historico e sera respondida no proximo turno.
+                                    logger.warning(
+                                        "Turno nao admitido: %s",
+                                        exc,
+                                        extra={"sender_masked": mask_phone(sender), "conversation_id": convo_id},
+                                    )
+                                    TURNS.inc("busy")
+                                    return await self._deliver(BUSY_MESSAGE, send)
+                                if result.last_agent == KNOWLEDGE_AGENT and cache_key is not None:
+                                    self.answer_cache.store(cache_key, vector, result.text, phone=sender)
+                            ended_at = datetime.now(timezone.utc)
+                            self._track_agent(convo_id, result.last_agent)
+                            reply = result.text
+                            saved = await storage.save_message(
+                                session_b,
+                                convo_id,
+                                role="assistant",
+                                direction="out",
+                                text=reply,
+                                ts=datetime.now(timezone.utc),
+                                wa_message_id=None,
+                            )
+                            if client_id is not None:
+                                await storage.touch_client_last_seen(session_b, client_id, datetime.now(timezone.utc))
+                        if not result.delivered:
+                            await self._deliver(reply, send)
+                        # resumo das mensagens que sairam do orcamento: fora do caminho da resposta
+                        self.summaries.schedule(turn_history.pending_summary)
+                        self.stream_stats.record(clock, streamed=result.delivered)
+                        outcome = "cached" if cached is not None else "streamed" if result.delivered else "answered"
+                        TURNS.inc(outcome)
+                        await self._record_latency(
+                            conversation_id=convo_id,
+                            message_id=saved.id,
+                            received_at=received_at,
+                            debounce_fired_at=fired_at,
+                            turn_started_at=clock.started_at,
+                            admitted_at=admitted_at,
+                            turn_ended_at=ended_at,
+                            first_sent_at=clock.first_sent_at,
+                            sent_at=clock.acked_at,
+                            agent_path="cache" if cached is not None else _agent_path(result),
+                            inbound_count=max(len(pending), 1),
+                            outcome=outcome,
+                        )
+                        return reply
+                    finally:
+                        await typing.stop()
+
+                # Um turno por vez na conversa; pedidos que chegam no meio viram o proximo turno.
+                return await self.actors.run(convo_id, _turn)
             except Exception as exc:  # noqa: BLE001
+                TURNS.inc("deadline" if isinstance(exc, TurnDeadlineExceeded) else "error")
                 logger.exception(
                     "Erro ao processar mensagem com persistencia",
                     exc_info=exc,
                     extra={"sender_masked": mask_phone(sender), "message_id": message_id, "instance_id": instance_id},
                 )
-                return self.fallback_message
+                return await self._deliver(self.fallback_message, deliver)
 
         # Sem storage: usa historico em memoria (CLI/legado)
         messages = list(history or [])
@@ -130,14 +308,86 @@ class MessageHandler:
                 exc_info=exc,
                 extra={"sender_masked": mask_phone(sender), "message_id": message_id, "instance_id": instance_id},
             )
-            return self.fallback_message
+            return await self._deliver(self.fallback_message, deliver)
 
         if history is not None:
             messages.append({"role": "assistant", "content": reply})
             history[:] = messages
 
+        return await self._deliver(reply, deliver)
+
+    def _route(self, convo_id: int, question: str) -> Optional[Any]:
+        """Agente de destino pelo atalho de palavras-chave, ou None para passar pela triagem."""
+        # no meio da entrevista a resposta do usuario pertence ao fluxo em curso
+        if convo_id in self._interviewing or not question:
+            return None
+        decision = self.router.route(question)
+        agent = find_agent(self.network, decision.agent) if decision.agent else None
+        if decision.agent and agent is None:
+            decision.agent, decision.reason = None, "unknown_agent"
+        self.router.stats.record(decision)
+        return agent
+
+    def _priority(self, convo_id: int) -> int:
+        return PRIORITY_INTERVIEW if convo_id in self._interviewing else PRIORITY_DEFAULT
+
+    def _track_agent(self, convo_id: int, last_agent: Optional[str]) -> None:
+        if last_agent == INTERVIEW_AGENT:
+            self._interviewing[convo_id] = None
+            self._interviewing.move_to_end(convo_id)
+            while len(self._interviewing) > INTERVIEW_TRACK_LIMIT:
+                self._interviewing.popitem(last=False)
+        else:
+            self._interviewing.pop(convo_id, None)
+
+    async def _record_latency(self, **fields: Any) -> None:
+        """Grava a linha do tempo do turno (depois do envio, fora do caminho da resposta)."""
+        try:
+            async with storage.get_session() as session:
+                await storage.save_turn_latency(session, **fields)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(
+                "Falha ao gravar latencia do turno: %s", exc, extra={"conversation_id": fields.get("conversation_id")}
+            )
+
+    @staticmethod
+    async def _deliver(reply: str, deliver: Optional[Deliver]) -> str:
+        if deliver is not None:
+            await deliver(reply)
         return reply
 
+    def stats(self) -> dict[str, Any]:
+        """Contadores em memoria do handler (expostos em /stats)."""
+        return {
+            "debounce": {**self.debouncer.stats.snapshot(), "pending": self.debouncer.pending()},
+            "actors": {**self.actors.stats.snapshot(), "active": self.actors.active()},
+            "admission": self.admission.snapshot(),
+            "deadline": self.deadline.snapshot(),
+            "router": self.router.stats.snapshot(),
+            "answer_cache": self.answer_cache.snapshot(),
+            "presence": {"enabled": self.presence.enabled, **self.presence_stats.snapshot()},
+            "duplicates": self.duplicates.stats.snapshot(),
+            "streaming": {"enabled": self.streaming.enabled, **self.stream_stats.snapshot()},
+            "rag": retriever.snapshot() if (retriever := peek_retriever()) is not None else {},
+            "history_cache": history_cache.snapshot() if history_cache is not None else {},
+            "history_summary": self.summaries.snapshot(),
+        }
+
+
+def _pending_user_messages(history_messages: list[dict[str, str]]) -> list[str]:
+    """Mensagens do usuario ainda sem resposta (a rajada do turno), em ordem."""
+    pending: list[str] = []
+    for message in reversed(history_messages):
+        if message["role"] != "user":
+            break
+        pending.append(message["content"])
+    return list(reversed(pending))
+
+
+def _agent_path(result: TurnResult) -> str:
+    """Agentes percorridos na rodada ("Triage Agent > Knowledge Agent")."""
+    return " > ".join(result.agents) or result.last_agent or "?"
+
 
 def create_handler(*, triage_mode: str = "prompt", fallback_message: str = FALLBACK_MESSAGE) -> MessageHandler:
     """Conveniencia para criar handler padrao."""
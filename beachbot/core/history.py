@@ -0,0 +1,191 @@
+"""Monta o historico enviado aos agentes dentro de um orcamento de tokens."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+Summarizer = Callable[[Optional[str], list[dict[str, str]]], Awaitable[str]]
+
+SUMMARY_PREFIX = "Resumo da conversa ate aqui: "
+# custo fixo aproximado por mensagem (role + separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata (~4 caracteres por token), suficiente para o orcamento."""
+    return len(text) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+@dataclass
+class HistoryBudget:
+    """
+    Limites do historico: tokens das mensagens literais e teto de mensagens por turno.
+
+    `max_messages` e tambem o teto rigido do que vai na integra (e do lote de cada resumo):
+    com o resumo atrasado, o turno leva so as mais recentes e o restante fica para o resumo.
+    """
+
+    max_tokens: int = 1200
+    max_messages: int = 60
+    min_recent: int = 2
+
+    @classmethod
+    def from_env(cls) -> "HistoryBudget":
+        return cls(
+            max_tokens=int(os.getenv("HISTORY_TOKEN_BUDGET", "1200")),
+            max_messages=int(os.getenv("HISTORY_MAX_MESSAGES", "60")),
+        )
+
+
+@dataclass
+class SummaryUpdate:
+    """Mensagens que sairam do orcamento e ainda nao entraram no resumo da conversa."""
+
+    conversation_id: int
+    summary: Optional[str]
+    until_id: Optional[int]
+    dropped: list[dict[str, Any]]
+
+
+@dataclass
+class TurnHistory:
+    """Historico do turno e, se houver, o resumo a atualizar depois da resposta."""
+
+    messages: list[dict[str, str]]
+    pending_summary: Optional[SummaryUpdate] = None
+
+
+def split_by_budget(messages: list[dict[str, Any]], budget: HistoryBudget) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """Separa (antigas, recentes): recentes sao o maior sufixo que cabe no orcamento (minimo `min_recent`)."""
+    used = 0
+    keep = 0
+    for message in reversed(messages):
+        cost = estimate_tokens(message["content"])
+        if keep >= budget.min_recent and used + cost > budget.max_tokens:
+            break
+        used += cost
+        keep += 1
+    cut = len(messages) - keep
+    return messages[:cut], messages[cut:]
+
+
+async def build_history(storage: Any, session: Any, conversation_id: int, *, budget: HistoryBudget) -> TurnHistory:
+    """
+    Historico do turno: resumo das mensagens antigas + mensagens recentes na integra.
+
+    O resumo fica na conversa (`summary_text`) junto com o id da ultima mensagem resumida.
+    Nada e resumido aqui: as mensagens que acabaram de sair do orcamento vao na integra
+    neste turno e voltam em `pending_summary`, para o resumo ser atualizado fora do
+    caminho da resposta (`SummaryRefresher`).
+
+    Na integra vao no maximo as `max_messages` ultimas (a janela do cache). Se o resumo
+    ficou mais atras que isso (conversa antiga sem resumo, resumidor falhando), o turno
+    leva so a janela e o resumo avanca pelo lote das `max_messages` mais antigas ainda
+    nao resumidas, um lote por turno.
+    """
+    summary, until_id = await storage.get_conversation_summary(session, conversation_id)
+    window = await storage.fetch_last_messages(session, conversation_id, limit=budget.max_messages, with_ids=True)
+    messages = [m for m in window if until_id is None or m["id"] > until_id]
+    dropped, recent = split_by_budget(messages, budget)
+    reaches_summary = bool(window) and until_id is not None and window[0]["id"] <= until_id
+    if len(window) >= budget.max_messages and not reaches_summary:
+        backlog = await storage.fetch_messages_after(session, conversation_id, until_id, budget.max_messages)
+        dropped = [m for m in backlog if m["id"] < recent[0]["id"]]
+
+    history = [{"role": m["role"], "content": m["content"]} for m in messages]
+    if summary:
+        history.insert(0, {"role": "system", "content": SUMMARY_PREFIX + summary})
+    pending = SummaryUpdate(conversation_id, summary, until_id, dropped) if dropped else None
+    return TurnHistory(history, pending)
+
+
+async def refresh_summary(storage: Any, session: Any, update: SummaryUpdate, summarize: Summarizer) -> bool:
+    """
+    Incorpora `update.dropped` ao resumo; devolve se gravou.
+
+    A gravacao so vale se ninguem avancou o resumo desde a leitura. Se outro worker
+    avancou, nada se perde: as mensagens continuam depois de `until_id` e vao na integra
+    (ou no proximo resumo) nos turnos seguintes.
+    """
+    new_summary = await summarize(
+        update.summary, [{"role": m["role"], "content": m["content"]} for m in update.dropped]
+    )
+    return await storage.save_conversation_summary(
+        session,
+        update.conversation_id,
+        new_summary,
+        until_id=update.dropped[-1]["id"],
+        previous_until_id=update.until_id,
+    )
+
+
+@dataclass
+class SummaryStats:
+    scheduled: int = 0
+    saved: int = 0
+    conflicts: int = 0
+    failures: int = 0
+    skipped: int = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "scheduled": self.scheduled,
+            "saved": self.saved,
+            "conflicts": self.conflicts,
+            "failures": self.failures,
+            "skipped": self.skipped,
+        }
+
+
+class SummaryRefresher:
+    """
+    Atualiza os resumos em segundo plano, depois que a resposta do turno foi entregue.
+
+    No maximo uma atualizacao por conversa em andamento no processo; pedidos da mesma
+    conversa no meio dela sao ignorados (o proximo turno pede de novo o que faltar).
+    """
+
+    def __init__(self, storage: Any, summarize: Summarizer) -> None:
+        self.storage = storage
+        self.summarize = summarize
+        self.stats = SummaryStats()
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def schedule(self, update: Optional[SummaryUpdate]) -> None:
+        if update is None:
+            return
+        if update.conversation_id in self._tasks:
+            self.stats.skipped += 1
+            return
+        self.stats.scheduled += 1
+        task = asyncio.create_task(self._run(update))
+        self._tasks[update.conversation_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(update.conversation_id, None))
+
+    async def drain(self) -> None:
+        """Espera as atualizacoes em andamento (shutdown/testes)."""
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _run(self, update: SummaryUpdate) -> None:
+        try:
+            async with self.storage.get_session() as session:
+                saved = await refresh_summary(self.storage, session, update, self.summarize)
+        except Exception as exc:  # noqa: BLE001
+            self.stats.failures += 1
+            logger.exception(
+                "Falha ao atualizar resumo da conversa", exc_info=exc, extra={"conversation_id": update.conversation_id}
+            )
+            return
+        if saved:
+            self.stats.saved += 1
+        else:
+            self.stats.conflicts += 1
+            logger.info("Resumo ja avancado por outro turno", extra={"conversation_id": update.conversation_id})
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**self.stats.snapshot(), "in_flight": len(self._tasks)}
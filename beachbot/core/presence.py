@@ -0,0 +1,171 @@
+"""Indicador "digitando..." durante o turno e contagem de mensagens reenviadas pelo usuario."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from beachbot.core.router import normalize
+
+logger = logging.getLogger(__name__)
+
+# Envia (ou renova) o "digitando..." uma vez para a conversa do turno
+Presence = Callable[[], Awaitable[None]]
+
+
+@dataclass
+class PresencePolicy:
+    """Liga/desliga o indicador e define de quanto em quanto tempo ele e renovado."""
+
+    enabled: bool = True
+    refresh_seconds: float = 8.0
+
+    @classmethod
+    def from_env(cls) -> "PresencePolicy":
+        return cls(
+            enabled=os.getenv("PRESENCE_ENABLED", "true").lower() in {"1", "true", "yes"},
+            refresh_seconds=float(os.getenv("PRESENCE_REFRESH_SECONDS", "8")),
+        )
+
+
+@dataclass
+class PresenceStats:
+    started: int = 0
+    refreshes: int = 0
+    failures: int = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"started": self.started, "refreshes": self.refreshes, "failures": self.failures}
+
+
+class TypingIndicator:
+    """
+    Mantem o "digitando..." ativo enquanto o turno roda.
+
+    A Evolution segura o pedido de presenca pelo `delay` informado e depois volta a
+    "pausado"; o laco renova o indicador assim que cada pedido termina (ou a cada
+    `refresh_seconds`, se a API responder na hora). Falhas so sao logadas: o indicador
+    nunca atrasa nem derruba o turno.
+    """
+
+    def __init__(self, presence: Optional[Presence], *, refresh_seconds: float, stats: PresenceStats) -> None:
+        self.presence = presence
+        self.refresh_seconds = refresh_seconds
+        self.stats = stats
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.presence is None or self._task is not None:
+            return
+        self.stats.started += 1
+        self._task = asyncio.create_task(self._loop(self.presence))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    async def _loop(self, presence: Presence) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await presence()
+                self.stats.refreshes += 1
+            except Exception as exc:  # noqa: BLE001
+                self.stats.failures += 1
+                logger.warning("Falha ao enviar presenca 'digitando': %s", exc)
+            await asyncio.sleep(max(self.refresh_seconds - (time.monotonic() - started), 0.0))
+
+
+@dataclass
+class DuplicateStats:
+    """Mensagens repetidas e turnos (execucoes da rede) disparados so por elas."""
+
+    messages: int = 0
+    ignored: int = 0
+    duplicates: int = 0
+    during_turn: int = 0
+    duplicate_turns: int = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "ignored": self.ignored,
+            "duplicates": self.duplicates,
+            "duplicate_rate": round(self.duplicates / self.messages, 4) if self.messages else 0.0,
+            "during_turn": self.during_turn,
+            "duplicate_turns": self.duplicate_turns,
+        }
+
+
+class _Seen:
+    def __init__(self) -> None:
+        self.texts: dict[str, float] = {}
+        self.fresh = 0
+        self.repeated = 0
+
+
+class DuplicateTracker:
+    """
+    Detecta reenvios: mesmo texto (normalizado) na mesma conversa dentro de `window_seconds`.
+
+    Respostas curtas ("sim", "ok", "1", abaixo de `min_chars`) e mensagens no meio de uma
+    entrevista se repetem legitimamente e nao entram na conta (`ignored`). Um turno cujas
+    mensagens pendentes sao todas reenvios conta como `duplicate_turns`: e a chamada ao LLM
+    que o indicador "digitando..." deveria evitar.
+    """
+
+    def __init__(self, *, window_seconds: float = 300.0, min_chars: int = 4, max_conversations: int = 10_000) -> None:
+        self.window_seconds = window_seconds
+        self.min_chars = min_chars
+        self.max_conversations = max_conversations
+        self.stats = DuplicateStats()
+        self._seen: OrderedDict[Hashable, _Seen] = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "DuplicateTracker":
+        return cls(
+            window_seconds=float(os.getenv("DUPLICATE_WINDOW_SECONDS", "300")),
+            min_chars=int(os.getenv("DUPLICATE_MIN_CHARS", "4")),
+        )
+
+    def observe(self, key: Hashable, text: str, *, busy: bool, interviewing: bool = False) -> bool:
+        """Registra uma mensagem recebida; devolve se ela repete uma anterior recente."""
+        now = time.monotonic()
+        seen = self._seen.pop(key, None) or _Seen()
+        self._seen[key] = seen
+        while len(self._seen) > self.max_conversations:
+            self._seen.popitem(last=False)
+        self.stats.messages += 1
+        normalized = normalize(text)
+        if interviewing or len(normalized) < self.min_chars:
+            self.stats.ignored += 1
+            seen.fresh += 1
+            return False
+        seen.texts = {t: ts for t, ts in seen.texts.items() if now - ts <= self.window_seconds}
+        duplicate = normalized in seen.texts
+        seen.texts[normalized] = now
+        if duplicate:
+            seen.repeated += 1
+            self.stats.duplicates += 1
+            self.stats.during_turn += busy
+        else:
+            seen.fresh += 1
+        return duplicate
+
+    def turn_started(self, key: Hashable) -> None:
+        """Fecha a contagem das mensagens pendentes da conversa no inicio de um turno."""
+        seen = self._seen.get(key)
+        if seen is None:
+            return
+        if seen.repeated and not seen.fresh:
+            self.stats.duplicate_turns += 1
+        seen.fresh = seen.repeated = 0
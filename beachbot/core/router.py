@@ -0,0 +1,200 @@
+"""Roteamento deterministico por palavras-chave (atalho antes da triagem via LLM)."""
+from __future__ import annotations
+
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import yaml
+
+CONFIG_DIR = Path(__file__).resolve().parent.parent / "config"
+TRIAGE_CONFIG_PATH = CONFIG_DIR / "triage_config.yaml"
+# palavras-chave e grupos so do roteador (nao entram no prompt da triagem)
+ROUTER_CONFIG_PATH = CONFIG_DIR / "router_config.yaml"
+
+# Agentes que disparam fluxo (cadastro/escalonamento): pergunta sobre eles vai para a triagem
+GUARDED_AGENTS = frozenset({"Interview Agent", "Escalation Agent"})
+QUESTION_WORDS = frozenset(
+    {"como", "quando", "quanto", "quanta", "quantos", "quantas", "qual", "quais", "onde", "porque", "pq", "que", "tem", "existe", "posso", "pode"}
+)
+
+
+def normalize(text: str) -> str:
+    """Minusculas, sem acentos e com pontuacao trocada por espaco."""
+    folded = unicodedata.normalize("NFKD", text.casefold())
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^\w]+", " ", folded).split())
+
+
+def is_question(text: str) -> bool:
+    if "?" in text:
+        return True
+    words = normalize(text).split()
+    return bool(words) and words[0] in QUESTION_WORDS
+
+
+@dataclass
+class RouteDecision:
+    """Resultado do roteador: agente de destino (ou None = triagem) e o motivo."""
+
+    agent: Optional[str]
+    reason: str
+    keyword: Optional[str] = None
+
+
+@dataclass
+class RouterStats:
+    """Taxa de acerto do atalho e latencia economizada (estimada)."""
+
+    routed: int = 0
+    fallback: int = 0
+    ambiguous: int = 0
+    weak: int = 0
+    guarded: int = 0
+    by_agent: dict[str, int] = field(default_factory=dict)
+    # latencia media dos turnos por caminho, por agente final
+    _routed_time: dict[str, list[float]] = field(default_factory=dict)
+    _triage_time: dict[str, list[float]] = field(default_factory=dict)
+
+    def record(self, decision: RouteDecision) -> None:
+        if decision.agent is not None:
+            self.routed += 1
+            self.by_agent[decision.agent] = self.by_agent.get(decision.agent, 0) + 1
+            return
+        self.fallback += 1
+        if decision.reason == "ambiguous":
+            self.ambiguous += 1
+        elif decision.reason == "weak":
+            self.weak += 1
+        elif decision.reason == "question":
+            self.guarded += 1
+
+    def record_latency(self, *, routed: bool, agent: Optional[str], seconds: float) -> None:
+        bucket = (self._routed_time if routed else self._triage_time).setdefault(agent or "", [0, 0.0])
+        bucket[0] += 1
+        bucket[1] += seconds
+
+    def saved_seconds(self) -> float:
+        """Soma, por agente, de (media via triagem - media via atalho) x turnos pelo atalho."""
+        saved = 0.0
+        for agent, (count, total) in self._routed_time.items():
+            triage = self._triage_time.get(agent)
+            if not triage or not triage[0] or not count:
+                continue
+            saved += max(triage[1] / triage[0] - total / count, 0.0) * count
+        return saved
+
+    def snapshot(self) -> dict[str, Any]:
+        total = self.routed + self.fallback
+        return {
+            "routed": self.routed,
+            "fallback": self.fallback,
+            "ambiguous": self.ambiguous,
+            "weak": self.weak,
+            "guarded_questions": self.guarded,
+            "hit_rate": round(self.routed / total, 3) if total else 0.0,
+            "by_agent": dict(self.by_agent),
+            "saved_latency_s": round(self.saved_seconds(), 2),
+        }
+
+
+class KeywordRouter:
+    """
+    Encaminha direto ao agente quando a mensagem casa com varias palavras-chave de um unico agente.
+
+    As palavras-chave vem do `triage_config.yaml` (mais as extras do `router_config.yaml`)
+    e sao comparadas como palavras inteiras sobre o texto normalizado (sem acento/caixa);
+    trechos sobrepostos contam uma vez so ("aula experimental" nao conta tambem
+    "experimental") e palavras de um mesmo grupo (`groups`, ex.: "agendar"/"marcar") contam
+    como uma. So pula a triagem o agente com
+    pelo menos `min_hits` palavras-chave distintas e `margin` acima do segundo colocado: uma
+    palavra solta ("Fiz a aula experimental ontem", "quero cancelar meu plano mensal") nao
+    basta. Mensagens fracas, ambiguas, sem casamento ou que sao perguntas sobre agentes de
+    fluxo (ex.: "quanto custa a aula experimental?") seguem para a triagem via LLM.
+    """
+
+    def __init__(
+        self,
+        keywords: dict[str, list[str]],
+        *,
+        groups: Iterable[Iterable[str]] = (),
+        enabled: bool = True,
+        min_hits: int = 2,
+        margin: int = 2,
+    ) -> None:
+        self.enabled = enabled
+        self.min_hits = max(min_hits, 1)
+        self.margin = max(margin, 1)
+        self.stats = RouterStats()
+        # palavra-chave -> representante do grupo (contagem de distintas)
+        self._group: dict[str, str] = {}
+        for group in groups:
+            members = [normalize(str(word)) for word in group if normalize(str(word))]
+            for member in members:
+                self._group[member] = members[0]
+        self._patterns: list[tuple[str, str, re.Pattern[str]]] = []
+        for agent, words in keywords.items():
+            for word in words or []:
+                key = normalize(str(word))
+                if key:
+                    self._patterns.append((agent, key, re.compile(rf"(?<!\w){re.escape(key)}(?!\w)")))
+        # frases mais longas primeiro: ocupam o trecho antes das palavras contidas nelas
+        self._patterns.sort(key=lambda item: -len(item[1]))
+
+    @classmethod
+    def from_config(cls, path: Path = TRIAGE_CONFIG_PATH, router_path: Path = ROUTER_CONFIG_PATH) -> "KeywordRouter":
+        enabled = os.getenv("KEYWORD_ROUTER_ENABLED", "true").strip().lower() in {"1", "true", "yes", "on"}
+        data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+        extra = (yaml.safe_load(router_path.read_text(encoding="utf-8")) or {}) if router_path.exists() else {}
+        keywords = {agent: list(words or []) for agent, words in (data.get("keywords") or {}).items()}
+        for agent, words in (extra.get("keywords") or {}).items():
+            keywords.setdefault(agent, []).extend(words or [])
+        return cls(
+            keywords,
+            groups=extra.get("groups") or (),
+            enabled=enabled,
+            min_hits=int(os.getenv("KEYWORD_ROUTER_MIN_HITS", "2")),
+            margin=int(os.getenv("KEYWORD_ROUTER_MARGIN", "2")),
+        )
+
+    def hits(self, normalized: str) -> dict[str, list[str]]:
+        """Palavras-chave distintas casadas por agente, sem contar trechos sobrepostos."""
+        taken: list[tuple[int, int]] = []
+        found: dict[str, list[str]] = {}
+        for agent, key, pattern in self._patterns:
+            for match in pattern.finditer(normalized):
+                start, end = match.span()
+                if any(start < stop and begin < end for begin, stop in taken):
+                    continue
+                taken.append((start, end))
+                keys = found.setdefault(agent, [])
+                if key not in keys:
+                    keys.append(key)
+        return found
+
+    def distinct(self, keys: list[str]) -> int:
+        """Quantas palavras-chave distintas, contando cada grupo uma vez."""
+        return len({self._group.get(key, key) for key in keys})
+
+    def route(self, text: str) -> RouteDecision:
+        """Decide o agente de destino para a ultima mensagem do usuario."""
+        if not self.enabled:
+            return RouteDecision(None, "disabled")
+        found = self.hits(normalize(text))
+        if not found:
+            return RouteDecision(None, "no_match")
+        ranked = sorted(found.items(), key=lambda item: -self.distinct(item[1]))
+        agent, keys = ranked[0]
+        count = self.distinct(keys)
+        runner_up = self.distinct(ranked[1][1]) if len(ranked) > 1 else 0
+        keyword = "+".join(keys)
+        if count < self.min_hits:
+            return RouteDecision(None, "weak", keyword)
+        if count - runner_up < self.margin:
+            return RouteDecision(None, "ambiguous", keyword)
+        if agent in GUARDED_AGENTS and is_question(text):
+            return RouteDecision(None, "question", keyword)
+        return RouteDecision(agent, "keyword", keyword)
@@ -0,0 +1,160 @@
+"""Entrega antecipada da resposta em paragrafos (turno em streaming) e tempo ate a primeira mensagem."""
+from __future__ import annotations
+
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+# Entrega uma mensagem; False = o envio nao foi confirmado
+Deliver = Callable[[str], Awaitable[Optional[bool]]]
+
+# linha em branco (com ou sem espacos) separa paragrafos
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+
+
+def split_paragraphs(text: str) -> list[str]:
+    return [part.strip() for part in PARAGRAPH_BREAK.split(text) if part.strip()]
+
+
+def _squash(text: str) -> str:
+    return " ".join(text.split())
+
+
+@dataclass
+class StreamPolicy:
+    """Configuracao do modo streaming (desligado por padrao)."""
+
+    enabled: bool = False
+    # no maximo N mensagens por resposta: N-1 antecipadas + o restante no fim
+    max_messages: int = 3
+    # paragrafos curtos ("Oi!") sao juntados ao seguinte ate atingir este tamanho
+    min_chars: int = 40
+
+    @classmethod
+    def from_env(cls) -> "StreamPolicy":
+        return cls(
+            enabled=os.getenv("TURN_STREAMING", "false").lower() in {"1", "true", "yes"},
+            max_messages=max(1, int(os.getenv("STREAM_MAX_MESSAGES", "3"))),
+            min_chars=int(os.getenv("STREAM_MIN_PARAGRAPH_CHARS", "40")),
+        )
+
+
+class ParagraphSplitter:
+    """Acumula deltas de texto e libera cada paragrafo assim que ele termina (linha em branco)."""
+
+    def __init__(self, *, min_chars: int = 40) -> None:
+        self.min_chars = min_chars
+        self._buffer = ""
+        self._pending: list[str] = []
+
+    def feed(self, delta: str) -> list[str]:
+        """Adiciona um delta; devolve os paragrafos completos (ja juntados se curtos)."""
+        self._buffer += delta
+        ready: list[str] = []
+        while (match := PARAGRAPH_BREAK.search(self._buffer)) is not None:
+            paragraph = self._buffer[: match.start()].strip()
+            self._buffer = self._buffer[match.end() :]
+            if paragraph:
+                self._pending.append(paragraph)
+            if self._pending and len("\n\n".join(self._pending)) >= self.min_chars:
+                ready.append("\n\n".join(self._pending))
+                self._pending = []
+        return ready
+
+    def reset(self) -> None:
+        """Descarta o texto parcial (ex.: outro agente assumiu a resposta)."""
+        self._buffer = ""
+        self._pending = []
+
+
+def remainder(final_text: str, sent: list[str]) -> tuple[str, bool]:
+    """
+    Parte da resposta final ainda nao entregue e se os trechos enviados batem com ela.
+
+    Trechos iniciais que nao fazem parte da resposta final (o agente escreveu algo antes
+    de chamar uma ferramenta, por exemplo) sao ignorados; o que vier depois deles e for
+    o inicio da resposta final nao e reenviado.
+    """
+    paragraphs = split_paragraphs(final_text)
+    for skipped in range(len(sent)):
+        tail = sent[skipped:]
+        consumed = sum(len(split_paragraphs(part)) for part in tail)
+        if _squash(" ".join(paragraphs[:consumed])) == _squash(" ".join(tail)):
+            return "\n\n".join(paragraphs[consumed:]), skipped == 0
+    return final_text, not sent
+
+
+class TurnClock:
+    """
+    Mede, a partir do inicio do turno, a primeira mensagem entregue e o fim do turno.
+
+    Guarda tambem os horarios (UTC) do inicio, da primeira mensagem e da ultima
+    confirmacao de envio para o registro de latencia do turno.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.started_at = datetime.now(timezone.utc)
+        self.first_message: Optional[float] = None
+        self.first_sent_at: Optional[datetime] = None
+        self.acked_at: Optional[datetime] = None
+        self.messages = 0
+
+    def wrap(self, deliver: Deliver) -> Deliver:
+        async def _deliver(text: str) -> Optional[bool]:
+            if self.first_message is None:
+                self.first_message = time.monotonic()
+                self.first_sent_at = datetime.now(timezone.utc)
+            self.messages += 1
+            acked = await deliver(text)
+            if acked is not False:
+                self.acked_at = datetime.now(timezone.utc)
+            return acked
+
+        return _deliver
+
+    def ttfm(self) -> Optional[float]:
+        return self.first_message - self.started if self.first_message is not None else None
+
+
+@dataclass
+class StreamStats:
+    """Tempo ate a primeira mensagem (TTFM) x tempo total do turno, em turnos com entrega."""
+
+    turns: int = 0
+    streamed_turns: int = 0
+    early_messages: int = 0
+    recent_ttfm: deque = field(default_factory=lambda: deque(maxlen=512))
+    recent_total: deque = field(default_factory=lambda: deque(maxlen=512))
+
+    def record(self, clock: TurnClock, *, streamed: bool) -> None:
+        ttfm = clock.ttfm()
+        if ttfm is None:
+            return
+        self.turns += 1
+        self.recent_ttfm.append(ttfm)
+        self.recent_total.append(time.monotonic() - clock.started)
+        if streamed:
+            self.streamed_turns += 1
+            self.early_messages += max(clock.messages - 1, 0)
+
+    def snapshot(self) -> dict[str, Any]:
+        def _pct(values: deque, q: float) -> float:
+            ordered = sorted(values)
+            if not ordered:
+                return 0.0
+            return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 1)
+
+        return {
+            "turns": self.turns,
+            "streamed_turns": self.streamed_turns,
+            "early_messages": self.early_messages,
+            "p50_ttfm_ms": _pct(self.recent_ttfm, 0.50),
+            "p95_ttfm_ms": _pct(self.recent_ttfm, 0.95),
+            "p50_turn_ms": _pct(self.recent_total, 0.50),
+            "p95_turn_ms": _pct(self.recent_total, 0.95),
+        }
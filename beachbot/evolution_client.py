@@ -14,7 +14,7 @@ logger = logging.getLogger(__name__)
 
 
 class EvolutionClient:
-    """Cliente mínimo para envio de mensagens de texto."""
+    """Cliente mínimo para envio de mensagens de texto e de presença ("digitando...")."""
 
     def __init__( 
         self,
@@ -48,3 +48,23 @@ class EvolutionClient:
                 )
             response.raise_for_status()
             return response.json()
+
+    async def send_presence(self, number: str, presence: str = "composing", delay_ms: int = 8000) -> None:
+        """
+        Mostra a presença ("composing" = digitando, "recording", "paused") para o número.
+
+        A Evolution mantém a presença por `delay_ms` e só então responde, por isso o
+        timeout do pedido soma esse tempo.
+        """
+        url = f"{self.base_url}/chat/sendPresence/{self.instance}"
+        payload = {"number": number, "presence": presence, "delay": delay_ms}
+
+        async with httpx.AsyncClient(timeout=self.timeout + delay_ms / 1000) as client:
+            response = await client.post(url, headers={"apikey": self.apikey}, json=payload)
+            if response.status_code >= 400:
+                logger.warning(
+                    "Evolution presence error: status=%s body=%s",
+                    response.status_code,
+                    response.text,
+                )
+            response.raise_for_status()
@@ -2,16 +2,35 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Literal
+from typing import Any, Literal, Optional
 
-from agents import Runner
+from agents import Agent, OpenAIProvider, RunConfig, RunHooks, Runner
 from atendentepro.agents import create_triage_agent
 from atendentepro.guardrails import get_guardrails_for_agent
 from atendentepro.network import create_standard_network
 
+from beachbot.core.streaming import Deliver, ParagraphSplitter, remainder
+from beachbot.rag.tool import go_to_rag
+from beachbot.utils.metrics import AGENT_HOP_SECONDS, HANDOFFS, TOOL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Evento da Responses API com um pedaco do texto da resposta
+TEXT_DELTA_EVENT = "response.output_text.delta"
 
 TRIAGE_INSTRUCTIONS_PATH = Path(__file__).parent / "config" / "triage_instructions.md"
+SUMMARY_INSTRUCTIONS = (
+    "Voce resume conversas de atendimento do CT Smash Beach Tennis. "
+    "Atualize o resumo existente com as novas mensagens, em portugues, em poucas frases. "
+    "Preserve dados ja informados pelo cliente (nome, telefone, nivel, dia/horario, servico de interesse) "
+    "e pendencias em aberto. Nao invente informacoes."
+)
 
 
 def _load_triage_instructions() -> str:
@@ -40,6 +59,39 @@ def _replace_triage(network: Any) -> None:
             ]
 
 
+def find_agent(network: Any, name: str) -> Optional[Any]:
+    """Agente da rede pelo nome (None se nao existir)."""
+    for agent in network.get_all_agents():
+        if getattr(agent, "name", None) == name:
+            return agent
+    return None
+
+
+def _replace_rag_tool(network: Any) -> None:
+    """Troca o go_to_rag do Knowledge Agent pela busca no indice local (.npy em mmap)."""
+    knowledge = find_agent(network, "Knowledge Agent")
+    if knowledge is None:
+        return
+    tools = [tool for tool in knowledge.tools if getattr(tool, "name", None) != go_to_rag.name]
+    knowledge.tools = [*tools, go_to_rag]
+
+
+@lru_cache(maxsize=1)
+def _hop_provider() -> Optional[OpenAIProvider]:
+    """
+    Provider com prazo por chamada ao modelo (um hop da rede), passado em cada `RunConfig`.
+
+    Nao troca o cliente padrao do SDK: outras rodadas no mesmo processo seguem com o delas.
+    """
+    seconds = float(os.getenv("TURN_HOP_DEADLINE_SECONDS", "0") or 0)
+    if seconds <= 0:
+        return None
+    from openai import AsyncOpenAI
+
+    client = AsyncOpenAI(timeout=seconds, max_retries=int(os.getenv("TURN_HOP_RETRIES", "1")))
+    return OpenAIProvider(openai_client=client)
+
+
 TriageMode = Literal["prompt", "yaml"]
 
 
@@ -61,19 +113,177 @@ def build_network(*, triage_mode: TriageMode = "prompt") -> Any:
 
     if triage_mode == "prompt":
         _replace_triage(network)
+    _replace_rag_tool(network)
     return network
 
 
-async def run_turn_async(network: Any, messages: list[dict[str, str]]) -> str:
-    """Executa uma rodada de conversa de forma assincrona."""
-    result = await Runner.run(network.triage, messages)
+class MetricsHooks(RunHooks):
+    """
+    Tempo de cada hop (agente ate o handoff ou a resposta final) e de cada ferramenta.
+
+    Uma instancia por rodada; os rotulos sao nomes de agentes/ferramentas da rede (poucos).
+    """
+
+    def __init__(self) -> None:
+        self.path: list[str] = []
+        self._agent: Optional[str] = None
+        self._agent_started = 0.0
+        self._tools: dict[str, list[float]] = {}
+
+    def _close_hop(self, outcome: str) -> None:
+        if self._agent is not None:
+            AGENT_HOP_SECONDS.observe(time.perf_counter() - self._agent_started, self._agent, outcome)
+            self._agent = None
+
+    async def on_agent_start(self, context: Any, agent: Any) -> None:
+        self._close_hop("handoff")
+        self._agent = agent.name
+        self.path.append(agent.name)
+        self._agent_started = time.perf_counter()
+
+    async def on_agent_end(self, context: Any, agent: Any, output: Any) -> None:
+        self._close_hop("final")
+
+    async def on_handoff(self, context: Any, from_agent: Any, to_agent: Any) -> None:
+        HANDOFFS.inc(from_agent.name, to_agent.name)
+
+    async def on_tool_start(self, context: Any, agent: Any, tool: Any) -> None:
+        self._tools.setdefault(tool.name, []).append(time.perf_counter())
+
+    async def on_tool_end(self, context: Any, agent: Any, tool: Any, result: Any) -> None:
+        started = self._tools.get(tool.name)
+        if started:
+            TOOL_SECONDS.observe(time.perf_counter() - started.pop(), tool.name)
+
+    def finish(self) -> None:
+        """Fecha o hop em aberto se a rodada terminou sem resposta final (erro ou cancelamento)."""
+        self._close_hop("error")
+
+
+@dataclass
+class TurnResult:
+    """Resposta de uma rodada e o agente que a produziu."""
+
+    text: str
+    last_agent: Optional[str] = None
+    # a resposta ja foi entregue (modo streaming)
+    delivered: bool = False
+    # agentes percorridos na rodada, em ordem
+    agents: list[str] = field(default_factory=list)
+
+
+def _run_config(model: Optional[str] = None) -> Optional[RunConfig]:
+    """Config da rodada: modelo trocado (hedge) e provider com prazo por hop, se houver."""
+    options: dict[str, Any] = {}
+    if model:
+        options["model"] = model
+    provider = _hop_provider()
+    if provider is not None:
+        options["model_provider"] = provider
+    return RunConfig(**options) if options else None
+
+
+async def run_turn_detailed(
+    network: Any,
+    messages: list[dict[str, str]],
+    *,
+    start_agent: Optional[Any] = None,
+    model: Optional[str] = None,
+    handoffs: bool = True,
+) -> TurnResult:
+    """
+    Executa uma rodada e devolve texto + agente final (ex.: para saber se a entrevista esta em curso).
+
+    `start_agent` pula a triagem e comeca direto no agente informado (atalho por palavra-chave).
+    `model` troca o modelo de todos os agentes nesta rodada (ex.: tentativa de hedge).
+    `handoffs=False` roda so o agente inicial, sem passar a vez (o hedge nunca chega a
+    agentes com ferramentas que gravam dados).
+    """
+    agent = start_agent or network.triage
+    if not handoffs:
+        agent = agent.clone(handoffs=[])
+    hooks = MetricsHooks()
+    try:
+        result = await Runner.run(agent, messages, run_config=_run_config(model), hooks=hooks)
+    finally:
+        hooks.finish()
+    last_agent = getattr(getattr(result, "last_agent", None), "name", None)
     if hasattr(result, "final_output"):
-        return result.final_output
+        return TurnResult(result.final_output, last_agent, agents=hooks.path)
     if hasattr(result, "text"):
-        return result.text
-    return str(result)
+        return TurnResult(result.text, last_agent, agents=hooks.path)
+    return TurnResult(str(result), last_agent, agents=hooks.path)
+
+
+async def run_turn_streamed(
+    network: Any,
+    messages: list[dict[str, str]],
+    deliver: Deliver,
+    *,
+    start_agent: Optional[Any] = None,
+    max_messages: int = 3,
+    min_chars: int = 40,
+    model: Optional[str] = None,
+) -> TurnResult:
+    """
+    Executa uma rodada consumindo a saida do agente enquanto ela e gerada.
+
+    Cada paragrafo completo e entregue assim que termina (ate `max_messages - 1`
+    mensagens antecipadas); o restante da resposta final sai numa ultima mensagem, na
+    ordem. Texto parcial de um agente que passou a vez para outro e descartado, mas o que
+    ja foi entregue nao volta: a parte da resposta final que nao foi antecipada e
+    entregue no fim (ver `remainder`).
+    """
+    hooks = MetricsHooks()
+    result = Runner.run_streamed(
+        start_agent or network.triage, messages, run_config=_run_config(model), hooks=hooks
+    )
+    splitter = ParagraphSplitter(min_chars=min_chars)
+    sent: list[str] = []
+    try:
+        async for event in result.stream_events():
+            if event.type == "agent_updated_stream_event":
+                splitter.reset()
+            elif event.type == "raw_response_event" and getattr(event.data, "type", None) == TEXT_DELTA_EVENT:
+                if len(sent) >= max_messages - 1:
+                    continue
+                for paragraph in splitter.feed(event.data.delta):
+                    if len(sent) < max_messages - 1:
+                        sent.append(paragraph)
+                        await deliver(paragraph)
+    finally:
+        hooks.finish()
+    final_text = str(result.final_output)
+    last_agent = getattr(getattr(result, "last_agent", None), "name", None)
+    rest, matched = remainder(final_text, sent)
+    if not matched:
+        logger.warning(
+            "Texto antecipado nao faz parte da resposta final",
+            extra={"early_messages": len(sent), "last_agent": last_agent},
+        )
+    if rest:
+        await deliver(rest)
+    return TurnResult(final_text, last_agent, delivered=True, agents=hooks.path)
+
+
+async def run_turn_async(network: Any, messages: list[dict[str, str]]) -> str:
+    """Executa uma rodada de conversa de forma assincrona."""
+    return (await run_turn_detailed(network, messages)).text
 
 
 def run_turn(network: Any, messages: list[dict[str, str]]) -> str:
     """Executa uma rodada de conversa de forma sincrona (compatibilidade CLI antiga)."""
     return asyncio.run(run_turn_async(network, messages))
+
+
+async def summarize_history_async(previous_summary: Optional[str], messages: list[dict[str, str]]) -> str:
+    """Atualiza o resumo da conversa com mensagens que sairam da janela do historico."""
+    summary_agent = Agent(
+        name="History Summarizer",
+        instructions=SUMMARY_INSTRUCTIONS,
+        model=os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini"),
+    )
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = f"Resumo atual:\n{previous_summary or '(vazio)'}\n\nNovas mensagens:\n{transcript}"
+    result = await Runner.run(summary_agent, prompt, run_config=_run_config())
+    return str(getattr(result, "final_output", result)).strip()
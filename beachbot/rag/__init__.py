@@ -0,0 +1 @@
+"""Recuperacao sobre a base de conhecimento (indice de embeddings e busca)."""
@@ -0,0 +1,156 @@
+"""Quebra dos markdowns da base em chunks que respeitam titulos, listas e pares pergunta/resposta."""
+from __future__ import annotations
+
+import re
+import textwrap
+from dataclasses import dataclass
+from typing import Any
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+# FAQ no formato "**Pergunta?**" seguido da resposta
+QUESTION_RE = re.compile(r"^\s*\*\*.+\?\s*\*\*\s*$")
+
+
+@dataclass
+class _Unit:
+    """Menor pedaco que nunca e cortado: paragrafo, item de lista ou par pergunta/resposta."""
+
+    path: tuple[str, ...]
+    text: str
+    sep: str = "\n\n"
+    standalone: bool = False
+    break_before: bool = False
+
+
+def _units(text: str, split_level: int) -> list[_Unit]:
+    units: list[_Unit] = []
+    path: list[tuple[int, str]] = []
+    pending_break = True
+    pending_heading: list[str] = []
+    paragraph: list[str] = []
+
+    def flush_paragraph() -> None:
+        nonlocal pending_break
+        if not paragraph:
+            return
+        crumbs = tuple(title for _, title in path)
+        is_qa = QUESTION_RE.match(paragraph[0]) is not None and len(paragraph) > 1
+        lines = [line.rstrip() for line in paragraph]
+        if is_qa:
+            groups = [lines]
+        else:
+            # itens de lista viram unidades proprias (o chunk pode quebrar entre itens, nunca no meio)
+            groups = []
+            for line in lines:
+                if LIST_ITEM_RE.match(line) or not groups:
+                    groups.append([line])
+                else:
+                    groups[-1].append(line)
+        for idx, group in enumerate(groups):
+            body = "\n".join(group)
+            if idx == 0 and pending_heading:
+                body = "\n".join(pending_heading) + "\n" + body
+                pending_heading.clear()
+            units.append(
+                _Unit(
+                    path=crumbs,
+                    text=body,
+                    sep="\n" if idx else "\n\n",
+                    standalone=is_qa,
+                    break_before=pending_break and idx == 0,
+                )
+            )
+        pending_break = False
+        paragraph.clear()
+
+    for raw in text.replace("\r\n", "\n").split("\n"):
+        heading = HEADING_RE.match(raw)
+        if heading:
+            flush_paragraph()
+            level, title = len(heading.group(1)), heading.group(2).strip()
+            while path and path[-1][0] >= level:
+                path.pop()
+            if level <= split_level:
+                pending_heading.clear()
+                pending_break = True
+                path.append((level, title))
+            else:
+                # subtitulos ficam no texto do chunk (ex.: "### Mensal" dentro de "Plano da manha")
+                path.append((level, title))
+                pending_heading.append(raw.strip())
+            continue
+        if not raw.strip():
+            flush_paragraph()
+            continue
+        paragraph.append(raw)
+    flush_paragraph()
+    return units
+
+
+def _common_prefix(paths: list[tuple[str, ...]]) -> tuple[str, ...]:
+    prefix = paths[0]
+    for path in paths[1:]:
+        size = 0
+        while size < min(len(prefix), len(path)) and prefix[size] == path[size]:
+            size += 1
+        prefix = prefix[:size]
+    return prefix
+
+
+def _joined_size(units: list[_Unit]) -> int:
+    """Tamanho do corpo do chunk, contando os separadores entre as unidades."""
+    return sum(len(unit.text) for unit in units) + sum(len(unit.sep) for unit in units[1:])
+
+
+def chunk_markdown(
+    text: str,
+    *,
+    max_chars: int = 900,
+    overlap: int = 0,
+    split_level: int = 2,
+) -> list[dict[str, Any]]:
+    """
+    Chunks de um markdown: `content` (com o caminho de titulos na primeira linha) e `headings`.
+
+    Titulos ate `split_level` sempre iniciam chunk novo; secoes menores sao agrupadas ate
+    `max_chars`. Pares pergunta/resposta de FAQ viram um chunk cada. Quando uma secao nao
+    cabe em um chunk, o corte e entre paragrafos/itens de lista e o chunk seguinte repete
+    ate `overlap` caracteres das ultimas unidades do anterior.
+    """
+    groups: list[list[_Unit]] = []
+    current: list[_Unit] = []
+    size = 0
+    for unit in _units(text, split_level):
+        if unit.standalone or unit.break_before or (current and size + len(unit.sep) + len(unit.text) > max_chars):
+            carry: list[_Unit] = []
+            if current and not (unit.standalone or unit.break_before or current[-1].standalone) and overlap > 0:
+                budget = overlap
+                for prev in reversed(current):
+                    if len(prev.text) > budget:
+                        break
+                    carry.insert(0, prev)
+                    budget -= len(prev.text)
+            if current:
+                groups.append(current)
+            current = list(carry)
+            size = _joined_size(current)
+        if current:
+            size += len(unit.sep)
+        current.append(unit)
+        size += len(unit.text)
+        if unit.standalone:
+            groups.append(current)
+            current, size = [], 0
+    if current:
+        groups.append(current)
+
+    chunks: list[dict[str, Any]] = []
+    for group in groups:
+        headings = list(_common_prefix([unit.path for unit in group]))
+        body = group[0].text + "".join(unit.sep + unit.text for unit in group[1:])
+        header = " > ".join(headings)
+        pieces = [body] if len(body) <= max_chars else textwrap.wrap(body, max_chars, replace_whitespace=False)
+        for piece in pieces:
+            chunks.append({"content": f"{header}\n\n{piece}" if header else piece, "headings": headings})
+    return chunks
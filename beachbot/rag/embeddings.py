@@ -0,0 +1,19 @@
+"""Geracao de embeddings de consultas (API da OpenAI)."""
+from __future__ import annotations
+
+from typing import Awaitable, Callable
+
+Embedder = Callable[[str], Awaitable[list[float]]]
+
+
+def openai_embedder(model: str) -> Embedder:
+    """Embedder assincrono sobre a API de embeddings da OpenAI."""
+    from openai import AsyncOpenAI
+
+    client = AsyncOpenAI()
+
+    async def _embed(text: str) -> list[float]:
+        resp = await client.embeddings.create(model=model, input=text)
+        return resp.data[0].embedding
+
+    return _embed
@@ -0,0 +1,250 @@
+"""Indice de embeddings em disco: matriz (.npy, mmap) + metadados (.meta.json)."""
+from __future__ import annotations
+
+import json
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal, Optional, Sequence
+
+import numpy as np
+
+FORMAT_VERSION = 2
+META_SUFFIX = ".meta.json"
+SCALES_SUFFIX = ".scales.npy"
+FULL_SUFFIX = ".full.npy"
+
+StorageDtype = Literal["float32", "float16", "int8"]
+STORAGE_DTYPES: tuple[str, ...] = ("float32", "float16", "int8")
+# linhas convertidas para float32 por vez na busca compacta (limita a memoria temporaria)
+SCORE_BLOCK_ROWS = 4096
+
+
+@dataclass
+class SearchHit:
+    """Chunk encontrado e sua similaridade de cosseno com a consulta."""
+
+    score: float
+    chunk: dict[str, Any]
+
+
+def index_paths(path: Path) -> tuple[Path, Path]:
+    """(.npy, .meta.json) correspondentes a `path` (aceita o caminho do pickle legado)."""
+    base = path.with_suffix("")
+    return base.with_suffix(".npy"), base.with_name(base.name + META_SUFFIX)
+
+
+def _sidecar(path: Path, suffix: str) -> Path:
+    base = path.with_suffix("")
+    return base.with_name(base.name + suffix)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def _save_npy(path: Path, array: np.ndarray) -> Path:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+    return tmp
+
+
+class EmbeddingIndex:
+    """
+    Vetores L2-normalizados (uma linha por chunk) e metadados dos chunks.
+
+    O formato novo e carregado com `np.load(mmap_mode="r")`: os workers do uvicorn
+    compartilham as mesmas paginas do page cache em vez de cada um ter sua copia.
+    O pickle legado (lista de dicts com `chunk` e `embedding`) ainda e lido.
+
+    Representacoes compactas (opcionais, ver `compact`): truncamento das primeiras `dims`
+    dimensoes (modelos Matryoshka, como text-embedding-3), float16 ou int8 com uma escala
+    por linha. Quando a matriz completa em float32 (`full`) tambem e gravada, os
+    `rescore` melhores candidatos da busca compacta sao re-pontuados com ela; so as
+    linhas desses candidatos sao lidas do disco. A matriz compacta e pontuada em blocos de
+    `block_rows` linhas: so um bloco por vez e convertido para float32, nunca a matriz toda.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        chunks: list[dict[str, Any]],
+        *,
+        model: Optional[str] = None,
+        scales: Optional[np.ndarray] = None,
+        full: Optional[np.ndarray] = None,
+        rescore: int = 32,
+        block_rows: int = SCORE_BLOCK_ROWS,
+    ) -> None:
+        if vectors.ndim != 2 or len(vectors) != len(chunks):
+            raise ValueError("Indice inconsistente: vetores e metadados com tamanhos diferentes.")
+        self.vectors = vectors
+        self.chunks = chunks
+        self.model = model
+        self.scales = scales
+        self.full = full
+        self.rescore = rescore
+        self.block_rows = max(block_rows, 1)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def dim(self) -> int:
+        return int(self.vectors.shape[1]) if self.vectors.size else 0
+
+    @property
+    def dtype(self) -> str:
+        return str(self.vectors.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes da representacao consultada em toda busca (sem a matriz de re-score)."""
+        return int(self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    @property
+    def scratch_nbytes(self) -> int:
+        """Memoria temporaria por consulta: scores + um bloco convertido para float32 (se compacto)."""
+        block = min(len(self), self.block_rows) * self.dim * 4 if self.vectors.dtype != np.float32 else 0
+        return int(len(self) * 4 + block)
+
+    @classmethod
+    def from_embeddings(
+        cls, embeddings: Sequence[Sequence[float]], chunks: list[dict[str, Any]], *, model: Optional[str] = None
+    ) -> "EmbeddingIndex":
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.size == 0:
+            matrix = matrix.reshape(0, 0)
+        return cls(normalize_rows(matrix), chunks, model=model)
+
+    def compact(
+        self, *, dims: Optional[int] = None, dtype: StorageDtype = "float32", keep_full: bool = True
+    ) -> "EmbeddingIndex":
+        """Copia com dimensoes truncadas e/ou tipo menor (a partir dos vetores float32 completos)."""
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"dtype nao suportado: {dtype}")
+        source = np.asarray(self.full if self.full is not None else self.vectors, dtype=np.float32)
+        dims = min(dims or source.shape[1], source.shape[1])
+        truncated = normalize_rows(source[:, :dims])
+        scales = None
+        if dtype == "int8":
+            scales = np.abs(truncated).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            vectors = np.round(truncated / scales[:, None]).astype(np.int8)
+            scales = scales.astype(np.float32)
+        else:
+            vectors = truncated.astype(dtype)
+        is_compact = dtype != "float32" or dims < source.shape[1]
+        full = source if keep_full and is_compact else None
+        return EmbeddingIndex(vectors, self.chunks, model=self.model, scales=scales, full=full, rescore=self.rescore)
+
+    @classmethod
+    def load(cls, path: Path) -> "EmbeddingIndex":
+        """Carrega o formato .npy (mmap) se existir; senao o pickle legado."""
+        npy_path, meta_path = index_paths(path)
+        if npy_path.exists() and meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            vectors = np.load(npy_path, mmap_mode="r")
+            scales = np.load(_sidecar(path, SCALES_SUFFIX)) if meta.get("dtype") == "int8" else None
+            full = np.load(_sidecar(path, FULL_SUFFIX), mmap_mode="r") if meta.get("has_full") else None
+            return cls(
+                vectors,
+                meta["chunks"],
+                model=meta.get("model"),
+                scales=scales,
+                full=full,
+                rescore=int(meta.get("rescore", 32)),
+            )
+        legacy = path if path.suffix == ".pkl" else path.with_suffix(".pkl")
+        if legacy.exists():
+            return cls.load_legacy(legacy)
+        raise FileNotFoundError(f"Indice de embeddings nao encontrado: {npy_path} / {legacy}")
+
+    @classmethod
+    def load_legacy(cls, path: Path) -> "EmbeddingIndex":
+        with path.open("rb") as f:
+            items = pickle.load(f)
+        chunks = [item.get("chunk", {}) for item in items]
+        return cls.from_embeddings([item["embedding"] for item in items], chunks)
+
+    def save(self, path: Path) -> tuple[Path, Path]:
+        """Grava .npy + .meta.json (+ escalas/matriz completa); arquivos temporarios + rename."""
+        npy_path, meta_path = index_paths(path)
+        npy_path.parent.mkdir(parents=True, exist_ok=True)
+        staged = [(_save_npy(npy_path, self.vectors), npy_path)]
+        scales_path, full_path = _sidecar(path, SCALES_SUFFIX), _sidecar(path, FULL_SUFFIX)
+        if self.scales is not None:
+            staged.append((_save_npy(scales_path, self.scales), scales_path))
+        if self.full is not None:
+            staged.append((_save_npy(full_path, np.asarray(self.full, dtype=np.float32)), full_path))
+        meta = {
+            "format": FORMAT_VERSION,
+            "model": self.model,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "full_dim": int(self.full.shape[1]) if self.full is not None else self.dim,
+            "has_full": self.full is not None,
+            "rescore": self.rescore,
+            "count": len(self),
+            "chunks": self.chunks,
+        }
+        tmp_meta = meta_path.with_name(meta_path.name + ".tmp")
+        tmp_meta.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        # metadados por ultimo: quem observa o .meta.json ve os vetores ja no lugar
+        for tmp, final in staged:
+            tmp.replace(final)
+        tmp_meta.replace(meta_path)
+        for stale, keep in ((scales_path, self.scales), (full_path, self.full)):
+            if keep is None and stale.exists():
+                stale.unlink()
+        return npy_path, meta_path
+
+    def scores(self, query: Sequence[float] | np.ndarray) -> Optional[np.ndarray]:
+        """Similaridade de cosseno da consulta com cada chunk (None se a consulta for nula)."""
+        vector = np.asarray(query, dtype=np.float32)
+        if not len(self) or not float(np.linalg.norm(vector)):
+            return None
+        head = vector[: self.dim]
+        head_norm = float(np.linalg.norm(head))
+        if not head_norm:
+            return None
+        scores = self._compact_scores((head / head_norm).astype(np.float32))
+        if self.scales is not None:
+            scores *= self.scales
+        if self.full is not None and self.rescore > 0 and len(vector) >= self.full.shape[1]:
+            full_query = vector[: self.full.shape[1]]
+            full_query = full_query / float(np.linalg.norm(full_query))
+            size = min(self.rescore, len(scores))
+            candidates = np.sort(np.argpartition(-scores, size - 1)[:size])
+            exact = np.asarray(self.full[candidates], dtype=np.float32) @ full_query
+            # a escala do score compacto difere da exata: nenhum nao-candidato passa os re-pontuados
+            np.minimum(scores, exact.min(), out=scores)
+            scores[candidates] = exact
+        return scores
+
+    def _compact_scores(self, head: np.ndarray) -> np.ndarray:
+        """Produto da matriz consultada com a consulta, convertendo um bloco de linhas por vez."""
+        if self.vectors.dtype == np.float32:
+            return np.asarray(self.vectors @ head, dtype=np.float32)
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), self.block_rows):
+            block = np.asarray(self.vectors[start : start + self.block_rows], dtype=np.float32)
+            np.dot(block, head, out=scores[start : start + len(block)])
+        return scores
+
+    def top(self, scores: np.ndarray, k: int) -> list[SearchHit]:
+        """Os `k` maiores scores (ordem decrescente) como hits."""
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [SearchHit(float(scores[i]), self.chunks[i]) for i in top]
+
+    def search(self, query: Sequence[float] | np.ndarray, k: int = 4) -> list[SearchHit]:
+        """Top-k por similaridade de cosseno (produto escalar com vetores normalizados)."""
+        scores = self.scores(query)
+        return self.top(scores, k) if scores is not None else []
@@ -0,0 +1,144 @@
+"""Indice BM25 invertido (pesos pre-calculados) e fusao com os scores vetoriais."""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+from collections import Counter
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from beachbot.rag.text import tokenize
+
+LEXICAL_SUFFIX = ".bm25.json"
+
+
+def lexical_path(path: Path) -> Path:
+    base = path.with_suffix("")
+    return base.with_name(base.name + LEXICAL_SUFFIX)
+
+
+def corpus_digest(texts: Sequence[str]) -> str:
+    """Impressao digital do conteudo dos chunks, na ordem: amarra o BM25 aos metadados do indice."""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class LexicalIndex:
+    """
+    BM25 sobre os chunks, com o peso de cada (termo, chunk) calculado no build.
+
+    Consultar e so somar as listas de postings dos termos da consulta (`np.add.at`), entao
+    o custo cresce com o tamanho das postings e nao com o vocabulario ou o corpus inteiro.
+    """
+
+    def __init__(
+        self, num_docs: int, postings: dict[str, tuple[np.ndarray, np.ndarray]], *, corpus: Optional[str] = None
+    ) -> None:
+        self.num_docs = num_docs
+        self.postings = postings
+        self.corpus = corpus
+
+    @classmethod
+    def build(cls, texts: Sequence[str], *, k1: float = 1.2, b: float = 0.75) -> "LexicalIndex":
+        docs = [Counter(tokenize(text)) for text in texts]
+        lengths = [sum(doc.values()) for doc in docs]
+        avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+        df: Counter[str] = Counter()
+        for doc in docs:
+            df.update(doc.keys())
+        raw: dict[str, tuple[list[int], list[float]]] = {}
+        for doc_id, (doc, length) in enumerate(zip(docs, lengths)):
+            norm = k1 * (1 - b + b * length / avg_len) if avg_len else k1
+            for term, tf in doc.items():
+                idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                ids, weights = raw.setdefault(term, ([], []))
+                ids.append(doc_id)
+                weights.append(idf * tf * (k1 + 1) / (tf + norm))
+        postings = {
+            term: (np.asarray(ids, dtype=np.int32), np.asarray(weights, dtype=np.float32))
+            for term, (ids, weights) in raw.items()
+        }
+        return cls(len(docs), postings, corpus=corpus_digest(texts))
+
+    @classmethod
+    def load(cls, path: Path) -> "LexicalIndex":
+        data = json.loads(lexical_path(path).read_text(encoding="utf-8"))
+        postings = {
+            term: (np.asarray(ids, dtype=np.int32), np.asarray(weights, dtype=np.float32))
+            for term, (ids, weights) in data["postings"].items()
+        }
+        return cls(data["num_docs"], postings, corpus=data.get("corpus"))
+
+    @classmethod
+    def load_or_build(cls, path: Path, chunks: Sequence[dict[str, Any]]) -> "LexicalIndex":
+        """
+        Le o indice gravado pelo build; se faltar ou for de outro conjunto de chunks, monta em
+        memoria. A comparacao e pelo conteudo (`corpus_digest`), nao so pela contagem: editar
+        um preco mantem o numero de chunks, e um .bm25.json antigo pontuaria o texto velho.
+        """
+        texts = [chunk.get("content", "") for chunk in chunks]
+        try:
+            index = cls.load(path)
+        except (OSError, ValueError, KeyError):
+            index = None
+        if index is None or index.corpus != corpus_digest(texts):
+            index = cls.build(texts)
+        return index
+
+    def save(self, path: Path) -> Path:
+        out = lexical_path(path)
+        data = {
+            "num_docs": self.num_docs,
+            "corpus": self.corpus,
+            "postings": {
+                term: [ids.tolist(), [round(float(w), 5) for w in weights]]
+                for term, (ids, weights) in self.postings.items()
+            },
+        }
+        tmp = out.with_name(out.name + ".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(out)
+        return out
+
+    def scores(self, query: str) -> np.ndarray:
+        """Score BM25 de cada chunk para a consulta (zeros se nenhum termo casar)."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                np.add.at(scores, posting[0], posting[1])
+        return scores
+
+
+def minmax(scores: np.ndarray) -> np.ndarray:
+    """Leva os scores da consulta para [0, 1] (pior chunk = 0, melhor = 1); constante vira zeros."""
+    if not scores.size:
+        return scores.astype(np.float32)
+    low, high = float(scores.min()), float(scores.max())
+    if high <= low:
+        return np.zeros(scores.shape, dtype=np.float32)
+    return ((scores - low) / (high - low)).astype(np.float32)
+
+
+def fuse(vector_scores: Optional[np.ndarray], lexical_scores: Optional[np.ndarray], alpha: float) -> np.ndarray:
+    """
+    Combinacao convexa dos scores normalizados: `alpha` * vetorial + (1 - alpha) * BM25.
+
+    Os dois lados passam por min-max na propria consulta, entao ambos ocupam [0, 1] inteiro:
+    o cosseno, que costuma variar pouco entre os chunks, nao fica espremido numa faixa
+    estreita perto de 0.5 enquanto o BM25 decide sozinho. Sem um dos lados, vale o outro
+    como veio (a ordem nao muda e BM25 zero continua significando "nenhum termo casou").
+    """
+    if vector_scores is None and lexical_scores is None:
+        raise ValueError("fuse precisa de ao menos um conjunto de scores")
+    if lexical_scores is None:
+        return vector_scores
+    if vector_scores is None:
+        return lexical_scores
+    return alpha * minmax(vector_scores) + (1 - alpha) * minmax(lexical_scores)
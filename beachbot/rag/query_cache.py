@@ -0,0 +1,142 @@
+"""Cache LRU de embeddings de consultas (texto normalizado -> vetor), com persistencia opcional."""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+from beachbot.rag.embeddings import Embedder
+from beachbot.rag.text import fold
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def query_key(text: str) -> str:
+    """Chave da consulta: sem acento/caixa e com espacos colapsados."""
+    return " ".join(fold(text).split())
+
+
+class QueryEmbeddingCache:
+    """
+    Vetores de consultas ja embedadas, limitados a `max_entries` (LRU).
+
+    O cache vale para um modelo de embedding: se o modelo mudar (indice regerado com outro
+    `--model` no build_embeddings), tudo e descartado. Com `path`, o conteudo e gravado em
+    .npz (em `save`, chamado no shutdown) e relido no proximo start se o modelo bater.
+    """
+
+    def __init__(self, *, max_entries: int = 2000, path: Optional[Path] = None) -> None:
+        self.max_entries = max_entries
+        self.path = path
+        self.model: Optional[str] = None
+        self.stats = QueryCacheStats()
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def use_model(self, model: str) -> None:
+        """Fixa o modelo das consultas; troca de modelo invalida o cache (e o arquivo)."""
+        with self._lock:
+            if model == self.model:
+                return
+            if self._entries:
+                self.stats.invalidations += 1
+                logger.info("Modelo de embedding mudou; cache de consultas descartado", extra={"model": model})
+            self._entries.clear()
+            self.model = model
+        self._load()
+
+    def wrap(self, embedder: Embedder) -> Embedder:
+        """Embedder que consulta o cache antes de chamar a API."""
+
+        async def _embed(text: str) -> list[float]:
+            key = query_key(text)
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            vector = await embedder(text)
+            self.put(key, vector)
+            return vector
+
+        return _embed
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return vector
+
+    def put(self, key: str, vector: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = np.asarray(vector, dtype=np.float32)
+            self._entries.move_to_end(key)
+            self._dirty = True
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def _load(self) -> None:
+        # cache desligado: `queries[-0:]` carregaria o arquivo inteiro
+        if self.max_entries <= 0:
+            return
+        if self.path is None or not self.path.exists() or self.model is None:
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data["model"]) != self.model:
+                    return
+                queries, vectors = data["queries"].tolist(), data["vectors"]
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Cache de consultas ilegivel (%s); comecando vazio", exc)
+            return
+        with self._lock:
+            for key, vector in zip(queries[-self.max_entries :], vectors[-self.max_entries :]):
+                self._entries.setdefault(key, vector)
+        logger.info("Cache de consultas carregado", extra={"entries": len(self._entries)})
+
+    def save(self) -> None:
+        """Grava o cache em disco (se houver `path` e algo novo)."""
+        if self.path is None or self.model is None or not self._dirty:
+            return
+        with self._lock:
+            queries = list(self._entries)
+            vectors = np.stack(list(self._entries.values())) if queries else np.zeros((0, 0), dtype=np.float32)
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp.npz")
+        np.savez(tmp, model=np.array(self.model), queries=np.array(queries, dtype=str), vectors=vectors)
+        tmp.replace(self.path)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**self.stats.snapshot(), "entries": len(self._entries), "model": self.model}
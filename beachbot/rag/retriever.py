@@ -0,0 +1,274 @@
+"""Busca na base de conhecimento sobre o indice de embeddings."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import numpy as np
+import yaml
+
+from beachbot.rag.embeddings import Embedder, openai_embedder
+from beachbot.rag.index import EmbeddingIndex, SearchHit, index_paths
+from beachbot.rag.lexical import LexicalIndex, fuse
+from beachbot.rag.query_cache import QueryEmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+KNOWLEDGE_CONFIG_PATH = PROJECT_ROOT / "beachbot" / "config" / "knowledge_config.yaml"
+DEFAULT_EMBED_MODEL = "text-embedding-3-large"
+
+
+def knowledge_embeddings_path() -> Path:
+    """Arquivo de embeddings da base de conhecimento (knowledge_config.yaml)."""
+    data = yaml.safe_load(KNOWLEDGE_CONFIG_PATH.read_text(encoding="utf-8")) or {}
+    return PROJECT_ROOT / data.get("embeddings_path", "beachbot/knowledge/embeddings/ct_combined.pkl")
+
+
+def index_version(path: Path) -> Optional[str]:
+    """Versao do indice em disco: hash do .meta.json (muda a cada build) ou None se nao houver."""
+    _, meta_path = index_paths(path)
+    try:
+        return hashlib.sha256(meta_path.read_bytes()).hexdigest()[:12]
+    except OSError:
+        legacy = path if path.suffix == ".pkl" else path.with_suffix(".pkl")
+        try:
+            stat = legacy.stat()
+        except OSError:
+            return None
+        return f"pkl-{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+@dataclass
+class KnowledgeSnapshot:
+    """Indices de uma versao da base; imutavel depois de carregado."""
+
+    version: Optional[str]
+    index: EmbeddingIndex
+    lexical: LexicalIndex
+    loaded_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    in_flight: int = 0
+
+    @classmethod
+    def load(cls, path: Path) -> "KnowledgeSnapshot":
+        version = index_version(path)
+        index = EmbeddingIndex.load(path)
+        return cls(version=version, index=index, lexical=LexicalIndex.load_or_build(path, index.chunks))
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at.isoformat(),
+            "chunks": len(self.index),
+            "model": self.index.model,
+            "dim": self.index.dim,
+            "dtype": self.index.dtype,
+            "in_flight": self.in_flight,
+        }
+
+
+_pinned: ContextVar[Optional[KnowledgeSnapshot]] = ContextVar("knowledge_snapshot", default=None)
+
+
+class Retriever:
+    """
+    Busca hibrida: BM25 (termos exatos, bom para consultas curtas como "valor trimestral")
+    fundido com a similaridade vetorial da pergunta. Se a API de embeddings falhar, a busca
+    segue so com o BM25.
+
+    Os indices ficam num `KnowledgeSnapshot`. `reload` carrega a versao nova fora do event
+    loop e troca a referencia de uma vez; turnos em andamento que fixaram a versao anterior
+    com `pin` continuam nela ate terminar.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        embedder: Optional[Embedder] = None,
+        top_k: int = 4,
+        alpha: float = 0.5,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ) -> None:
+        self.path = path
+        self.top_k = top_k
+        self.alpha = alpha
+        self.query_cache = query_cache or QueryEmbeddingCache(max_entries=0)
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._fixed_embedder = embedder
+        self._embedders: dict[str, Embedder] = {}
+        self._active: Optional[KnowledgeSnapshot] = None
+        self._retired: list[KnowledgeSnapshot] = []
+        self._reload_lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Retriever":
+        cache_path = os.getenv("RAG_QUERY_CACHE_PATH", "").strip()
+        return cls(
+            knowledge_embeddings_path(),
+            top_k=int(os.getenv("RAG_TOP_K", "4")),
+            alpha=float(os.getenv("RAG_HYBRID_ALPHA", "0.5")),
+            query_cache=QueryEmbeddingCache(
+                max_entries=int(os.getenv("RAG_QUERY_CACHE_SIZE", "2000")),
+                path=Path(cache_path) if cache_path else None,
+            ),
+        )
+
+    @property
+    def active(self) -> KnowledgeSnapshot:
+        """Versao corrente (carregada na primeira busca se ainda nao houver)."""
+        if self._active is None:
+            self._active = KnowledgeSnapshot.load(self.path)
+            logger.info("Indice de embeddings carregado", extra=self._active.describe())
+        return self._active
+
+    def current(self) -> KnowledgeSnapshot:
+        """Versao fixada no turno atual, ou a corrente."""
+        return _pinned.get() or self.active
+
+    @contextmanager
+    def pin(self) -> Iterator[Optional[KnowledgeSnapshot]]:
+        """
+        Fixa a versao corrente para todas as buscas feitas dentro do bloco (ex.: um turno).
+
+        Nao forca a carga: se nenhum indice foi carregado ainda, a primeira busca carrega.
+        """
+        snapshot = _pinned.get() or self._active
+        if snapshot is None:
+            yield None
+            return
+        snapshot.in_flight += 1
+        token = _pinned.set(snapshot)
+        try:
+            yield snapshot
+        finally:
+            _pinned.reset(token)
+            snapshot.in_flight -= 1
+            self._retired = [old for old in self._retired if old.in_flight > 0]
+
+    async def reload(self, *, force: bool = False) -> bool:
+        """Carrega o indice do disco se a versao mudou (ou `force`); devolve se trocou."""
+        async with self._reload_lock:
+            version = index_version(self.path)
+            if version is None:
+                self.last_error = f"indice nao encontrado: {self.path}"
+                return False
+            if not force and self._active is not None and version == self._active.version:
+                return False
+            try:
+                snapshot = await asyncio.to_thread(KnowledgeSnapshot.load, self.path)
+            except Exception as exc:  # noqa: BLE001
+                # build pela metade ou arquivo invalido: mantem a versao atual
+                self.last_error = repr(exc)
+                logger.exception("Falha ao recarregar indice; mantendo versao atual", exc_info=exc)
+                return False
+            previous, self._active = self._active, snapshot
+            if previous is not None and previous.in_flight > 0:
+                self._retired.append(previous)
+            self.reloads += 1
+            self.last_error = None
+            logger.info(
+                "Indice de embeddings trocado",
+                extra={"previous": previous.version if previous else None, **snapshot.describe()},
+            )
+            return True
+
+    async def watch(self, interval: float) -> None:
+        """Confere a versao em disco a cada `interval` segundos e recarrega quando mudar."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                version = index_version(self.path)
+                if version is not None and (self._active is None or version != self._active.version):
+                    await self.reload()
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Erro ao verificar indice de embeddings", exc_info=exc)
+
+    def embedder_for(self, model: Optional[str]) -> Embedder:
+        if self._fixed_embedder is not None:
+            return self._fixed_embedder
+        # a consulta precisa do mesmo modelo que gerou o indice
+        model = model or os.getenv("RAG_EMBED_MODEL", DEFAULT_EMBED_MODEL)
+        self.query_cache.use_model(model)
+        if model not in self._embedders:
+            self._embedders[model] = self.query_cache.wrap(openai_embedder(model))
+        return self._embedders[model]
+
+    async def search(self, question: str, k: Optional[int] = None) -> list[SearchHit]:
+        snapshot = self.current()
+        vector_scores = None
+        if self.alpha > 0:
+            try:
+                embedder = self.embedder_for(snapshot.index.model)
+                vector_scores = snapshot.index.scores(await embedder(question))
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Falha ao embedar consulta; usando so BM25: %s", exc)
+        return self.rank(question, vector_scores, k, snapshot=snapshot)
+
+    def rank(
+        self,
+        question: str,
+        vector_scores: Optional[np.ndarray],
+        k: Optional[int] = None,
+        *,
+        snapshot: Optional[KnowledgeSnapshot] = None,
+    ) -> list[SearchHit]:
+        """Funde os scores vetoriais (ja calculados) com o BM25 da pergunta e devolve o top-k."""
+        snapshot = snapshot or self.current()
+        lexical_scores = snapshot.lexical.scores(question) if self.alpha < 1 else None
+        if vector_scores is None and (lexical_scores is None or not lexical_scores.any()):
+            return []
+        hits = snapshot.index.top(fuse(vector_scores, lexical_scores, self.alpha), k or self.top_k)
+        # so BM25: chunk sem nenhum termo da pergunta nao e resultado
+        return hits if vector_scores is not None else [hit for hit in hits if hit.score > 0]
+
+    def status(self) -> dict[str, Any]:
+        """Versao ativa, versoes antigas ainda em uso por turnos e estado do ultimo reload."""
+        return {
+            "path": str(self.path),
+            "active": self._active.describe() if self._active is not None else None,
+            "draining": [old.describe() for old in self._retired if old.in_flight > 0],
+            "disk_version": index_version(self.path),
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
+
+    def snapshot(self) -> dict[str, Any]:
+        active = self._active
+        return {
+            "version": active.version if active is not None else None,
+            "chunks": len(active.index) if active is not None else None,
+            "model": active.index.model if active is not None else None,
+            "query_cache": self.query_cache.snapshot(),
+        }
+
+
+def format_hits(hits: list[SearchHit]) -> str:
+    """Texto devolvido ao agente: trechos com a fonte de cada um."""
+    if not hits:
+        return "Nenhum trecho relevante encontrado nos documentos."
+    return "\n\n".join(f"[{hit.chunk.get('source', '?')}] {hit.chunk.get('content', '')}" for hit in hits)
+
+
+_retriever: Optional[Retriever] = None
+
+
+def get_retriever() -> Retriever:
+    global _retriever
+    if _retriever is None:
+        _retriever = Retriever.from_env()
+    return _retriever
+
+
+def peek_retriever() -> Optional[Retriever]:
+    """Retriever ja criado (sem criar um), para stats e shutdown."""
+    return _retriever
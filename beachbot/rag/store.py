@@ -0,0 +1,80 @@
+"""Store de embeddings enderecado pelo conteudo do chunk (hash -> vetor), separado por modelo."""
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+def chunk_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _model_slug(model: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+
+
+class ChunkStore:
+    """
+    Vetores ja calculados, indexados pelo sha256 do texto do chunk.
+
+    Cada modelo tem seu par de arquivos (`<modelo>.npy` + `<modelo>.json` com os hashes na
+    ordem das linhas), de modo que trocar de modelo nunca mistura vetores. Um rebuild so
+    embeda os hashes que faltam; `retain` descarta os que sairam da base.
+    """
+
+    def __init__(self, directory: Path, model: str) -> None:
+        self.directory = directory
+        self.model = model
+        slug = _model_slug(model)
+        self.vectors_path = directory / f"{slug}.npy"
+        self.keys_path = directory / f"{slug}.json"
+        self._vectors: dict[str, np.ndarray] = {}
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._vectors
+
+    def _load(self) -> None:
+        if not (self.vectors_path.exists() and self.keys_path.exists()):
+            return
+        keys = json.loads(self.keys_path.read_text(encoding="utf-8"))
+        matrix = np.load(self.vectors_path)
+        if len(keys) != len(matrix):
+            # store corrompido/incompleto: recomeca do zero (so custa um rebuild completo)
+            return
+        self._vectors = dict(zip(keys, matrix))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        return self._vectors.get(key)
+
+    def put(self, key: str, vector: Iterable[float]) -> None:
+        self._vectors[key] = np.asarray(vector, dtype=np.float32)
+
+    def retain(self, keys: Iterable[str]) -> int:
+        """Mantem apenas `keys`; devolve quantos vetores foram descartados."""
+        keep = set(keys)
+        removed = [key for key in self._vectors if key not in keep]
+        for key in removed:
+            del self._vectors[key]
+        return len(removed)
+
+    def save(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        keys = list(self._vectors)
+        dim = len(next(iter(self._vectors.values()))) if keys else 0
+        matrix = np.stack([self._vectors[key] for key in keys]) if keys else np.zeros((0, dim), dtype=np.float32)
+        tmp_vectors = self.vectors_path.with_name(self.vectors_path.name + ".tmp")
+        with tmp_vectors.open("wb") as f:
+            np.save(f, matrix.astype(np.float32, copy=False))
+        tmp_keys = self.keys_path.with_name(self.keys_path.name + ".tmp")
+        tmp_keys.write_text(json.dumps(keys), encoding="utf-8")
+        tmp_vectors.replace(self.vectors_path)
+        tmp_keys.replace(self.keys_path)
@@ -0,0 +1,48 @@
+"""Normalizacao de texto em portugues para a busca lexical (acentos, stopwords, stemming leve)."""
+from __future__ import annotations
+
+import re
+import unicodedata
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# so artigos/preposicoes/conectivos: palavras de pergunta ("onde", "quanto") ajudam a busca
+STOPWORDS = frozenset(
+    "a o as os um uma uns umas de do da dos das em no na nos nas ao aos para pra pro por pelo pela "
+    "com sem e ou que se me te lhe eu voce voces ele ela eles elas meu minha seu sua isso esse essa "
+    "este esta aqui ai la oi ola".split()
+)
+
+
+def fold(text: str) -> str:
+    """Minusculas e sem acentos."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def stem(token: str) -> str:
+    """
+    Stemmer leve para portugues (plural + vogal tematica), no estilo do "light stemmer" de Savoy.
+
+    Nao e um RSLP completo: so precisa juntar variacoes como horario/horarios,
+    trimestral/trimestrais, valor/valores e aula/aulas.
+    """
+    if len(token) < 4 or token.isdigit():
+        return token
+    for suffix, replacement in (("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ois", "ol"), ("res", "r"), ("ns", "m")):
+        if token.endswith(suffix):
+            token = token[: -len(suffix)] + replacement
+            break
+    else:
+        if token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+    if token.endswith("mente") and len(token) > 7:
+        token = token[:-5]
+    if len(token) > 4 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Tokens normalizados (sem acento, sem stopwords, com stemming)."""
+    return [stem(token) for token in TOKEN_RE.findall(fold(text)) if token not in STOPWORDS]
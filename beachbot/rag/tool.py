@@ -0,0 +1,15 @@
+"""Tool de RAG do Knowledge Agent sobre o indice local (substitui o go_to_rag do AtendentePro)."""
+from __future__ import annotations
+
+from agents.tool import function_tool
+
+from beachbot.rag.retriever import format_hits, get_retriever
+
+
+@function_tool(name_override="go_to_rag")
+async def go_to_rag(question: str) -> str:
+    """
+    Busca trechos da base de conhecimento do CT relevantes para a pergunta.
+    """
+    hits = await get_retriever().search(question)
+    return format_hits(hits)
@@ -0,0 +1,157 @@
+"""Benchmark offline da recuperacao: recall@k, MRR e latencia sobre perguntas rotuladas."""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import yaml
+
+from beachbot.rag.embeddings import openai_embedder
+from beachbot.rag.query_cache import QueryEmbeddingCache, query_key
+from beachbot.rag.retriever import KNOWLEDGE_CONFIG_PATH, KnowledgeSnapshot, Retriever, knowledge_embeddings_path
+from beachbot.rag.text import fold
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_QUESTIONS = ROOT / "knowledge" / "eval" / "questions.yaml"
+
+
+def load_questions(path: Path) -> list[dict[str, Any]]:
+    """Perguntas rotuladas; avisa se alguma fonte nao esta nos documents do knowledge_config.yaml."""
+    items = (yaml.safe_load(path.read_text(encoding="utf-8")) or {}).get("questions") or []
+    config = yaml.safe_load(KNOWLEDGE_CONFIG_PATH.read_text(encoding="utf-8")) or {}
+    known = {Path(doc["path"]).name for doc in config.get("documents") or [] if doc.get("path")}
+    for item in items:
+        unknown = [source for source in item.get("sources", []) if source not in known]
+        if unknown:
+            print(f"Aviso: fonte(s) fora do knowledge_config.yaml em {item['question']!r}: {unknown}")
+    return items
+
+
+def vectors_path(questions: Path, model: Optional[str]) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model or "sem-modelo")
+    return questions.with_name(f"{questions.stem}.{slug}.npz")
+
+
+async def fetch_missing(cache: QueryEmbeddingCache, model: str, questions: list[str]) -> int:
+    """Embeda (online) as perguntas sem vetor gravado; unico passo que usa rede."""
+    embed = openai_embedder(model)
+    missing = [q for q in questions if cache.get(query_key(q)) is None]
+    for question in missing:
+        cache.put(query_key(question), await embed(question))
+    cache.save()
+    return len(missing)
+
+
+def is_relevant(chunk: dict[str, Any], item: dict[str, Any]) -> bool:
+    if chunk.get("source") not in item.get("sources", []):
+        return False
+    section = item.get("section")
+    if not section:
+        return True
+    return fold(section) in fold(" > ".join(chunk.get("headings") or []))
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run(
+    *,
+    index_path: Path,
+    questions_path: Path,
+    k: int,
+    mode: str,
+    alpha: float,
+    embed: bool,
+    repeat: int,
+    verbose: bool,
+) -> None:
+    items = load_questions(questions_path)
+    snapshot = KnowledgeSnapshot.load(index_path)
+    model = snapshot.index.model
+    retriever = Retriever(index_path, alpha={"vector": 1.0, "lexical": 0.0}.get(mode, alpha), top_k=k)
+
+    cache = QueryEmbeddingCache(max_entries=100_000, path=vectors_path(questions_path, model))
+    if mode != "lexical":
+        if model is None:
+            raise SystemExit("Indice sem modelo registrado (pickle legado?): rode com --mode lexical ou regere o indice.")
+        cache.use_model(model)
+        if embed:
+            print(f"Perguntas embedadas agora: {asyncio.run(fetch_missing(cache, model, [i['question'] for i in items]))}")
+
+    hits_at_k = 0
+    reciprocal = 0.0
+    latencies: list[float] = []
+    missing_vectors = 0
+    for item in items:
+        question = item["question"]
+        vector = cache.get(query_key(question)) if mode != "lexical" else None
+        if mode != "lexical" and vector is None:
+            # sem vetor gravado: no modo hybrid a pergunta segue so com o BM25
+            missing_vectors += 1
+            if mode == "vector":
+                continue
+        for _ in range(repeat):
+            started = time.perf_counter()
+            vector_scores = snapshot.index.scores(vector) if vector is not None else None
+            # ranking completo para o MRR; o recall olha so as k primeiras posicoes
+            ranking = retriever.rank(question, vector_scores, len(snapshot.index), snapshot=snapshot)
+            latencies.append((time.perf_counter() - started) * 1000)
+        position = next((pos for pos, hit in enumerate(ranking, start=1) if is_relevant(hit.chunk, item)), None)
+        if position is not None:
+            reciprocal += 1 / position
+            hits_at_k += position <= k
+        if verbose:
+            top = ranking[0].chunk.get("source") if ranking else "-"
+            print(f"  {'ok ' if position and position <= k else 'ERR'} rank={position or '-':>3} top1={top:<28} {question}")
+
+    evaluated = len(items) - (missing_vectors if mode == "vector" else 0)
+    print(f"Indice: {index_path} | versao do modelo: {model} | chunks: {len(snapshot.index)} | modo: {mode}")
+    if missing_vectors:
+        print(f"Perguntas sem vetor gravado: {missing_vectors} (rode uma vez com --embed para gravar)")
+    if not evaluated:
+        raise SystemExit("Nenhuma pergunta avaliada.")
+    print(f"Perguntas: {evaluated} | recall@{k}: {hits_at_k / evaluated:.3f} | MRR: {reciprocal / evaluated:.3f}")
+    print(
+        f"Latencia da busca (sem embedding da consulta): p50={percentile(latencies, 50):.3f} ms "
+        f"p99={percentile(latencies, 99):.3f} ms ({len(latencies)} buscas)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Mede a recuperacao da base (recall@k, MRR, p50/p99) offline sobre perguntas rotuladas."
+    )
+    parser.add_argument("--index", type=Path, default=knowledge_embeddings_path(), help="Indice (.npy ou .pkl legado).")
+    parser.add_argument("--questions", type=Path, default=DEFAULT_QUESTIONS, help=f"Perguntas (default: {DEFAULT_QUESTIONS})")
+    parser.add_argument("--k", type=int, default=4, help="Top-k avaliado (default: 4).")
+    parser.add_argument("--mode", choices=("hybrid", "vector", "lexical"), default="hybrid")
+    parser.add_argument("--alpha", type=float, default=0.5, help="Peso vetorial no modo hybrid (default: 0.5).")
+    parser.add_argument(
+        "--embed",
+        action="store_true",
+        help="Embeda (online) perguntas sem vetor gravado e salva ao lado do arquivo de perguntas.",
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticoes por pergunta para a latencia (default: 20).")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostra o resultado de cada pergunta.")
+    args = parser.parse_args()
+
+    run(
+        index_path=args.index,
+        questions_path=args.questions,
+        k=args.k,
+        mode=args.mode,
+        alpha=args.alpha,
+        embed=args.embed,
+        repeat=max(1, args.repeat),
+        verbose=args.verbose,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,25 @@
 from __future__ import annotations
 
 import argparse
-import pickle
-import textwrap
+import asyncio
+import json
+import random
+import time
 from pathlib import Path
-from typing import Iterable, Optional, Sequence
+from typing import Awaitable, Callable, Iterable, Optional, Sequence
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError, RateLimitError
 
+from beachbot.rag.chunker import chunk_markdown
+from beachbot.rag.index import STORAGE_DTYPES, EmbeddingIndex, index_paths
+from beachbot.rag.lexical import LexicalIndex
+from beachbot.rag.store import ChunkStore, chunk_hash
 
 ROOT = Path(__file__).resolve().parent.parent # Raiz do beachbot
 CONTENT_DIR = ROOT / "knowledge"                # Diretório de conteúdo
-DEFAULT_OUT = CONTENT_DIR / "embeddings" / "ct_combined.pkl" # Saída padrão
+DEFAULT_OUT = CONTENT_DIR / "embeddings" / "ct_combined.npy" # Saída padrão (+ ct_combined.meta.json)
+DEFAULT_STORE = CONTENT_DIR / "embeddings" / "store"          # Vetores por hash do chunk (por modelo)
 DEFAULT_FILES: Sequence[str] = [
     "faq_aula_experimental.md",
     "faq_publico_niveis.md",
@@ -26,25 +33,103 @@ DEFAULT_FILES: Sequence[str] = [
     "infos.md",
     "planos.md",
 ]
+# Erros transitorios da API: vale tentar de novo com backoff
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
 
+EmbedBatch = Callable[[list[str]], Awaitable[list[list[float]]]]
 
-def iter_chunks(paths: Iterable[Path], width: int) -> list[dict]: 
-    """Lê e quebra os arquivos em blocos com metadados minimalistas."""
+
+def iter_chunks(paths: Iterable[Path], width: int, overlap: int = 0) -> list[dict]:
+    """Lê e quebra os arquivos seguindo titulos, listas e pares pergunta/resposta."""
     chunks: list[dict] = []
     for path in paths:
-        text = path.read_text(encoding="utf-8").replace("\r\n", "\n")
-        section = f"# {path.name}\n\n{text}".strip()
-        for idx, para in enumerate(textwrap.wrap(section, width)):
+        text = path.read_text(encoding="utf-8")
+        for idx, piece in enumerate(chunk_markdown(text, max_chars=width, overlap=overlap)):
             chunks.append(
                 {
                     "chunk": {
                         "source": path.name,
                         "index": idx,
-                        "content": para,
+                        "content": piece["content"],
+                        "headings": piece["headings"],
                     }
                 }
             )
-    return chunks # Retorna a lista de chunks que 
+    return chunks
+
+
+async def embed_all(
+    texts: Sequence[str],
+    embed_batch: EmbedBatch,
+    *,
+    batch_size: int = 64,
+    concurrency: int = 4,
+    max_retries: int = 5,
+    backoff: float = 1.0,
+) -> list[list[float]]:
+    """Embeda `texts` em lotes concorrentes (limitados por `concurrency`), com retry exponencial."""
+    batches = [list(texts[i : i + batch_size]) for i in range(0, len(texts), max(1, batch_size))]
+    results: list[Optional[list[list[float]]]] = [None] * len(batches)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.monotonic()
+    done = done_chunks = 0
+
+    async def _run(idx: int) -> None:
+        nonlocal done, done_chunks
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                try:
+                    vectors = await embed_batch(batches[idx])
+                    break
+                except RETRYABLE_ERRORS as exc:
+                    if attempt == max_retries:
+                        raise
+                    delay = backoff * 2**attempt * (0.5 + random.random())
+                    print(f"  lote {idx + 1}: {type(exc).__name__}, nova tentativa em {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        if len(vectors) != len(batches[idx]):
+            raise RuntimeError(f"Lote {idx + 1}: {len(vectors)} embeddings para {len(batches[idx])} textos.")
+        results[idx] = vectors
+        done += 1
+        done_chunks += len(vectors)
+        print(f"  {done}/{len(batches)} lotes ({done_chunks}/{len(texts)} chunks) em {time.monotonic() - started:.1f}s")
+
+    await asyncio.gather(*(_run(idx) for idx in range(len(batches))))
+    return [vector for batch in results for vector in batch or []]
+
+
+def openai_batch_embedder(model: str, base_url: Optional[str] = None) -> EmbedBatch:
+    """Um request `input=[...]` por lote; o retry fica por conta de `embed_all`."""
+    client = AsyncOpenAI(base_url=base_url, max_retries=0)
+
+    async def _embed(batch: list[str]) -> list[list[float]]:
+        resp = await client.embeddings.create(model=model, input=batch)
+        return [item.embedding for item in sorted(resp.data, key=lambda item: item.index)]
+
+    return _embed
+
+
+def _previous_hashes(out_path: Path) -> dict[str, set[str]]:
+    """Hashes por arquivo do indice anterior (vazio se nao houver ou for de versao antiga)."""
+    _, meta_path = index_paths(out_path)
+    if not meta_path.exists():
+        return {}
+    by_source: dict[str, set[str]] = {}
+    for chunk in json.loads(meta_path.read_text(encoding="utf-8")).get("chunks", []):
+        if chunk.get("hash"):
+            by_source.setdefault(chunk.get("source", "?"), set()).add(chunk["hash"])
+    return by_source
+
+
+def _report_changes(previous: dict[str, set[str]], chunks: list[dict]) -> None:
+    current: dict[str, set[str]] = {}
+    for item in chunks:
+        current.setdefault(item["chunk"]["source"], set()).add(item["chunk"]["hash"])
+    for source in sorted(set(previous) | set(current)):
+        added = len(current.get(source, set()) - previous.get(source, set()))
+        removed = len(previous.get(source, set()) - current.get(source, set()))
+        if added or removed:
+            print(f"  {source}: +{added} / -{removed} chunks")
 
 
 def build_embeddings(
@@ -53,13 +138,32 @@ def build_embeddings(
     model: str,
     wrap_width: int,
     preview_out: Optional[Path] = None,
+    *,
+    overlap: int = 0,
+    batch_size: int = 64,
+    concurrency: int = 4,
+    max_retries: int = 5,
+    base_url: Optional[str] = None,
+    store_dir: Path = DEFAULT_STORE,
+    full: bool = False,
+    dims: Optional[int] = None,
+    dtype: str = "float32",
+    rescore: bool = True,
 ) -> None:
-    """Gera embeddings e salva em pickle."""
+    """
+    Gera embeddings e salva o indice (.npy float32 normalizado + .meta.json).
+
+    So os chunks cujo hash de conteudo nao esta no store do modelo sao enviados para a API;
+    `full=True` ignora o store e embeda tudo de novo. `dims`/`dtype` gravam uma representacao
+    compacta (ver `EmbeddingIndex.compact`); com `rescore` a matriz completa vai junto para
+    re-pontuar os melhores candidatos.
+    """
     load_dotenv(ROOT.parent / ".env")
-    client = OpenAI()
 
     paths = [CONTENT_DIR / name for name in files]
-    chunks = iter_chunks(paths, wrap_width)
+    chunks = iter_chunks(paths, wrap_width, overlap)
+    for item in chunks:
+        item["chunk"]["hash"] = chunk_hash(item["chunk"]["content"])
 
     if preview_out:
         preview_out.parent.mkdir(parents=True, exist_ok=True)
@@ -68,17 +172,45 @@ def build_embeddings(
             encoding="utf-8",
         )
 
-    embeds: list[dict] = []
-    for item in chunks:
-        content = item["chunk"]["content"]
-        resp = client.embeddings.create(model=model, input=content)
-        embeds.append({**item, "embedding": resp.data[0].embedding})
+    started = time.monotonic()
+    store = ChunkStore(store_dir, model)
+    previous = _previous_hashes(out_path)
+    # dict preserva a ordem e deduplica chunks com o mesmo texto
+    missing = {
+        item["chunk"]["hash"]: item["chunk"]["content"]
+        for item in chunks
+        if full or item["chunk"]["hash"] not in store
+    }
+    if missing:
+        vectors = asyncio.run(
+            embed_all(
+                list(missing.values()),
+                openai_batch_embedder(model, base_url),
+                batch_size=batch_size,
+                concurrency=concurrency,
+                max_retries=max_retries,
+            )
+        )
+        for key, vector in zip(missing, vectors):
+            store.put(key, vector)
+    removed = store.retain(item["chunk"]["hash"] for item in chunks)
+    store.save()
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    with out_path.open("wb") as f:
-        pickle.dump(embeds, f)
+    embeds = [store.get(item["chunk"]["hash"]) for item in chunks]
+    index = EmbeddingIndex.from_embeddings(embeds, [item["chunk"] for item in chunks], model=model)
+    if dims or dtype != "float32":
+        index = index.compact(dims=dims, dtype=dtype, keep_full=rescore)
+    # BM25 antes do indice: o .meta.json (que define a versao do hot reload) e publicado por ultimo
+    bm25_path = LexicalIndex.build([item["chunk"]["content"] for item in chunks]).save(out_path)
+    npy_path, meta_path = index.save(out_path)
 
-    print(f"Salvo {len(embeds)} embeddings em {out_path}")
+    reused = len({item["chunk"]["hash"] for item in chunks}) - len(missing)
+    print(f"Chunks: {len(chunks)} | reaproveitados: {reused} | embedados: {len(missing)} | descartados: {removed}")
+    _report_changes(previous, chunks)
+    print(
+        f"Salvo {len(index)} embeddings ({index.dim} dims, {index.dtype}, {index.nbytes / 1024:.0f} KiB) em {npy_path} "
+        f"(metadados em {meta_path.name}, BM25 em {bm25_path.name}) em {time.monotonic() - started:.1f}s"
+    )
 
 
 def main() -> None:
@@ -96,11 +228,17 @@ def main() -> None:
         default=900,
         help="Tamanho maximo de cada chunk (caracteres).",
     )
+    parser.add_argument( # Argumento para sobreposicao entre chunks da mesma secao
+        "--overlap",
+        type=int,
+        default=0,
+        help="Caracteres repetidos do chunk anterior quando uma secao e dividida (default: 0).",
+    )
     parser.add_argument( # Argumento para caminho de saída
         "--out",
         type=Path,
         default=DEFAULT_OUT,
-        help=f"Caminho do pickle de saida (default: {DEFAULT_OUT})",
+        help=f"Caminho do indice de saida (.npy; default: {DEFAULT_OUT})",
     )
     parser.add_argument( # Argumento para caminho de pré-visualização
         "--preview-out",
@@ -113,6 +251,55 @@ def main() -> None:
         default=DEFAULT_FILES,
         help=f"Lista de arquivos em knowledge/ (default: {', '.join(DEFAULT_FILES)})",
     )
+    parser.add_argument( # Argumentos de envio em lotes
+        "--batch-size",
+        type=int,
+        default=64,
+        help="Chunks por request de embedding (default: 64).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Requests simultaneos (default: 4).",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="Tentativas extras por lote em erros transitorios (default: 5).",
+    )
+    parser.add_argument( # Ex.: servidor stub local (beachbot/scripts/stub_embedding_server.py)
+        "--base-url",
+        help="Base URL da API compativel com OpenAI (ex: http://127.0.0.1:8001/v1).",
+    )
+    parser.add_argument( # Store incremental (hash do chunk -> vetor)
+        "--store-dir",
+        type=Path,
+        default=DEFAULT_STORE,
+        help=f"Diretorio do store de vetores por hash (default: {DEFAULT_STORE})",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignora o store e embeda todos os chunks de novo.",
+    )
+    parser.add_argument( # Representacao compacta (ver scripts/index_report.py)
+        "--dims",
+        type=int,
+        help="Trunca os vetores nas primeiras N dimensoes (Matryoshka; ex: 1024).",
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=STORAGE_DTYPES,
+        default="float32",
+        help="Tipo da matriz consultada: float32 (default), float16 ou int8.",
+    )
+    parser.add_argument(
+        "--no-rescore",
+        action="store_true",
+        help="Nao grava a matriz completa para re-pontuar candidatos da busca compacta.",
+    )
     args = parser.parse_args()
 
     build_embeddings(
@@ -120,7 +307,17 @@ def main() -> None:
         out_path=args.out,
         model=args.model,
         wrap_width=args.wrap_width,
+        overlap=args.overlap,
         preview_out=args.preview_out,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        max_retries=args.max_retries,
+        base_url=args.base_url,
+        store_dir=args.store_dir,
+        full=args.full,
+        dims=args.dims,
+        dtype=args.dtype,
+        rescore=not args.no_rescore,
     )
 
 
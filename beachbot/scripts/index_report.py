@@ -0,0 +1,124 @@
+"""Relatorio recall x tamanho das representacoes compactas do indice (dims/float16/int8)."""
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from beachbot.rag.index import STORAGE_DTYPES, EmbeddingIndex
+from beachbot.rag.retriever import knowledge_embeddings_path
+
+DEFAULT_DIMS = (3072, 2048, 1536, 1024, 768, 512, 256)
+
+
+def synthetic_queries(full: np.ndarray, per_chunk: int, noise: float, seed: int = 0) -> np.ndarray:
+    """Consultas sinteticas: cada chunk com ruido gaussiano (cosseno ~0.5 com a origem)."""
+    rng = np.random.default_rng(seed)
+    base = np.repeat(full, per_chunk, axis=0)
+    jitter = rng.standard_normal(base.shape).astype(np.float32)
+    jitter *= noise / np.linalg.norm(jitter, axis=1, keepdims=True)
+    queries = base + jitter
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def exact_top(full: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ full.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def evaluate(index: EmbeddingIndex, queries: np.ndarray, truth: np.ndarray, k: int) -> tuple[float, float, float]:
+    """(recall@k contra a busca exata, acerto do top-1, ms por consulta)."""
+    recall = top1 = 0.0
+    started = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        scores = index.scores(query)
+        got = np.argsort(-scores)[:k]
+        recall += len(set(got.tolist()) & set(expected.tolist())) / k
+        top1 += float(got[0] == expected[0])
+    elapsed = (time.perf_counter() - started) * 1000 / len(queries)
+    return recall / len(queries), top1 / len(queries), elapsed
+
+
+def report(
+    path: Path,
+    *,
+    k: int,
+    dims_options: tuple[int, ...],
+    queries_path: Optional[Path],
+    per_chunk: int,
+    noise: float,
+    rescore: int,
+) -> None:
+    base = EmbeddingIndex.load(path)
+    full = np.asarray(base.full if base.full is not None else base.vectors, dtype=np.float32)
+    if base.full is None and base.dtype != "float32":
+        raise SystemExit("Indice compacto sem matriz completa: regere com build_embeddings sem --no-rescore.")
+    reference = EmbeddingIndex(full, base.chunks, model=base.model, rescore=rescore)
+    queries = np.load(queries_path) if queries_path else synthetic_queries(full, per_chunk, noise)
+    k = min(k, len(full))
+    truth = exact_top(full, queries, k)
+
+    print(f"Indice: {path} | chunks: {len(full)} | dims: {full.shape[1]} | consultas: {len(queries)} | k={k}")
+    # KiB: matriz consultada (+ escalas), o que fica no page cache; tmp KiB: alocado por consulta
+    print(
+        f"{'dims':>5} {'dtype':>8} {'rescore':>7} {'KiB':>9} {'x menor':>7} {'tmp KiB':>8} "
+        f"{'recall@k':>8} {'top1':>6} {'ms/q':>7}"
+    )
+    full_bytes = full.nbytes
+    for dims in dims_options:
+        if dims > full.shape[1]:
+            continue
+        for dtype in STORAGE_DTYPES:
+            compact = reference.compact(dims=dims, dtype=dtype)
+            variants = [(False, compact.full)] + ([(True, compact.full)] if compact.full is not None else [])
+            for use_rescore, full_matrix in variants:
+                candidate = EmbeddingIndex(
+                    compact.vectors,
+                    compact.chunks,
+                    scales=compact.scales,
+                    full=full_matrix if use_rescore else None,
+                    rescore=rescore,
+                )
+                recall, top1, ms = evaluate(candidate, queries, truth, k)
+                print(
+                    f"{dims:>5} {dtype:>8} {('sim' if use_rescore else 'nao'):>7} {candidate.nbytes / 1024:>9.1f} "
+                    f"{full_bytes / candidate.nbytes:>7.1f} {candidate.scratch_nbytes / 1024:>8.1f} "
+                    f"{recall:>8.3f} {top1:>6.3f} {ms:>7.3f}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compara recall e tamanho das representacoes compactas do indice de embeddings."
+    )
+    parser.add_argument("--index", type=Path, default=knowledge_embeddings_path(), help="Indice (.npy ou .pkl legado).")
+    parser.add_argument("--k", type=int, default=4, help="Top-k avaliado (default: 4, igual a RAG_TOP_K).")
+    parser.add_argument(
+        "--dims",
+        type=int,
+        nargs="*",
+        default=list(DEFAULT_DIMS),
+        help="Dimensoes a testar (default: 3072 2048 1536 1024 768 512 256).",
+    )
+    parser.add_argument("--queries", type=Path, help="Vetores de consultas reais (.npy); sem isso usa consultas sinteticas.")
+    parser.add_argument("--per-chunk", type=int, default=20, help="Consultas sinteticas por chunk (default: 20).")
+    parser.add_argument("--noise", type=float, default=1.5, help="Norma do ruido das consultas sinteticas (default: 1.5).")
+    parser.add_argument("--rescore", type=int, default=32, help="Candidatos re-pontuados em float32 (default: 32).")
+    args = parser.parse_args()
+
+    report(
+        args.index,
+        k=args.k,
+        dims_options=tuple(args.dims),
+        queries_path=args.queries,
+        per_chunk=args.per_chunk,
+        noise=args.noise,
+        rescore=args.rescore,
+    )
+
+
+if __name__ == "__main__":
+    main()
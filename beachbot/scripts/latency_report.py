@@ -0,0 +1,113 @@
+"""Relatorio de latencia por mensagem (tabela turn_latency): p50/p95/p99 por hora e por caminho de agentes."""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+# Intervalos medidos (em segundos) a partir das colunas da turn_latency. Turnos sem envio
+# confirmado (sent_at nulo) ficam fora dos percentis de envio e aparecem na coluna "sem envio".
+METRICS = {
+    # chegada da primeira mensagem da rajada ate a Evolution confirmar a ultima mensagem
+    "total": "sent_at - received_at",
+    # chegada ate a primeira mensagem enviada (streaming antecipa)
+    "first": "COALESCE(first_sent_at, sent_at) - received_at",
+    "debounce": "debounce_fired_at - received_at",
+    # espera pelo turno anterior da mesma conversa
+    "queue": "turn_started_at - debounce_fired_at",
+    # historico, consulta ao cache de respostas e espera por vaga na fila de turnos
+    "admission": "admitted_at - turn_started_at",
+    # rede de agentes (so turnos que nao vieram do cache)
+    "agents": "turn_ended_at - admitted_at",
+    "send": "sent_at - turn_ended_at",
+}
+
+GROUPS = {
+    "hour": "to_char(date_trunc('hour', received_at AT TIME ZONE :tz), 'YYYY-MM-DD HH24:00')",
+    "path": "agent_path",
+}
+
+# percentile_cont e avg ignoram nulos: n conta so os turnos com a metrica medida
+QUERY = """
+SELECT grp, count(v) AS n, count(*) FILTER (WHERE sent_at IS NULL) AS unsent,
+       percentile_cont(0.50) WITHIN GROUP (ORDER BY v) AS p50,
+       percentile_cont(0.95) WITHIN GROUP (ORDER BY v) AS p95,
+       percentile_cont(0.99) WITHIN GROUP (ORDER BY v) AS p99,
+       avg(inbound_count) AS inbound
+FROM (
+    SELECT {group} AS grp, EXTRACT(EPOCH FROM ({metric})) AS v, sent_at, inbound_count
+    FROM turn_latency
+    WHERE received_at >= :since
+) t
+GROUP BY grp
+ORDER BY {order}
+LIMIT :limit
+"""
+
+
+def latency_rows(session: Any, *, since: datetime, metric: str, group: str, tz: str, limit: int) -> list[Any]:
+    """Percentis da metrica por grupo (hora ou caminho) e turnos sem envio confirmado."""
+    order = "grp" if group == "hour" else "n DESC, grp"
+    sql = QUERY.format(group=GROUPS[group], metric=METRICS[metric], order=order)
+    return session.execute(text(sql), {"since": since, "tz": tz, "limit": limit}).all()
+
+
+def _seconds(value: Optional[float]) -> str:
+    return f"{value:>8.2f}" if value is not None else f"{'-':>8}"
+
+
+def report(*, since_hours: float, metric: str, groups: list[str], tz: str, limit: int) -> None:
+    from beachbot.storage.db import SessionLocal
+
+    if SessionLocal is None:
+        print("DATABASE_URL nao definido.")
+        sys.exit(1)
+    since = datetime.now(timezone.utc) - timedelta(hours=since_hours)
+    print(f"Metrica: {metric} ({METRICS[metric]}) | desde {since.isoformat(timespec='minutes')} | fuso {tz}")
+    with SessionLocal() as session:
+        for group in groups:
+            rows = latency_rows(session, since=since, metric=metric, group=group, tz=tz, limit=limit)
+            label = "hora" if group == "hour" else "caminho"
+            print()
+            print(
+                f"{label:<40} {'n':>6} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'msgs/turno':>10} {'sem envio':>9}"
+            )
+            for row in rows:
+                print(
+                    f"{str(row.grp)[:40]:<40} {row.n:>6} {_seconds(row.p50)} {_seconds(row.p95)} {_seconds(row.p99)} "
+                    f"{float(row.inbound):>10.2f} {row.unsent:>9}"
+                )
+            if not rows:
+                print("(sem turnos no periodo)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Percentis de latencia por mensagem (p50/p95/p99) por hora e por caminho de agentes."
+    )
+    parser.add_argument("--since-hours", type=float, default=24.0, help="Janela analisada em horas (default: 24).")
+    parser.add_argument("--metric", choices=sorted(METRICS), default="total", help="Intervalo medido (default: total).")
+    parser.add_argument(
+        "--by",
+        choices=("hour", "path", "both"),
+        default="both",
+        help="Agrupamento: hora da chegada, caminho de agentes ou ambos (default: both).",
+    )
+    # Argumento de fuso para agrupar por hora local do CT
+    parser.add_argument("--tz", default=os.getenv("REPORT_TZ", "America/Sao_Paulo"), help="Fuso das horas.")
+    parser.add_argument("--limit", type=int, default=200, help="Maximo de linhas por tabela (default: 200).")
+    args = parser.parse_args()
+
+    groups = ["hour", "path"] if args.by == "both" else [args.by]
+    report(since_hours=args.since_hours, metric=args.metric, groups=groups, tz=args.tz, limit=args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Servidor local compativel com /v1/embeddings da OpenAI, para medir o build sem rede."""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import random
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    """Vetor deterministico por texto (mesmo texto, mesmo vetor)."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def create_app(*, dim: int, latency_ms: float, fail_rate: float) -> FastAPI:
+    app = FastAPI(title="stub-embeddings")
+    app.state.requests = 0
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request) -> dict:
+        payload = await request.json()
+        app.state.requests += 1
+        await asyncio.sleep(latency_ms / 1000)
+        if random.random() < fail_rate:
+            # erros transitorios para exercitar o retry do cliente
+            raise HTTPException(status_code=random.choice([429, 500, 503]), detail="stub: falha simulada")
+        inputs = payload.get("input")
+        texts = [inputs] if isinstance(inputs, str) else list(inputs or [])
+        return {
+            "object": "list",
+            "model": payload.get("model", "stub"),
+            "data": [
+                {"object": "embedding", "index": idx, "embedding": fake_embedding(text, dim)}
+                for idx, text in enumerate(texts)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.get("/stats")
+    async def stats() -> dict:
+        return {"requests": app.state.requests}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub local da API de embeddings (para build_embeddings --base-url).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--dim", type=int, default=3072, help="Dimensao dos vetores (default: 3072).")
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="Latencia simulada por request.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fracao de requests com erro 429/5xx.")
+    args = parser.parse_args()
+
+    app = create_app(dim=args.dim, latency_ms=args.latency_ms, fail_rate=args.fail_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Persistencia em Postgres via SQLAlchemy asyncio (asyncpg).
+
+Espelha os helpers de `beachbot.storage.db` com a mesma semantica, para uso dentro
+do event loop (handler/webhook) sem bloquear outras conversas enquanto o banco responde.
+Os modelos sao os mesmos do modulo sincrono.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from beachbot.storage.db import (
+    DATABASE_URL,
+    INGEST_SQL,
+    Client,
+    Conversation,
+    IngestResult,
+    Message,
+    TurnLatency,
+    build_ingest_params,
+    cache_fetched_window,
+    cache_ingested_rows,
+    cache_saved_message,
+    conversation_version_stmt,
+    history_fetch_limit,
+    last_messages_stmt,
+    merge_ingest_rows,
+    messages_after_stmt,
+    public_messages,
+    retry_ingest_params,
+    summary_update_stmt,
+    touch_conversation_stmt,
+    utcnow,
+)
+from beachbot.storage.history_cache import history_cache
+from beachbot.utils.metrics import DB_SECONDS, timed_async
+
+
+def _async_url(url: str) -> str:
+    """Converte a DATABASE_URL sincrona para o driver asyncpg."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+engine = create_async_engine(_async_url(DATABASE_URL), pool_pre_ping=True) if DATABASE_URL else None
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False) if engine else None
+
+
+def has_engine() -> bool:
+    return engine is not None
+
+
+def get_session() -> AsyncSession:
+    if SessionLocal is None:
+        raise RuntimeError("DATABASE_URL nao configurado; persistencia desabilitada.")
+    return SessionLocal()
+
+
+async def dispose() -> None:
+    """Fecha as conexoes do pool (shutdown do servidor)."""
+    if engine is not None:
+        await engine.dispose()
+
+
+async def _find_client(session: AsyncSession, instance_id: Optional[str], phone: str) -> Optional[Client]:
+    result = await session.execute(
+        select(Client).where(Client.instance_id == instance_id, Client.phone == phone)
+    )
+    return result.scalar_one_or_none()
+
+
+@timed_async(DB_SECONDS, "get_or_create_client")
+async def get_or_create_client(
+    session: AsyncSession, instance_id: Optional[str], phone: str, *, ts: Optional[datetime] = None
+) -> Client:
+    ts = ts or utcnow()
+    client = await _find_client(session, instance_id, phone)
+    if client:
+        client.last_seen_at = ts
+        session.add(client)
+        await session.commit()
+        await session.refresh(client)
+        return client
+
+    client = Client(instance_id=instance_id, phone=phone, created_at=ts, updated_at=ts, last_seen_at=ts)
+    session.add(client)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        client = await _find_client(session, instance_id, phone)
+        if client:
+            client.last_seen_at = ts
+            session.add(client)
+            await session.commit()
+            await session.refresh(client)
+            return client
+        raise
+    await session.refresh(client)
+    return client
+
+
+@timed_async(DB_SECONDS, "get_or_create_open_conversation")
+async def get_or_create_open_conversation(
+    session: AsyncSession, client_id: int, *, ts: Optional[datetime] = None
+) -> Conversation:
+    ts = ts or utcnow()
+    result = await session.execute(
+        select(Conversation)
+        .where(Conversation.client_id == client_id, Conversation.status == "open")
+        .order_by(Conversation.last_activity_at.desc())
+        .limit(1)
+    )
+    convo = result.scalar_one_or_none()
+    if convo:
+        return convo
+
+    convo = Conversation(
+        client_id=client_id,
+        status="open",
+        created_at=ts,
+        updated_at=ts,
+        last_activity_at=ts,
+    )
+    session.add(convo)
+    try:
+        await session.commit()
+    except IntegrityError:
+        # outra transacao abriu a conversa do cliente (indice unico parcial)
+        await session.rollback()
+        result = await session.execute(
+            select(Conversation).where(Conversation.client_id == client_id, Conversation.status == "open")
+        )
+        return result.scalar_one()
+    await session.refresh(convo)
+    return convo
+
+
+@timed_async(DB_SECONDS, "save_message")
+async def save_message(
+    session: AsyncSession,
+    conversation_id: int,
+    *,
+    role: str,
+    direction: str,
+    text: str,
+    ts: Optional[datetime] = None,
+    wa_message_id: Optional[str] = None,
+) -> Message:
+    ts = ts or utcnow()
+    msg = Message(
+        conversation_id=conversation_id,
+        role=role,
+        direction=direction,
+        text=text,
+        ts=ts,
+        wa_message_id=wa_message_id,
+    )
+    session.add(msg)
+    # atualiza ultima atividade
+    activity = (await session.execute(touch_conversation_stmt(conversation_id, ts))).one_or_none()
+    await session.commit()
+    await session.refresh(msg)
+    cache_saved_message(msg, activity)
+    return msg
+
+
+@timed_async(DB_SECONDS, "save_turn_latency")
+async def save_turn_latency(session: AsyncSession, **fields: Any) -> None:
+    """Grava a linha do tempo de um turno respondido (ver `TurnLatency`)."""
+    session.add(TurnLatency(**fields))
+    await session.commit()
+
+
+@timed_async(DB_SECONDS, "ingest_messages")
+async def ingest_messages(
+    session: AsyncSession, messages: Sequence[Any], *, ts: Optional[datetime] = None
+) -> list[IngestResult]:
+    """Grava um lote de mensagens recebidas em uma ida ao banco; devolve (client_id, conversation_id, message_id)."""
+    if not messages:
+        return []
+    params = build_ingest_params(messages, ts=ts)
+    rows = (await session.execute(INGEST_SQL, params)).all()
+    retry = retry_ingest_params(params, rows)
+    if retry is not None:
+        rows = merge_ingest_rows(rows, (await session.execute(INGEST_SQL, retry[0])).all(), retry[1])
+    await session.commit()
+    cache_ingested_rows(rows)
+    return [(row.client_id, row.conversation_id, row.message_id) for row in rows]
+
+
+# sem @timed_async: a ida ao banco ja e medida uma vez em `ingest_messages`
+async def ingest_message(
+    session: AsyncSession,
+    instance_id: Optional[str],
+    phone: str,
+    text: str,
+    *,
+    ts: Optional[datetime] = None,
+    wa_message_id: Optional[str] = None,
+) -> IngestResult:
+    """Versao de um item de `ingest_messages`."""
+    item = SimpleNamespace(instance_id=instance_id, sender=phone, text=text, message_id=wa_message_id)
+    return (await ingest_messages(session, [item], ts=ts))[0]
+
+
+@timed_async(DB_SECONDS, "fetch_last_messages")
+async def fetch_last_messages(
+    session: AsyncSession, conversation_id: int, limit: int = 20, *, with_ids: bool = False
+) -> list[dict[str, Any]]:
+    version = None
+    if history_cache.has(conversation_id):
+        version = (await session.execute(conversation_version_stmt(conversation_id))).scalar()
+    cached = history_cache.get(conversation_id, limit, version)
+    if cached is not None:
+        return cached if with_ids else public_messages(cached)
+
+    fetch_limit = history_fetch_limit(limit)
+    rows = (await session.execute(last_messages_stmt(conversation_id, fetch_limit))).all()
+    messages = cache_fetched_window(conversation_id, rows, fetch_limit)[-limit:]
+    return messages if with_ids else public_messages(messages)
+
+
+@timed_async(DB_SECONDS, "fetch_messages_after")
+async def fetch_messages_after(
+    session: AsyncSession, conversation_id: int, after_id: Optional[int], limit: Optional[int] = None
+) -> list[dict[str, Any]]:
+    """Mensagens (com id) ainda nao resumidas, as `limit` mais antigas; lote do resumo atrasado."""
+    rows = (await session.execute(messages_after_stmt(conversation_id, after_id, limit))).all()
+    return [{"id": row.id, "role": row.role, "content": row.text} for row in rows]
+
+
+@timed_async(DB_SECONDS, "fetch_recent_user_timestamps")
+async def fetch_recent_user_timestamps(session: AsyncSession, client_id: int, limit: int = 20) -> list[datetime]:
+    """Horarios das ultimas mensagens do usuario (todas as conversas do cliente), em ordem crescente."""
+    result = await session.execute(
+        select(Message.ts)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(Conversation.client_id == client_id, Message.role == "user")
+        .order_by(Message.ts.desc())
+        .limit(limit)
+    )
+    return list(reversed(result.scalars().all()))
+
+
+@timed_async(DB_SECONDS, "get_conversation_summary")
+async def get_conversation_summary(
+    session: AsyncSession, conversation_id: int
+) -> tuple[Optional[str], Optional[int]]:
+    result = await session.execute(
+        select(Conversation.summary_text, Conversation.summary_until_message_id).where(Conversation.id == conversation_id)
+    )
+    row = result.one_or_none()
+    return (row.summary_text, row.summary_until_message_id) if row else (None, None)
+
+
+@timed_async(DB_SECONDS, "save_conversation_summary")
+async def save_conversation_summary(
+    session: AsyncSession, conversation_id: int, summary: str, *, until_id: int, previous_until_id: Optional[int]
+) -> bool:
+    result = await session.execute(summary_update_stmt(conversation_id, summary, until_id, previous_until_id))
+    await session.commit()
+    return bool(result.rowcount)
+
+
+@timed_async(DB_SECONDS, "touch_client_last_seen")
+async def touch_client_last_seen(session: AsyncSession, client_id: int, ts: Optional[datetime] = None) -> None:
+    ts = ts or utcnow()
+    await session.execute(
+        update(Client).where(Client.id == client_id).values(last_seen_at=ts, updated_at=utcnow())
+    )
+    await session.commit()
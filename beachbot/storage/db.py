@@ -2,8 +2,9 @@
 from __future__ import annotations
 
 import os
-from datetime import datetime, timezone
-from typing import Any, Optional
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Optional, Sequence
 
 from sqlalchemy import (
     Column,
@@ -18,10 +19,15 @@ from sqlalchemy import (
     Time,
     UniqueConstraint,
     create_engine,
+    select,
+    text,
+    update,
 )
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 
+from beachbot.storage.history_cache import history_cache
+
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -58,12 +64,17 @@ class Conversation(Base):
     buffer_text = Column(Text, nullable=True)
     buffer_started_at = Column(DateTime(timezone=True), nullable=True)
     buffer_last_at = Column(DateTime(timezone=True), nullable=True)
+    # resumo incremental das mensagens antigas (fora do orcamento de tokens do historico)
+    summary_text = Column(Text, nullable=True)
+    summary_until_message_id = Column(Integer, nullable=True)
 
     client = relationship("Client", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation")
 
     __table_args__ = (
         Index("ix_conversations_client_last", "client_id", "last_activity_at"),
+        # no maximo uma conversa aberta por cliente (ingestao concorrente usa ON CONFLICT)
+        Index("uq_conversations_client_open", "client_id", unique=True, postgresql_where=text("status = 'open'")),
     )
 
 
@@ -107,6 +118,56 @@ class AulaExperimental(Base):
     conversation = relationship("Conversation")
 
 
+class InboundJob(Base):
+    """Mensagem recebida pelo webhook aguardando processamento pelos workers (fila duravel)."""
+
+    __tablename__ = "inbound_jobs"
+    id = Column(Integer, primary_key=True)
+    instance_id = Column(String, nullable=True)
+    sender = Column(String, nullable=False)
+    text = Column(Text, nullable=False)
+    wa_message_id = Column(String, nullable=True)
+    status = Column(
+        Enum("pending", "running", "done", "failed", name="job_status"),
+        default="pending",
+        nullable=False,
+    )
+    attempts = Column(Integer, default=0, nullable=False)
+    available_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, nullable=False)
+    # indices parciais (pendentes por disponibilidade/remetente e wa_message_id unico) na migration 0002
+
+
+class TurnLatency(Base):
+    """Linha do tempo de um turno respondido: chegada, debounce, rede de agentes e envio."""
+
+    __tablename__ = "turn_latency"
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    # resposta gravada em messages (role=assistant)
+    message_id = Column(Integer, ForeignKey("messages.id"), nullable=True)
+    received_at = Column(DateTime(timezone=True), nullable=False)
+    debounce_fired_at = Column(DateTime(timezone=True), nullable=True)
+    # inicio do turno na conversa (antes do historico, do cache e da fila de turnos)
+    turn_started_at = Column(DateTime(timezone=True), nullable=False)
+    # vaga na fila de turnos obtida: a rede de agentes comeca aqui (None = resposta do cache)
+    admitted_at = Column(DateTime(timezone=True), nullable=True)
+    turn_ended_at = Column(DateTime(timezone=True), nullable=False)
+    first_sent_at = Column(DateTime(timezone=True), nullable=True)
+    # ultima confirmacao de envio (None = envio nao confirmado)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    # agentes percorridos ("Triage Agent > Knowledge Agent"; "cache" = resposta do cache semantico)
+    agent_path = Column(String, nullable=False)
+    inbound_count = Column(Integer, default=1, nullable=False)
+    outcome = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+    __table_args__ = (Index("ix_turn_latency_received", "received_at"),)
+
+
 def has_engine() -> bool:
     return engine is not None
 
@@ -172,7 +233,16 @@ def get_or_create_open_conversation(session, client_id: int, *, ts: Optional[dat
         last_activity_at=ts,
     )
     session.add(convo)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        # outra transacao abriu a conversa do cliente (indice unico parcial)
+        session.rollback()
+        return (
+            session.query(Conversation)
+            .filter(Conversation.client_id == client_id, Conversation.status == "open")
+            .one()
+        )
     session.refresh(convo)
     return convo
 
@@ -198,24 +268,371 @@ def save_message(
     )
     session.add(msg)
     # atualiza ultima atividade
-    session.query(Conversation).filter(Conversation.id == conversation_id).update(
-        {"last_activity_at": ts, "updated_at": utcnow()}
-    )
+    activity = session.execute(touch_conversation_stmt(conversation_id, ts)).one_or_none()
     session.commit()
     session.refresh(msg)
+    cache_saved_message(msg, activity)
     return msg
 
 
-def fetch_last_messages(session, conversation_id: int, limit: int = 20) -> list[dict[str, str]]:
+# Statements e ajustes de cache compartilhados com async_db.
+def touch_conversation_stmt(conversation_id: int, ts: datetime):
+    """Atualiza last_activity_at devolvendo (valor anterior, valor novo) para o write-through do cache."""
+    previous = (
+        select(Conversation.id, Conversation.last_activity_at.label("previous"))
+        .where(Conversation.id == conversation_id)
+        .with_for_update()
+        .subquery()
+    )
+    return (
+        update(Conversation)
+        .where(Conversation.id == previous.c.id)
+        .values(last_activity_at=ts, updated_at=utcnow())
+        .returning(previous.c.previous, Conversation.last_activity_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def conversation_version_stmt(conversation_id: int):
+    return select(Conversation.last_activity_at).where(Conversation.id == conversation_id)
+
+
+def last_messages_stmt(conversation_id: int, limit: int):
+    """Ultimas mensagens + last_activity_at da conversa no mesmo snapshot (versao do cache)."""
+    return (
+        select(Message.id, Message.role, Message.text, Conversation.last_activity_at)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.ts.desc())
+        .limit(limit)
+    )
+
+
+def messages_after_stmt(conversation_id: int, after_id: Optional[int], limit: Optional[int] = None):
+    """Mensagens da conversa depois de `after_id` (todas se None), mais antigas primeiro."""
+    stmt = select(Message.id, Message.role, Message.text).where(Message.conversation_id == conversation_id)
+    if after_id is not None:
+        stmt = stmt.where(Message.id > after_id)
+    stmt = stmt.order_by(Message.ts, Message.id)
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+def history_fetch_limit(limit: int) -> int:
+    """Na falta de cache, le a janela inteira para que as proximas leituras sejam hit."""
+    return max(limit, history_cache.window) if history_cache.enabled else limit
+
+
+def cache_fetched_window(conversation_id: int, rows: Sequence[Any], fetch_limit: int) -> list[dict[str, Any]]:
+    """Converte linhas de `last_messages_stmt` (mais recentes primeiro) e guarda no cache."""
+    messages = [{"id": row.id, "role": row.role, "content": row.text} for row in reversed(rows)]
+    if rows:
+        history_cache.put(conversation_id, messages, rows[0].last_activity_at, exhaustive=len(rows) < fetch_limit)
+    return messages
+
+
+def cache_saved_message(msg: Message, activity: Any) -> None:
+    if activity is None:
+        history_cache.invalidate(msg.conversation_id)
+        return
+    history_cache.append(
+        msg.conversation_id,
+        [{"id": msg.id, "role": msg.role, "content": msg.text}],
+        previous_version=activity.previous,
+        version=activity.last_activity_at,
+    )
+
+
+def cache_ingested_rows(rows: Sequence[Any]) -> None:
+    """Write-through das mensagens gravadas por INGEST_SQL."""
+    by_conversation: dict[int, list[Any]] = {}
+    for row in rows:
+        if row.message_id is not None:
+            by_conversation.setdefault(row.conversation_id, []).append(row)
+    for conversation_id, inserted in by_conversation.items():
+        messages = [{"id": row.message_id, "role": "user", "content": row.text} for row in inserted]
+        first = inserted[0]
+        if first.new_conversation:
+            history_cache.put(conversation_id, messages, max(row.ts for row in inserted), exhaustive=True)
+        else:
+            history_cache.append(
+                conversation_id,
+                messages,
+                previous_version=first.previous_activity_at,
+                version=first.activity_at,
+            )
+
+
+def summary_update_stmt(conversation_id: int, summary: str, until_id: int, previous_until_id: Optional[int]):
+    """Grava o resumo so se ninguem avancou o resumo desde a leitura (varios workers)."""
+    return (
+        update(Conversation)
+        .where(
+            Conversation.id == conversation_id,
+            Conversation.summary_until_message_id.is_not_distinct_from(previous_until_id),
+        )
+        .values(summary_text=summary, summary_until_message_id=until_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def public_messages(messages: Sequence[dict[str, Any]]) -> list[dict[str, str]]:
+    return [{"role": m["role"], "content": m["content"]} for m in messages]
+
+
+# Ingestao em uma ida ao banco: upsert do cliente, conversa aberta (reutiliza ou cria)
+# e insert das mensagens, tudo no mesmo statement via CTEs. Aceita lote (arrays + unnest).
+# Mensagem com wa_message_id repetido na conversa (reentrega do webhook) nao e gravada
+# e volta com message_id NULL. As colunas extras alimentam o write-through do cache.
+# Se outra transacao abrir a conversa do cliente no meio do statement, o indice unico
+# parcial barra a segunda conversa (DO NOTHING) e as mensagens desse cliente ficam fora
+# do resultado: `retry_ingest_params` monta a releitura so delas (ver `ingest_messages`).
+# Ordem de travas: cliente e depois conversa, em todos os caminhos (evita deadlock entre
+# ingestoes concorrentes do mesmo remetente).
+INGEST_SQL = text(
+    """
+WITH input AS (
+    SELECT *
+    FROM unnest(
+        CAST(:instance_ids AS varchar[]),
+        CAST(:phones AS varchar[]),
+        CAST(:texts AS text[]),
+        CAST(:tss AS timestamptz[]),
+        CAST(:wa_ids AS varchar[])
+    ) WITH ORDINALITY AS t(instance_id, phone, text, ts, wa_message_id, ord)
+),
+senders AS (
+    SELECT instance_id, phone, max(ts) AS ts
+    FROM input
+    GROUP BY instance_id, phone
+),
+found_clients AS (
+    SELECT DISTINCT ON (s.instance_id, s.phone) c.id, s.instance_id, s.phone, s.ts
+    FROM senders s
+    JOIN clients c ON c.phone = s.phone AND c.instance_id IS NOT DISTINCT FROM s.instance_id
+    ORDER BY s.instance_id, s.phone, c.id
+),
+touched_clients AS (
+    UPDATE clients c
+    SET last_seen_at = f.ts, updated_at = :now
+    FROM found_clients f
+    WHERE c.id = f.id
+    RETURNING c.id, c.instance_id, c.phone
+),
+new_clients AS (
+    INSERT INTO clients (instance_id, phone, created_at, updated_at, last_seen_at)
+    SELECT s.instance_id, s.phone, s.ts, s.ts, s.ts
+    FROM senders s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM found_clients f
+        WHERE f.phone = s.phone AND f.instance_id IS NOT DISTINCT FROM s.instance_id
+    )
+    ON CONFLICT ON CONSTRAINT uix_clients_instance_phone
+    DO UPDATE SET last_seen_at = EXCLUDED.last_seen_at, updated_at = EXCLUDED.updated_at
+    RETURNING id, instance_id, phone
+),
+all_clients AS (
+    -- via touched_clients (e nao found_clients): a linha do cliente e travada antes da
+    -- conversa em todos os caminhos, inclusive no ON CONFLICT de new_clients
+    SELECT id, instance_id, phone FROM touched_clients
+    UNION ALL
+    SELECT id, instance_id, phone FROM new_clients
+),
+open_convs AS (
+    SELECT DISTINCT ON (cv.client_id) cv.id, cv.client_id
+    FROM conversations cv
+    JOIN all_clients ac ON ac.id = cv.client_id
+    WHERE cv.status = 'open'
+    ORDER BY cv.client_id, cv.last_activity_at DESC
+),
+new_convs AS (
+    INSERT INTO conversations (client_id, status, created_at, updated_at, last_activity_at)
+    SELECT ac.id, CAST('open' AS conversation_status), s.ts, s.ts, s.ts
+    FROM all_clients ac
+    JOIN senders s ON s.phone = ac.phone AND s.instance_id IS NOT DISTINCT FROM ac.instance_id
+    WHERE NOT EXISTS (SELECT 1 FROM open_convs oc WHERE oc.client_id = ac.id)
+    ON CONFLICT (client_id) WHERE status = 'open' DO NOTHING
+    RETURNING id, client_id
+),
+convs AS (
+    SELECT id, client_id FROM open_convs
+    UNION ALL
+    SELECT id, client_id FROM new_convs
+),
+routed AS (
+    SELECT i.ord, i.text, i.ts, i.wa_message_id, ac.id AS client_id, cv.id AS conversation_id
+    FROM input i
+    JOIN all_clients ac ON ac.phone = i.phone AND ac.instance_id IS NOT DISTINCT FROM i.instance_id
+    JOIN convs cv ON cv.client_id = ac.id
+),
+inserted AS (
+    INSERT INTO messages (conversation_id, role, direction, text, ts, wa_message_id)
+    SELECT conversation_id, CAST('user' AS message_role), CAST('in' AS message_direction), text, ts, wa_message_id
+    FROM routed
+    ORDER BY ord
+    ON CONFLICT (conversation_id, wa_message_id) WHERE wa_message_id IS NOT NULL DO NOTHING
+    RETURNING id, conversation_id, ts, wa_message_id
+),
+locked_convs AS (
+    -- NO KEY UPDATE basta e nao conflita com o KEY SHARE que a FK das mensagens segura
+    SELECT cv.id, cv.last_activity_at AS previous
+    FROM conversations cv
+    WHERE cv.id IN (SELECT conversation_id FROM inserted)
+    FOR NO KEY UPDATE
+),
+activity AS (
+    UPDATE conversations cv
+    SET last_activity_at = GREATEST(l.previous, a.ts), updated_at = :now
+    FROM (SELECT conversation_id, max(ts) AS ts FROM inserted GROUP BY conversation_id) a
+    JOIN locked_convs l ON l.id = a.conversation_id
+    WHERE cv.id = a.conversation_id
+    RETURNING cv.id, l.previous, cv.last_activity_at
+)
+SELECT
+    r.ord,
+    r.client_id,
+    r.conversation_id,
+    m.id AS message_id,
+    r.text,
+    r.ts,
+    nc.id IS NOT NULL AS new_conversation,
+    act.previous AS previous_activity_at,
+    act.last_activity_at AS activity_at
+FROM routed r
+LEFT JOIN inserted m
+    ON m.conversation_id = r.conversation_id
+    AND m.ts = r.ts
+    AND m.wa_message_id IS NOT DISTINCT FROM r.wa_message_id
+LEFT JOIN new_convs nc ON nc.id = r.conversation_id
+LEFT JOIN activity act ON act.id = r.conversation_id
+ORDER BY r.ord
+"""
+)
+
+IngestResult = tuple[int, int, Optional[int]]
+
+
+def build_ingest_params(messages: Sequence[Any], *, ts: Optional[datetime] = None) -> dict[str, Any]:
+    """
+    Monta os parametros de INGEST_SQL.
+
+    `messages` sao objetos no formato de `ParsedMessage` (sender, text, message_id,
+    instance_id). Mensagens do mesmo lote recebem ts crescente (1 microssegundo) para
+    manter a ordem de chegada no historico.
+    """
+    ts = ts or utcnow()
+    return {
+        "instance_ids": [m.instance_id for m in messages],
+        "phones": [m.sender for m in messages],
+        "texts": [m.text for m in messages],
+        "tss": [ts + timedelta(microseconds=idx) for idx in range(len(messages))],
+        "wa_ids": [m.message_id for m in messages],
+        "now": utcnow(),
+    }
+
+
+def retry_ingest_params(params: dict[str, Any], rows: Sequence[Any]) -> Optional[tuple[dict[str, Any], list[int]]]:
+    """
+    Parametros de INGEST_SQL so para as mensagens que ficaram sem linha no resultado.
+
+    Devolve tambem a posicao original de cada uma (None se nada faltou). A nova execucao
+    tem snapshot proprio e enxerga a conversa aberta pela transacao concorrente.
+    """
+    returned = {row.ord for row in rows}
+    missing = [idx for idx in range(len(params["phones"])) if idx + 1 not in returned]
+    if not missing:
+        return None
+    subset = {key: [values[idx] for idx in missing] for key, values in params.items() if key != "now"}
+    return {**subset, "now": params["now"]}, missing
+
+
+def merge_ingest_rows(rows: Sequence[Any], retried: Sequence[Any], positions: list[int]) -> list[Any]:
+    """Junta as linhas da releitura as da primeira execucao, na ordem original do lote."""
+    by_position = {row.ord - 1: row for row in rows}
+    for row in retried:
+        by_position[positions[row.ord - 1]] = row
+    if len(by_position) < len(rows) + len(positions):
+        raise RuntimeError("Ingestao sem conversa aberta para parte do lote")
+    return [by_position[idx] for idx in sorted(by_position)]
+
+
+def ingest_messages(session, messages: Sequence[Any], *, ts: Optional[datetime] = None) -> list[IngestResult]:
+    """Grava um lote de mensagens recebidas em uma ida ao banco; devolve (client_id, conversation_id, message_id)."""
+    if not messages:
+        return []
+    params = build_ingest_params(messages, ts=ts)
+    rows = session.execute(INGEST_SQL, params).all()
+    retry = retry_ingest_params(params, rows)
+    if retry is not None:
+        rows = merge_ingest_rows(rows, session.execute(INGEST_SQL, retry[0]).all(), retry[1])
+    session.commit()
+    cache_ingested_rows(rows)
+    return [(row.client_id, row.conversation_id, row.message_id) for row in rows]
+
+
+def ingest_message(
+    session,
+    instance_id: Optional[str],
+    phone: str,
+    text: str,
+    *,
+    ts: Optional[datetime] = None,
+    wa_message_id: Optional[str] = None,
+) -> IngestResult:
+    """Versao de um item de `ingest_messages`."""
+    item = SimpleNamespace(instance_id=instance_id, sender=phone, text=text, message_id=wa_message_id)
+    return ingest_messages(session, [item], ts=ts)[0]
+
+
+def fetch_last_messages(
+    session, conversation_id: int, limit: int = 20, *, with_ids: bool = False
+) -> list[dict[str, Any]]:
+    version = None
+    if history_cache.has(conversation_id):
+        version = session.execute(conversation_version_stmt(conversation_id)).scalar()
+    cached = history_cache.get(conversation_id, limit, version)
+    if cached is not None:
+        return cached if with_ids else public_messages(cached)
+
+    fetch_limit = history_fetch_limit(limit)
+    rows = session.execute(last_messages_stmt(conversation_id, fetch_limit)).all()
+    messages = cache_fetched_window(conversation_id, rows, fetch_limit)[-limit:]
+    return messages if with_ids else public_messages(messages)
+
+
+def fetch_messages_after(
+    session, conversation_id: int, after_id: Optional[int], limit: Optional[int] = None
+) -> list[dict[str, Any]]:
+    """Mensagens (com id) ainda nao resumidas, as `limit` mais antigas; lote do resumo atrasado."""
+    rows = session.execute(messages_after_stmt(conversation_id, after_id, limit)).all()
+    return [{"id": row.id, "role": row.role, "content": row.text} for row in rows]
+
+
+def fetch_recent_user_timestamps(session, client_id: int, limit: int = 20) -> list[datetime]:
+    """Horarios das ultimas mensagens do usuario (todas as conversas do cliente), em ordem crescente."""
     rows = (
-        session.query(Message)
-        .filter(Message.conversation_id == conversation_id)
+        session.query(Message.ts)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .filter(Conversation.client_id == client_id, Message.role == "user")
         .order_by(Message.ts.desc())
         .limit(limit)
         .all()
     )
-    messages = [{"role": m.role, "content": m.text} for m in reversed(rows)]
-    return messages
+    return [row.ts for row in reversed(rows)]
+
+
+def get_conversation_summary(session, conversation_id: int) -> tuple[Optional[str], Optional[int]]:
+    row = session.execute(
+        select(Conversation.summary_text, Conversation.summary_until_message_id).where(Conversation.id == conversation_id)
+    ).one_or_none()
+    return (row.summary_text, row.summary_until_message_id) if row else (None, None)
+
+
+def save_conversation_summary(
+    session, conversation_id: int, summary: str, *, until_id: int, previous_until_id: Optional[int]
+) -> bool:
+    result = session.execute(summary_update_stmt(conversation_id, summary, until_id, previous_until_id))
+    session.commit()
+    return bool(result.rowcount)
 
 
 def touch_client_last_seen(session, client_id: int, ts: Optional[datetime] = None) -> None:
@@ -0,0 +1,158 @@
+"""Cache em memoria (LRU) das janelas recentes de mensagens por conversa."""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    evictions: int = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+
+@dataclass
+class _Window:
+    version: datetime
+    messages: deque
+    exhaustive: bool
+    touched: float = field(default_factory=time.monotonic)
+
+
+class HistoryCache:
+    """
+    Janela das ultimas mensagens por conversa, atualizada na escrita (write-through).
+
+    A versao de cada janela e o `Conversation.last_activity_at` que o banco tinha quando
+    ela foi montada/atualizada. A leitura so e hit se a versao bate com a do banco, e a
+    escrita so estende a janela se a versao anterior da conversa (devolvida pelo proprio
+    UPDATE) bate com a da janela; caso contrario a janela e descartada. Assim, escritas
+    de outros processos/workers na mesma conversa nunca geram historico incompleto.
+    Janelas ociosas ha mais de `idle_ttl` segundos saem primeiro; o total e limitado por
+    `max_conversations`.
+    """
+
+    def __init__(self, *, max_conversations: int = 2000, window: int = 60, idle_ttl: float = 1800.0) -> None:
+        self.max_conversations = max_conversations
+        self.window = window
+        self.idle_ttl = idle_ttl
+        self.stats = CacheStats()
+        self._entries: OrderedDict[int, _Window] = OrderedDict()
+        # helpers sync (tools) e async (handler) compartilham o cache
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "HistoryCache":
+        return cls(
+            max_conversations=int(os.getenv("HISTORY_CACHE_CONVERSATIONS", "2000")),
+            window=int(os.getenv("HISTORY_CACHE_WINDOW", "60")),
+            idle_ttl=float(os.getenv("HISTORY_CACHE_IDLE_SECONDS", "1800")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_conversations > 0 and self.window > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def has(self, conversation_id: int) -> bool:
+        return conversation_id in self._entries
+
+    def get(self, conversation_id: int, limit: int, version: Optional[datetime]) -> Optional[list[dict[str, Any]]]:
+        """Ultimas `limit` mensagens (mais antigas primeiro) se a janela estiver atualizada."""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None or version is None or entry.version != version:
+                if entry is not None:
+                    del self._entries[conversation_id]
+                    self.stats.invalidations += 1
+                self.stats.misses += 1
+                return None
+            if limit > len(entry.messages) and not entry.exhaustive:
+                self.stats.misses += 1
+                return None
+            entry.touched = time.monotonic()
+            self._entries.move_to_end(conversation_id)
+            self.stats.hits += 1
+            messages = list(entry.messages)
+        return [dict(m) for m in messages[-limit:]] if limit else []
+
+    def put(
+        self, conversation_id: int, messages: Iterable[dict[str, Any]], version: datetime, *, exhaustive: bool
+    ) -> None:
+        """Registra a janela lida do banco (mensagens mais antigas primeiro)."""
+        if not self.enabled:
+            return
+        window = deque((dict(m) for m in messages), maxlen=self.window)
+        with self._lock:
+            self._entries[conversation_id] = _Window(version=version, messages=window, exhaustive=exhaustive)
+            self._entries.move_to_end(conversation_id)
+            self._evict()
+
+    def append(
+        self,
+        conversation_id: int,
+        messages: Iterable[dict[str, Any]],
+        *,
+        previous_version: Optional[datetime],
+        version: datetime,
+    ) -> None:
+        """Estende a janela com mensagens recem-gravadas (write-through)."""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            if previous_version is None or entry.version != previous_version:
+                del self._entries[conversation_id]
+                self.stats.invalidations += 1
+                return
+            for message in messages:
+                if len(entry.messages) == entry.messages.maxlen:
+                    entry.exhaustive = False
+                entry.messages.append(dict(message))
+            entry.version = version
+            entry.touched = time.monotonic()
+            self._entries.move_to_end(conversation_id)
+
+    def invalidate(self, conversation_id: int) -> None:
+        with self._lock:
+            if self._entries.pop(conversation_id, None) is not None:
+                self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self) -> None:
+        cutoff = time.monotonic() - self.idle_ttl
+        # OrderedDict em ordem de uso: as ociosas estao no inicio
+        while self._entries:
+            oldest_id, oldest = next(iter(self._entries.items()))
+            if oldest.touched >= cutoff and len(self._entries) <= self.max_conversations:
+                break
+            del self._entries[oldest_id]
+            self.stats.evictions += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**self.stats.snapshot(), "conversations": len(self._entries)}
+
+
+history_cache = HistoryCache.from_env()
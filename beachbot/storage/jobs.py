@@ -0,0 +1,213 @@
+"""Fila duravel de mensagens recebidas (tabela inbound_jobs) sobre o storage assincrono."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import case, func, literal, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from beachbot.storage.db import InboundJob, utcnow
+from beachbot.utils.metrics import DB_SECONDS, timed_async
+
+# Namespace dos advisory locks por remetente (pg_try_advisory_lock(int, int))
+ADVISORY_NAMESPACE = 7301
+
+
+@timed_async(DB_SECONDS, "enqueue_inbound")
+async def enqueue_inbound(
+    session: AsyncSession,
+    *,
+    instance_id: Optional[str],
+    sender: str,
+    text: str,
+    wa_message_id: Optional[str] = None,
+    ts: Optional[datetime] = None,
+) -> Optional[int]:
+    """Enfileira mensagem recebida; devolve o id do job ou None se o wa_message_id ja estava na fila."""
+    ts = ts or utcnow()
+    stmt = (
+        insert(InboundJob)
+        .values(
+            instance_id=instance_id,
+            sender=sender,
+            text=text,
+            wa_message_id=wa_message_id,
+            status="pending",
+            attempts=0,
+            available_at=ts,
+            created_at=ts,
+            updated_at=ts,
+        )
+        .on_conflict_do_nothing(
+            index_elements=[InboundJob.wa_message_id],
+            index_where=InboundJob.wa_message_id.isnot(None),
+        )
+        .returning(InboundJob.id)
+    )
+    job_id = (await session.execute(stmt)).scalar_one_or_none()
+    await session.commit()
+    return job_id
+
+
+async def _claim(session: AsyncSession, candidates: Any) -> list[InboundJob]:
+    now = utcnow()
+    stmt = (
+        update(InboundJob)
+        .where(InboundJob.id.in_(candidates))
+        .values(status="running", attempts=InboundJob.attempts + 1, locked_at=now, updated_at=now)
+        .returning(InboundJob)
+        .execution_options(synchronize_session=False)
+    )
+    jobs = list((await session.scalars(stmt)).all())
+    await session.commit()
+    return sorted(jobs, key=lambda job: job.id)
+
+
+@timed_async(DB_SECONDS, "claim_next_job")
+async def claim_next_job(session: AsyncSession) -> Optional[InboundJob]:
+    """Reserva o proximo job pendente disponivel (FOR UPDATE SKIP LOCKED)."""
+    candidates = (
+        select(InboundJob.id)
+        .where(InboundJob.status == "pending", InboundJob.available_at <= func.now())
+        .order_by(InboundJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    jobs = await _claim(session, candidates)
+    return jobs[0] if jobs else None
+
+
+@timed_async(DB_SECONDS, "claim_sender_jobs")
+async def claim_sender_jobs(
+    session: AsyncSession, instance_id: Optional[str], sender: str, *, limit: int = 50
+) -> list[InboundJob]:
+    """Reserva os jobs pendentes e ja disponiveis de um remetente (usado por quem ja detem o lock dele)."""
+    candidates = (
+        select(InboundJob.id)
+        .where(
+            InboundJob.status == "pending",
+            InboundJob.available_at <= func.now(),
+            InboundJob.sender == sender,
+            InboundJob.instance_id.is_not_distinct_from(instance_id),
+        )
+        .order_by(InboundJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return await _claim(session, candidates)
+
+
+@timed_async(DB_SECONDS, "complete_job")
+async def complete_job(session: AsyncSession, job_id: int) -> None:
+    await session.execute(
+        update(InboundJob).where(InboundJob.id == job_id).values(status="done", locked_at=None, updated_at=utcnow())
+    )
+    await session.commit()
+
+
+@timed_async(DB_SECONDS, "fail_job")
+async def fail_job(
+    session: AsyncSession, job_id: int, error: str, *, retry_in: Optional[float] = None
+) -> None:
+    """Marca falha; com `retry_in` o job volta para a fila apos o intervalo."""
+    now = utcnow()
+    values: dict[str, Any] = {"last_error": error[:2000], "locked_at": None, "updated_at": now}
+    if retry_in is None:
+        values["status"] = "failed"
+    else:
+        values.update(status="pending", available_at=now + timedelta(seconds=retry_in))
+    await session.execute(update(InboundJob).where(InboundJob.id == job_id).values(**values))
+    await session.commit()
+
+
+@timed_async(DB_SECONDS, "release_job")
+async def release_job(session: AsyncSession, job_id: int, *, delay: float = 1.0, count_attempt: bool = False) -> None:
+    """
+    Devolve job reservado para a fila.
+
+    Por padrao a tentativa nao conta (ex.: remetente com lock em outro worker). No
+    desligamento (`count_attempt=True`) ela conta: o turno pode ter comecado, e o job
+    volta como replay.
+    """
+    now = utcnow()
+    await session.execute(
+        update(InboundJob)
+        .where(InboundJob.id == job_id, InboundJob.status == "running")
+        .values(
+            status="pending",
+            attempts=InboundJob.attempts if count_attempt else InboundJob.attempts - 1,
+            locked_at=None,
+            available_at=now + timedelta(seconds=delay),
+            updated_at=now,
+        )
+    )
+    await session.commit()
+
+
+@timed_async(DB_SECONDS, "heartbeat_jobs")
+async def heartbeat_jobs(session: AsyncSession, job_ids: list[int]) -> None:
+    """Renova a reserva de jobs ainda em processamento."""
+    if not job_ids:
+        return
+    await session.execute(update(InboundJob).where(InboundJob.id.in_(job_ids)).values(locked_at=utcnow()))
+    await session.commit()
+
+
+@timed_async(DB_SECONDS, "requeue_stale_jobs")
+async def requeue_stale_jobs(
+    session: AsyncSession, lease_seconds: float, *, max_attempts: Optional[int] = None
+) -> tuple[int, int]:
+    """
+    Devolve para a fila jobs 'running' abandonados (worker caiu ou reiniciou); (devolvidos, falhos).
+
+    Com `max_attempts`, o job que ja esgotou as tentativas vira 'failed' no mesmo UPDATE:
+    uma mensagem que derruba ou trava o worker nao volta para a fila indefinidamente.
+    """
+    now = utcnow()
+    cutoff = now - timedelta(seconds=lease_seconds)
+    exhausted = InboundJob.attempts >= max_attempts if max_attempts is not None else None
+    values: dict[str, Any] = {"status": "pending", "locked_at": None, "available_at": now, "updated_at": now}
+    if exhausted is not None:
+        status_type = InboundJob.status.type
+        values["status"] = case(
+            (exhausted, literal("failed", status_type)), else_=literal("pending", status_type)
+        )
+        values["last_error"] = case(
+            (exhausted, f"reserva expirada apos {max_attempts} tentativas"), else_=InboundJob.last_error
+        )
+    result = await session.execute(
+        update(InboundJob)
+        .where(InboundJob.status == "running", InboundJob.locked_at < cutoff)
+        .values(**values)
+        .returning(InboundJob.status)
+    )
+    statuses = result.scalars().all()
+    await session.commit()
+    failed = sum(1 for status in statuses if status == "failed")
+    return len(statuses) - failed, failed
+
+
+async def try_sender_lock(conn: AsyncConnection, instance_id: Optional[str], sender: str) -> bool:
+    """Advisory lock de sessao por remetente: uma conversa e processada por um worker por vez."""
+    result = await conn.execute(
+        text("SELECT pg_try_advisory_lock(:ns, hashtext(:key))"),
+        {"ns": ADVISORY_NAMESPACE, "key": _sender_key(instance_id, sender)},
+    )
+    acquired = bool(result.scalar())
+    # o lock e de sessao: sobrevive ao commit, que evita deixar a conexao "idle in transaction"
+    await conn.commit()
+    return acquired
+
+
+async def release_sender_lock(conn: AsyncConnection, instance_id: Optional[str], sender: str) -> None:
+    await conn.execute(
+        text("SELECT pg_advisory_unlock(:ns, hashtext(:key))"),
+        {"ns": ADVISORY_NAMESPACE, "key": _sender_key(instance_id, sender)},
+    )
+    await conn.commit()
+
+
+def _sender_key(instance_id: Optional[str], sender: str) -> str:
+    return f"{instance_id or ''}:{sender}"
@@ -2,19 +2,25 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import json
 import logging
 import os
 from datetime import datetime, timezone
 from typing import Any, Awaitable, Optional
 
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from beachbot.config import Settings, load_settings
 from beachbot.core.handler import MessageHandler, create_handler
 from beachbot.evolution_client import EvolutionClient
+from beachbot.rag.retriever import get_retriever, peek_retriever
+from beachbot.storage import async_db as async_storage
+from beachbot.storage import jobs
 from beachbot.webhook.parsing import ParsedMessage, parse_messages_upsert
+from beachbot.webhook.worker import InboundWorkerPool, queue_mode
+from beachbot.utils.metrics import OUTBOUND, REGISTRY, STAGE_SECONDS
 from beachbot.utils.redact import mask_phone
 
 logger = logging.getLogger(__name__)
@@ -51,7 +57,7 @@ def _fire_and_forget(coro: Awaitable[None]) -> None:
     task.add_done_callback(_log_exceptions)
 
 
-async def _process_message(parsed: ParsedMessage) -> None:
+async def _process_message(parsed: ParsedMessage, replay: bool = False) -> None:
     """Processa mensagem e envia resposta do bot sem bloquear o webhook."""
     handler: Optional[MessageHandler] = getattr(app.state, "handler", None)
     if handler is None:
@@ -61,11 +67,15 @@ async def _process_message(parsed: ParsedMessage) -> None:
         )
         return
 
+    # O envio acontece dentro do turno serializado da conversa (ordem garantida)
     reply_text = await handler.handle_message(
         parsed.sender,
         parsed.text,
         message_id=parsed.message_id,
         instance_id=parsed.instance_id,
+        deliver=functools.partial(_send_reply, parsed),
+        presence=functools.partial(_send_typing, parsed, handler.presence.refresh_seconds),
+        replay=replay,
     )
 
     if reply_text is None:
@@ -77,7 +87,10 @@ async def _process_message(parsed: ParsedMessage) -> None:
                 "instance_id": parsed.instance_id,
             },
         )
-        return
+
+
+async def _send_reply(parsed: ParsedMessage, reply_text: str) -> bool:
+    """Envia a resposta do bot via Evolution, logando falhas sem propagar; devolve se a Evolution confirmou."""
     if reply_text == "":
         logger.warning(
             "Resposta vazia nao enviada",
@@ -87,7 +100,8 @@ async def _process_message(parsed: ParsedMessage) -> None:
                 "instance_id": parsed.instance_id,
             },
         )
-        return
+        OUTBOUND.inc("skipped")
+        return False
 
     if not parsed.sender:
         logger.warning(
@@ -98,14 +112,16 @@ async def _process_message(parsed: ParsedMessage) -> None:
                 "reason": "sender_invalid_or_lid",
             },
         )
-        return
+        OUTBOUND.inc("skipped")
+        return False
 
     if evolution_client is None:
         logger.warning(
             "Evolution client nao configurado; resposta nao enviada",
             extra={"sender_masked": mask_phone(parsed.sender), "message_id": parsed.message_id},
         )
-        return
+        OUTBOUND.inc("skipped")
+        return False
 
     text_len = len(reply_text)
     preview = reply_text[:60]
@@ -113,13 +129,9 @@ async def _process_message(parsed: ParsedMessage) -> None:
         preview += "..."
 
     try:
-        logger.info(
-            "DEBUG outbound: sender=%r message_id=%r text_len=%d",
-            parsed.sender,
-            parsed.message_id,
-            len(reply_text or ""),
-        )
-        await evolution_client.send_text(parsed.sender, reply_text)
+        with STAGE_SECONDS.time("outbound_send"):
+            await evolution_client.send_text(parsed.sender, reply_text)
+        OUTBOUND.inc("ok")
         logger.info(
             "Resposta enviada via Evolution",
             extra={
@@ -130,7 +142,9 @@ async def _process_message(parsed: ParsedMessage) -> None:
                 "instance_id": parsed.instance_id,
             },
         )
+        return True
     except Exception as exc:  # noqa: BLE001
+        OUTBOUND.inc("error")
         logger.exception(
             "Falha ao enviar resposta via Evolution",
             exc_info=exc,
@@ -142,6 +156,40 @@ async def _process_message(parsed: ParsedMessage) -> None:
                 "instance_id": parsed.instance_id,
             },
         )
+        return False
+
+
+async def _send_typing(parsed: ParsedMessage, seconds: float) -> None:
+    """Mostra "digitando..." por `seconds` (o handler renova enquanto o turno roda)."""
+    if evolution_client is None or not parsed.sender:
+        return
+    await evolution_client.send_presence(parsed.sender, "composing", delay_ms=int(seconds * 1000))
+
+
+async def _enqueue_message(parsed: ParsedMessage) -> None:
+    """Grava a mensagem na fila duravel (inbound_jobs); em falha, processa em memoria."""
+    try:
+        async with async_storage.get_session() as session:
+            job_id = await jobs.enqueue_inbound(
+                session,
+                instance_id=parsed.instance_id,
+                sender=parsed.sender or "",
+                text=parsed.text,
+                wa_message_id=parsed.message_id,
+            )
+    except Exception as exc:  # noqa: BLE001
+        logger.exception(
+            "Falha ao enfileirar mensagem; processando em memoria",
+            exc_info=exc,
+            extra={"sender_masked": mask_phone(parsed.sender), "message_id": parsed.message_id},
+        )
+        _fire_and_forget(_process_message(parsed))
+        return
+    if job_id is None:
+        logger.info(
+            "Mensagem ja enfileirada (reentrega do webhook)",
+            extra={"sender_masked": mask_phone(parsed.sender), "message_id": parsed.message_id},
+        )
 
 
 @app.get("/health")
@@ -150,18 +198,76 @@ async def health() -> dict[str, bool]:
     return {"ok": True}
 
 
+@app.get("/stats")
+async def stats() -> dict[str, Any]:
+    """Contadores em memoria do processo (debounce, filas, caches)."""
+    handler: Optional[MessageHandler] = getattr(app.state, "handler", None)
+    if handler is None:
+        return {}
+    return handler.stats()
+
+
+@app.get("/metrics")
+async def metrics() -> PlainTextResponse:
+    """Histogramas e contadores do pipeline no formato texto do Prometheus."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/knowledge/status")
+async def knowledge_status() -> dict[str, Any]:
+    """Versao do indice da base de conhecimento em uso (e versoes antigas ainda em turnos)."""
+    return get_retriever().status()
+
+
+@app.post("/admin/knowledge/reload")
+async def knowledge_reload(request: Request) -> dict[str, Any]:
+    """Recarrega o indice da base sem reiniciar (exige header X-Admin-Token = ADMIN_TOKEN)."""
+    token = os.getenv("ADMIN_TOKEN")
+    if not token or request.headers.get("x-admin-token") != token:
+        raise HTTPException(status_code=403, detail="forbidden")
+    retriever = get_retriever()
+    force = request.query_params.get("force", "").lower() in {"1", "true", "yes"}
+    reloaded = await retriever.reload(force=force)
+    return {"reloaded": reloaded, **retriever.status()}
+
+
 @app.on_event("startup")
 async def startup() -> None:
     """Inicializa a rede do bot uma unica vez."""
     triage_mode = os.getenv("TRIAGE_MODE", "prompt")
     app.state.handler = create_handler(triage_mode=triage_mode)
+    # carrega o indice fora do event loop e acompanha rebuilds (hot reload)
+    retriever = get_retriever()
+    await retriever.reload()
+    app.state.knowledge_watch = None
+    poll = float(os.getenv("RAG_RELOAD_POLL_SECONDS", "5"))
+    if poll > 0:
+        app.state.knowledge_watch = asyncio.create_task(retriever.watch(poll))
+    app.state.worker_pool = None
+    if queue_mode() == "postgres":
+        pool = InboundWorkerPool.from_env(_process_message)
+        if int(os.getenv("QUEUE_WORKERS", "4")) > 0:
+            await pool.start()
+            app.state.worker_pool = pool
 
 
 @app.on_event("shutdown")
 async def shutdown() -> None:
     """Limpa referencias em shutdown."""
+    pool: Optional[InboundWorkerPool] = getattr(app.state, "worker_pool", None)
+    if pool is not None:
+        await pool.stop()
+        app.state.worker_pool = None
     if hasattr(app.state, "handler"):
         app.state.handler = None
+    watch: Optional[asyncio.Task] = getattr(app.state, "knowledge_watch", None)
+    if watch is not None:
+        watch.cancel()
+        app.state.knowledge_watch = None
+    retriever = peek_retriever()
+    if retriever is not None:
+        retriever.query_cache.save()
+    await async_storage.dispose()
 
 
 async def _handle_webhook(request: Request) -> JSONResponse:
@@ -178,14 +284,15 @@ async def _handle_webhook(request: Request) -> JSONResponse:
 
     logger.debug("Payload bruto recebido: %s", body_preview)
 
-    try:
-        payload: Any = await request.json()
-        json_parsed = True
-    except Exception:
-        payload = None
-        json_parsed = False
+    with STAGE_SECONDS.time("webhook_parse"):
+        try:
+            payload: Any = await request.json()
+            json_parsed = True
+        except Exception:
+            payload = None
+            json_parsed = False
 
-    parsed_message: Optional[ParsedMessage] = parse_messages_upsert(payload) if payload else None
+        parsed_message: Optional[ParsedMessage] = parse_messages_upsert(payload) if payload else None
     key_summary = None
     instance_id_payload = None
     push_name = None
@@ -245,8 +352,12 @@ async def _handle_webhook(request: Request) -> JSONResponse:
             },
         )
 
-        # Dispara processamento sem bloquear a resposta do webhook
-        _fire_and_forget(_process_message(parsed_message))
+        if queue_mode() == "postgres":
+            # Fila duravel: grava e responde; os workers processam (sobrevive a deploy/crash)
+            await _enqueue_message(parsed_message)
+        else:
+            # Dispara processamento sem bloquear a resposta do webhook
+            _fire_and_forget(_process_message(parsed_message))
     else:
         logger.warning(
             "Payload de webhook nao parseado",
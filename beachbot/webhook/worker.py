@@ -0,0 +1,215 @@
+"""Workers que consomem a fila duravel de mensagens (inbound_jobs) e rodam os turnos do bot."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from beachbot.storage import async_db as storage
+from beachbot.storage import jobs
+from beachbot.storage.db import InboundJob
+from beachbot.utils.redact import mask_phone
+from beachbot.webhook.parsing import ParsedMessage
+
+logger = logging.getLogger(__name__)
+
+# Processa uma mensagem; `replay=True` quando o job ja foi tentado (mensagem pode ja estar gravada)
+ProcessFn = Callable[[ParsedMessage, bool], Awaitable[None]]
+
+
+def queue_mode() -> str:
+    """`memory` (padrao: tarefa no proprio processo) ou `postgres` (fila duravel)."""
+    return os.getenv("WORK_QUEUE", "memory").strip().lower()
+
+
+class InboundWorkerPool:
+    """
+    Pool de workers que reservam jobs com FOR UPDATE SKIP LOCKED.
+
+    Cada job e processado sob um advisory lock do remetente (equivale a conversa aberta
+    dele): quem detem o lock tambem drena os jobs novos do mesmo remetente enquanto o
+    turno esta em andamento, para que o debounce do handler agrupe a rajada. No
+    desligamento (`stop`) os jobs reservados pelo pool voltam na hora para a fila; os de
+    um worker que caiu voltam quando a reserva expira (`lease_seconds`).
+    Varios processos/nos podem rodar o pool sobre o mesmo banco.
+    """
+
+    def __init__(
+        self,
+        process: ProcessFn,
+        *,
+        concurrency: int = 4,
+        poll_interval: float = 0.5,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 3,
+    ) -> None:
+        self.process = process
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+        # jobs reservados por este pool ainda sem desfecho, e os turnos em execucao
+        self._claimed: dict[int, InboundJob] = {}
+        self._running: dict[asyncio.Task, InboundJob] = {}
+
+    @classmethod
+    def from_env(cls, process: ProcessFn) -> "InboundWorkerPool":
+        return cls(
+            process,
+            concurrency=int(os.getenv("QUEUE_WORKERS", "4")),
+            poll_interval=float(os.getenv("QUEUE_POLL_SECONDS", "0.5")),
+            lease_seconds=float(os.getenv("QUEUE_LEASE_SECONDS", "300")),
+            max_attempts=int(os.getenv("QUEUE_MAX_ATTEMPTS", "3")),
+        )
+
+    async def start(self) -> None:
+        """Recupera jobs abandonados e inicia os loops de consumo."""
+        async with storage.get_session() as session:
+            recovered, failed = await jobs.requeue_stale_jobs(
+                session, self.lease_seconds, max_attempts=self.max_attempts
+            )
+        if recovered or failed:
+            logger.warning("Jobs recuperados apos reinicio: %d (falhos por tentativas esgotadas: %d)", recovered, failed)
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._loop(idx)) for idx in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def stop(self) -> None:
+        """Para os loops e devolve para a fila os jobs reservados, antes de cancelar os turnos."""
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        running, self._running = self._running, {}
+        claimed, self._claimed = self._claimed, {}
+        try:
+            async with storage.get_session() as session:
+                for task, job in running.items():
+                    if task.done():
+                        # turno terminou antes do loop registrar: nao reprocessar
+                        await self._finish(session, job, task)
+                        claimed.pop(job.id, None)
+                for job in claimed.values():
+                    await jobs.release_job(session, job.id, delay=0, count_attempt=True)
+            if claimed:
+                logger.warning("Jobs em andamento devolvidos a fila no desligamento: %d", len(claimed))
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Falha ao devolver jobs no desligamento; voltam quando a reserva expirar", exc_info=exc)
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def _loop(self, idx: int) -> None:
+        while not self._stopping.is_set():
+            try:
+                async with storage.get_session() as session:
+                    job = await jobs.claim_next_job(session)
+                if job is None:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                self._claimed[job.id] = job
+                await self._run_sender(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Erro no loop do worker %d", idx, exc_info=exc)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _run_sender(self, first: InboundJob) -> None:
+        if storage.engine is None:
+            raise RuntimeError("DATABASE_URL nao configurado; fila duravel indisponivel.")
+        async with storage.engine.connect() as lock_conn:
+            if not await jobs.try_sender_lock(lock_conn, first.instance_id, first.sender):
+                # outro worker esta com o remetente e vai drenar este job
+                async with storage.get_session() as session:
+                    await jobs.release_job(session, first.id, delay=self.poll_interval * 2)
+                self._claimed.pop(first.id, None)
+                return
+            try:
+                await self._drain_sender(first)
+            finally:
+                await jobs.release_sender_lock(lock_conn, first.instance_id, first.sender)
+
+    async def _drain_sender(self, first: InboundJob) -> None:
+        running: dict[asyncio.Task, InboundJob] = {self._spawn(first): first}
+        while running:
+            done, _ = await asyncio.wait(running.keys(), timeout=self.poll_interval)
+            async with storage.get_session() as session:
+                for task in done:
+                    self._running.pop(task, None)
+                    await self._finish(session, running.pop(task), task)
+                await jobs.heartbeat_jobs(session, [job.id for job in running.values()])
+                for job in await jobs.claim_sender_jobs(session, first.instance_id, first.sender):
+                    self._claimed[job.id] = job
+                    running[self._spawn(job)] = job
+
+    def _spawn(self, job: InboundJob) -> asyncio.Task:
+        parsed = ParsedMessage(
+            sender=job.sender,
+            text=job.text,
+            message_id=job.wa_message_id,
+            instance_id=job.instance_id,
+        )
+        task = asyncio.create_task(self.process(parsed, job.attempts > 1))
+        self._running[task] = job
+        return task
+
+    async def _finish(self, session, job: InboundJob, task: asyncio.Task) -> None:
+        self._claimed.pop(job.id, None)
+        exc: Optional[BaseException] = None if task.cancelled() else task.exception()
+        if exc is None and not task.cancelled():
+            await jobs.complete_job(session, job.id)
+            return
+        error = repr(exc) if exc is not None else "cancelled"
+        retry_in = None if job.attempts >= self.max_attempts else self.poll_interval * 2 ** job.attempts
+        logger.error(
+            "Falha ao processar job da fila",
+            extra={"job_id": job.id, "sender_masked": mask_phone(job.sender), "attempts": job.attempts, "error": error},
+        )
+        await jobs.fail_job(session, job.id, error, retry_in=retry_in)
+
+    async def _reaper(self) -> None:
+        while not self._stopping.is_set():
+            await asyncio.sleep(self.lease_seconds / 2)
+            try:
+                async with storage.get_session() as session:
+                    recovered, failed = await jobs.requeue_stale_jobs(
+                        session, self.lease_seconds, max_attempts=self.max_attempts
+                    )
+                if recovered or failed:
+                    logger.warning(
+                        "Jobs com reserva expirada devolvidos a fila: %d (falhos por tentativas esgotadas: %d)",
+                        recovered,
+                        failed,
+                    )
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Erro ao recuperar jobs expirados", exc_info=exc)
+
+
+async def main_async() -> None:
+    """Roda apenas os workers (sem HTTP), para escalar em outros processos/nos."""
+    from beachbot.core.handler import create_handler
+    from beachbot.webhook import server
+
+    server.app.state.handler = create_handler(triage_mode=os.getenv("TRIAGE_MODE", "prompt"))
+    pool = InboundWorkerPool.from_env(server._process_message)
+    await pool.start()
+    logger.info("Workers da fila iniciados", extra={"concurrency": pool.concurrency})
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+        await storage.dispose()
+
+
+def main() -> None:
+    asyncio.run(main_async())
+
+
+if __name__ == "__main__":
+    main()
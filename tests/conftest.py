@@ -0,0 +1,57 @@
+"""
+Fixtures compartilhadas.
+
+Testes que precisam de Postgres usam `database_url`: um banco descartavel criado a
+partir de TEST_DATABASE_URL (ex.: postgresql://postgres@localhost/postgres) e migrado
+com o alembic. Sem a variavel, esses testes sao pulados.
+"""
+from __future__ import annotations
+
+import os
+import uuid
+from pathlib import Path
+from typing import Iterator
+from urllib.parse import urlsplit
+
+import pytest
+from sqlalchemy import create_engine, text
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(scope="session")
+def database_url() -> Iterator[str]:
+    base_url = os.getenv("TEST_DATABASE_URL")
+    if not base_url:
+        pytest.skip("TEST_DATABASE_URL nao definido")
+    from alembic import command
+    from alembic.config import Config
+
+    name = f"beachbot_test_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(base_url, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(f'CREATE DATABASE "{name}"'))
+    url = urlsplit(base_url)._replace(path=f"/{name}").geturl()
+    previous = os.environ.get("DATABASE_URL")
+    os.environ["DATABASE_URL"] = url
+    try:
+        config = Config(str(ROOT / "alembic.ini"))
+        config.set_main_option("script_location", str(ROOT / "alembic"))
+        command.upgrade(config, "head")
+        yield url
+    finally:
+        if previous is None:
+            os.environ.pop("DATABASE_URL", None)
+        else:
+            os.environ["DATABASE_URL"] = previous
+        with admin.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+        admin.dispose()
+
+
+@pytest.fixture()
+def async_url(database_url: str) -> str:
+    """Mesma base no driver asyncpg (storage assincrono)."""
+    from beachbot.storage.async_db import _async_url
+
+    return _async_url(database_url)
@@ -0,0 +1,78 @@
+"""Um turno por vez por conversa, com pedidos intermediarios agrupados."""
+from __future__ import annotations
+
+import asyncio
+
+from beachbot.core.actors import ConversationActors
+
+
+def test_turns_in_same_conversation_never_overlap():
+    async def scenario():
+        actors = ConversationActors()
+        running = 0
+        peak = 0
+        order: list[int] = []
+
+        def make_turn(idx: int):
+            async def turn() -> int:
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.02)
+                running -= 1
+                order.append(idx)
+                return idx
+
+            return turn
+
+        first = asyncio.create_task(actors.run("c1", make_turn(1)))
+        await asyncio.sleep(0.005)
+        assert actors.busy("c1")
+        rest = [asyncio.create_task(actors.run("c1", make_turn(idx))) for idx in (2, 3)]
+        results = await asyncio.gather(first, *rest)
+        return results, peak, order, actors
+
+    results, peak, order, actors = asyncio.run(scenario())
+    # o pedido 2 chegou no meio do turno 1 e foi agrupado no 3 (mais recente)
+    assert results == [1, None, 3]
+    assert order == [1, 3]
+    assert peak == 1
+    assert actors.stats.snapshot() == {"turns": 2, "folded": 1, "queued_behind_turn": 2}
+    assert actors.active() == 0
+
+
+def test_different_conversations_run_concurrently():
+    async def scenario():
+        actors = ConversationActors()
+        gate = asyncio.Event()
+        started: list[str] = []
+
+        async def turn(key: str) -> str:
+            started.append(key)
+            if len(started) == 2:
+                gate.set()
+            await asyncio.wait_for(gate.wait(), timeout=1)
+            return key
+
+        return await asyncio.gather(actors.run("a", lambda: turn("a")), actors.run("b", lambda: turn("b")))
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+
+
+def test_failed_turn_releases_conversation():
+    async def scenario():
+        actors = ConversationActors()
+
+        async def boom() -> None:
+            raise RuntimeError("falhou")
+
+        async def ok() -> str:
+            return "ok"
+
+        try:
+            await actors.run("c1", boom)
+        except RuntimeError:
+            pass
+        return await actors.run("c1", ok), actors.active()
+
+    assert asyncio.run(scenario()) == ("ok", 0)
@@ -0,0 +1,99 @@
+"""Limite de turnos simultaneos, fila com prioridade e recusa (modo degradado)."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from beachbot.core.admission import PRIORITY_DEFAULT, PRIORITY_INTERVIEW, AdmissionController, AdmissionRejected
+
+
+async def _hold(controller: AdmissionController, release: asyncio.Event, log: list[str], name: str, priority: int) -> str:
+    async with controller.slot(priority=priority):
+        log.append(name)
+        await release.wait()
+    return name
+
+
+def test_concurrency_limit_and_priority_order():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=4)
+        release = asyncio.Event()
+        log: list[str] = []
+        first = asyncio.create_task(_hold(controller, release, log, "first", PRIORITY_DEFAULT))
+        await asyncio.sleep(0)
+        default = asyncio.create_task(_hold(controller, release, log, "default", PRIORITY_DEFAULT))
+        await asyncio.sleep(0)
+        interview = asyncio.create_task(_hold(controller, release, log, "interview", PRIORITY_INTERVIEW))
+        await asyncio.sleep(0)
+        assert controller.in_flight == 1 and controller.waiting == 2
+        release.set()
+        await asyncio.gather(first, default, interview)
+        return log, controller
+
+    log, controller = asyncio.run(scenario())
+    # a conversa em entrevista passa na frente de quem chegou antes
+    assert log == ["first", "interview", "default"]
+    assert controller.in_flight == 0
+    assert controller.stats.admitted == 3 and controller.stats.queued == 2
+
+
+def test_full_queue_rejects_or_displaces_lower_priority():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1)
+        release = asyncio.Event()
+        log: list[str] = []
+        running = asyncio.create_task(_hold(controller, release, log, "running", PRIORITY_DEFAULT))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(_hold(controller, release, log, "queued", PRIORITY_DEFAULT))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await _hold(controller, release, log, "rejected", PRIORITY_DEFAULT)
+        interview = asyncio.create_task(_hold(controller, release, log, "interview", PRIORITY_INTERVIEW))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(running, queued, interview, return_exceptions=True)
+        return results, log, controller
+
+    results, log, controller = asyncio.run(scenario())
+    assert results[0] == "running" and results[2] == "interview"
+    assert isinstance(results[1], AdmissionRejected)
+    assert log == ["running", "interview"]
+    assert controller.stats.rejected == 2
+    assert controller.in_flight == 0
+
+
+def test_wait_timeout_rejects():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=4, max_wait=0.02)
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(controller, release, [], "running", PRIORITY_DEFAULT))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            async with controller.slot():
+                pass
+        release.set()
+        await running
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.stats.timed_out == 1
+    assert controller.in_flight == 0 and controller.waiting == 0
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=4)
+        release = asyncio.Event()
+        running = asyncio.create_task(_hold(controller, release, [], "running", PRIORITY_DEFAULT))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_hold(controller, release, [], "waiting", PRIORITY_DEFAULT))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        release.set()
+        await asyncio.gather(running, waiting, return_exceptions=True)
+        async with controller.slot():
+            busy = controller.in_flight
+        return busy, controller.in_flight
+
+    assert asyncio.run(scenario()) == (1, 0)
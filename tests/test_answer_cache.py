@@ -0,0 +1,106 @@
+"""Cache semantico de respostas: so perguntas autonomas e impessoais sao reaproveitadas."""
+from __future__ import annotations
+
+import asyncio
+
+from beachbot.core.answer_cache import AnswerCache, names_user, standalone_question
+
+
+async def _same_vector(text: str) -> list[float]:
+    # pior caso do limiar: toda pergunta parece igual para o embedding
+    return [1.0, 0.0, 0.0]
+
+
+def _cache() -> AnswerCache:
+    return AnswerCache(_same_vector, threshold=0.93, kb_path=None)
+
+
+def _ask(cache: AnswerCache, question: str):
+    vector = asyncio.run(cache.embed(question))
+    return vector, cache.lookup(question, vector)
+
+
+def test_standalone_question_is_reused():
+    cache = _cache()
+    question = standalone_question([{"role": "user", "content": "Qual o horario de funcionamento?"}])
+    vector, cached = _ask(cache, question)
+    assert cached is None
+    cache.store(question, vector, "Funcionamos das 6h as 22h.")
+    assert _ask(cache, "qual o horario de funcionamento")[1] == "Funcionamos das 6h as 22h."
+
+
+def test_follow_up_is_never_a_cache_key():
+    history = [
+        {"role": "user", "content": "Quanto custa o plano mensal?"},
+        {"role": "assistant", "content": "O mensal custa R$ 300."},
+        {"role": "user", "content": "e o trimestral?"},
+    ]
+    assert standalone_question(history) is None
+    # resumo de conversa anterior tambem e contexto
+    assert standalone_question([{"role": "system", "content": "Resumo"}, {"role": "user", "content": "e o valor?"}]) is None
+
+
+def test_question_after_greeting_exchange_is_a_cache_key():
+    history = [
+        {"role": "user", "content": "Oi, boa tarde!"},
+        {"role": "assistant", "content": "Ola! Sou a assistente da Smash, como posso ajudar?"},
+        {"role": "user", "content": "oi"},
+        {"role": "user", "content": "Quais os horários?"},
+    ]
+    assert standalone_question(history) == "quais os horarios"
+    # cumprimento na mesma mensagem tambem sai da chave
+    assert standalone_question([{"role": "user", "content": "Bom dia, tudo bem? Quais os horarios?"}]) == "quais os horarios"
+    assert standalone_question([{"role": "user", "content": "Ola!"}]) is None
+
+
+def test_faq_asked_after_greeting_hits_answer_from_other_conversation():
+    # a sequencia do handler: chave da rajada -> embed -> lookup; sem hit, resposta do Knowledge e guardada
+    cache = _cache()
+    first = [{"role": "user", "content": "quais os horarios?"}]
+    key = standalone_question(first)
+    assert cache.accepts(key)
+    vector, cached = _ask(cache, key)
+    assert cached is None
+    cache.store(key, vector, "Funcionamos de segunda a sexta das 6h as 22h.", phone="5511998765432")
+
+    second = [
+        {"role": "user", "content": "Oi"},
+        {"role": "assistant", "content": "Ola! Como posso ajudar?"},
+        {"role": "user", "content": "Boa noite! Quais os horários?"},
+    ]
+    key = standalone_question(second)
+    assert cache.accepts(key)
+    assert _ask(cache, key)[1] == "Funcionamos de segunda a sexta das 6h as 22h."
+    assert cache.stats.hits == 1
+
+
+def test_different_plan_period_does_not_merge():
+    cache = _cache()
+    vector, _ = _ask(cache, "Quanto custa o plano mensal?")
+    cache.store("Quanto custa o plano mensal?", vector, "O mensal custa R$ 300.")
+    assert _ask(cache, "Quanto custa o plano trimestral?")[1] is None
+    assert _ask(cache, "quanto custa o plano mensal")[1] == "O mensal custa R$ 300."
+
+
+def test_personal_question_is_not_cached():
+    cache = _cache()
+    question = "Qual o horario da minha turma?"
+    assert not cache.accepts(question)
+    assert asyncio.run(cache.embed(question)) is None
+    cache.store(question, [1.0, 0.0, 0.0], "Sua turma e as 19h.")
+    assert cache.snapshot()["entries"] == 0
+
+
+def test_answer_naming_the_user_is_never_reused():
+    cache = _cache()
+    vector, _ = _ask(cache, "Quais os horarios das aulas?")
+    cache.store("Quais os horarios das aulas?", vector, "Oi, Maria! As aulas sao das 7h as 21h.")
+    assert _ask(cache, "Quais os horarios das aulas?")[1] is None
+    assert cache.stats.personal == 1
+
+
+def test_names_user():
+    assert names_user("Ola, Joao! Temos aulas todos os dias.")
+    assert not names_user("Ola! Nossos horarios sao das 7h as 21h.")
+    assert not names_user("Oi, tudo bem? Temos aulas todos os dias.")
+    assert names_user("Enviamos a confirmacao para 11 99876-5432.", phone="5511998765432")
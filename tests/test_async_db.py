@@ -0,0 +1,100 @@
+"""Storage assincrono (asyncpg): clientes, conversas, mensagens, historico e resumo."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from beachbot.storage import async_db
+
+T0 = datetime(2026, 2, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _run(async_url, scenario):
+    async def main():
+        engine = create_async_engine(async_url)
+        sessions = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        try:
+            return await scenario(sessions)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def test_client_and_open_conversation_are_reused(async_url):
+    async def scenario(sessions):
+        async with sessions() as session:
+            first = await async_db.get_or_create_client(session, "inst", "5561900000001", ts=T0)
+            again = await async_db.get_or_create_client(session, "inst", "5561900000001", ts=T0 + timedelta(minutes=5))
+            # mesma instancia no identity map: guarda o valor antes do touch abaixo
+            seen_again = again.last_seen_at
+            other = await async_db.get_or_create_client(session, "outra", "5561900000001", ts=T0)
+            convo = await async_db.get_or_create_open_conversation(session, first.id, ts=T0)
+            same = await async_db.get_or_create_open_conversation(session, first.id, ts=T0 + timedelta(minutes=5))
+            await async_db.touch_client_last_seen(session, first.id, T0 + timedelta(hours=1))
+            await session.refresh(first)
+            return first.id, again.id, other.id, seen_again, first.last_seen_at, convo.id, same.id
+
+    first, again, other, seen_again, seen_touch, convo, same = _run(async_url, scenario)
+    assert first == again and other != first
+    assert seen_again == T0 + timedelta(minutes=5)
+    assert seen_touch == T0 + timedelta(hours=1)
+    assert convo == same
+
+
+def test_messages_history_and_user_timestamps(async_url):
+    async def scenario(sessions):
+        async with sessions() as session:
+            client = await async_db.get_or_create_client(session, "inst", "5561900000002", ts=T0)
+            convo = await async_db.get_or_create_open_conversation(session, client.id, ts=T0)
+            ids = []
+            for idx, role in enumerate(("user", "assistant", "user", "assistant", "user")):
+                msg = await async_db.save_message(
+                    session,
+                    convo.id,
+                    role=role,
+                    direction="in" if role == "user" else "out",
+                    text=f"m{idx}",
+                    ts=T0 + timedelta(seconds=idx),
+                )
+                ids.append(msg.id)
+            last = await async_db.fetch_last_messages(session, convo.id, limit=3)
+            with_ids = await async_db.fetch_last_messages(session, convo.id, limit=2, with_ids=True)
+            after = await async_db.fetch_messages_after(session, convo.id, ids[1])
+            batch = await async_db.fetch_messages_after(session, convo.id, None, 2)
+            stamps = await async_db.fetch_recent_user_timestamps(session, client.id, limit=2)
+            return ids, last, with_ids, after, batch, stamps
+
+    ids, last, with_ids, after, batch, stamps = _run(async_url, scenario)
+    assert last == [
+        {"role": "user", "content": "m2"},
+        {"role": "assistant", "content": "m3"},
+        {"role": "user", "content": "m4"},
+    ]
+    assert [m["id"] for m in with_ids] == ids[3:]
+    assert [m["content"] for m in after] == ["m2", "m3", "m4"]
+    assert [m["id"] for m in batch] == ids[:2]
+    # so mensagens do usuario, mais antigas primeiro
+    assert stamps == [T0 + timedelta(seconds=2), T0 + timedelta(seconds=4)]
+
+
+def test_summary_save_requires_unchanged_previous_position(async_url):
+    async def scenario(sessions):
+        async with sessions() as session:
+            client = await async_db.get_or_create_client(session, "inst", "5561900000003", ts=T0)
+            convo = await async_db.get_or_create_open_conversation(session, client.id, ts=T0)
+            empty = await async_db.get_conversation_summary(session, convo.id)
+            saved = await async_db.save_conversation_summary(session, convo.id, "r1", until_id=10, previous_until_id=None)
+            stale = await async_db.save_conversation_summary(session, convo.id, "r2", until_id=12, previous_until_id=None)
+            advanced = await async_db.save_conversation_summary(session, convo.id, "r3", until_id=14, previous_until_id=10)
+            current = await async_db.get_conversation_summary(session, convo.id)
+            missing = await async_db.get_conversation_summary(session, -1)
+            return empty, saved, stale, advanced, current, missing
+
+    empty, saved, stale, advanced, current, missing = _run(async_url, scenario)
+    assert empty == (None, None)
+    assert saved is True and stale is False and advanced is True
+    assert current == ("r3", 14)
+    assert missing == (None, None)
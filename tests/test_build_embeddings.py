@@ -0,0 +1,120 @@
+"""Build do indice: embeddings em lotes concorrentes com retry e rebuild incremental pelo store."""
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+pytest.importorskip("openai")
+
+from openai import APIConnectionError  # noqa: E402
+
+from beachbot.rag.index import EmbeddingIndex  # noqa: E402
+from beachbot.rag.store import ChunkStore, chunk_hash  # noqa: E402
+from beachbot.scripts import build_embeddings as build  # noqa: E402
+from beachbot.scripts.build_embeddings import embed_all  # noqa: E402
+
+
+def _connection_error() -> APIConnectionError:
+    return APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+
+
+class FakeEmbedder:
+    """Vetor [len(texto), numero da chamada]; falha as primeiras `failures` chamadas de cada lote."""
+
+    def __init__(self, *, failures: int = 0, error: Exception | None = None, delay: float = 0.0) -> None:
+        self.failures = failures
+        self.error = error
+        self.delay = delay
+        self.calls: list[list[str]] = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, batch: list[str]) -> list[list[float]]:
+        self.calls.append(batch)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.calls.count(batch) <= self.failures:
+                raise self.error or _connection_error()
+            return [[float(len(text)), float(len(self.calls))] for text in batch]
+        finally:
+            self.in_flight -= 1
+
+
+def test_batches_keep_order_and_respect_concurrency():
+    texts = [f"texto {'x' * idx}" for idx in range(10)]
+    embedder = FakeEmbedder(delay=0.01)
+    vectors = asyncio.run(embed_all(texts, embedder, batch_size=4, concurrency=2))
+    assert [len(batch) for batch in embedder.calls] == [4, 4, 2]
+    assert [vector[0] for vector in vectors] == [float(len(text)) for text in texts]
+    assert embedder.peak == 2
+
+
+def test_transient_errors_are_retried():
+    embedder = FakeEmbedder(failures=2)
+    vectors = asyncio.run(embed_all(["a", "bb", "ccc"], embedder, batch_size=2, max_retries=2, backoff=0))
+    assert [vector[0] for vector in vectors] == [1.0, 2.0, 3.0]
+    assert len(embedder.calls) == 6
+
+
+def test_retries_are_bounded():
+    embedder = FakeEmbedder(failures=10)
+    with pytest.raises(APIConnectionError):
+        asyncio.run(embed_all(["a"], embedder, max_retries=2, backoff=0))
+    assert len(embedder.calls) == 3
+
+
+def test_non_transient_error_is_not_retried():
+    embedder = FakeEmbedder(failures=1, error=ValueError("modelo invalido"))
+    with pytest.raises(ValueError):
+        asyncio.run(embed_all(["a"], embedder, backoff=0))
+    assert len(embedder.calls) == 1
+
+
+def test_wrong_number_of_vectors_fails_the_build():
+    async def short(batch: list[str]) -> list[list[float]]:
+        return [[1.0]] * (len(batch) - 1)
+
+    with pytest.raises(RuntimeError, match="1 embeddings para 2 textos"):
+        asyncio.run(embed_all(["a", "b"], short))
+
+
+def test_rebuild_embeds_only_changed_chunks(tmp_path, monkeypatch):
+    embedded: list[str] = []
+
+    def fake_embedder(model, base_url=None):
+        async def _embed(batch: list[str]) -> list[list[float]]:
+            embedded.extend(batch)
+            return [[float(len(text)), 1.0] for text in batch]
+
+        return _embed
+
+    monkeypatch.setattr(build, "openai_batch_embedder", fake_embedder)
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "horarios.md").write_text("# Horarios\n\nSegunda a sexta das 6h as 22h.\n", encoding="utf-8")
+    (docs / "planos.md").write_text("# Planos\n\nMensal R$ 300.\n\n# Aulas\n\nTurmas por nivel.\n", encoding="utf-8")
+    out, store_dir = tmp_path / "kb.npy", tmp_path / "store"
+    files = [str(docs / "horarios.md"), str(docs / "planos.md")]
+
+    def run() -> list[str]:
+        embedded.clear()
+        build.build_embeddings(files, out, "m", 800, store_dir=store_dir)
+        return list(embedded)
+
+    first = run()
+    assert len(first) == 3
+    assert run() == []
+    (docs / "planos.md").write_text("# Planos\n\nMensal R$ 320.\n\n# Aulas\n\nTurmas por nivel.\n", encoding="utf-8")
+    changed = run()
+    assert len(changed) == 1 and "320" in changed[0]
+
+    index = EmbeddingIndex.load(out)
+    contents = [chunk["content"] for chunk in index.chunks]
+    assert len(contents) == 3 and not any("R$ 300" in content for content in contents)
+    # o chunk antigo saiu do store
+    store = ChunkStore(store_dir, "m")
+    assert len(store) == 3 and chunk_hash(next(t for t in first if "300" in t)) not in store
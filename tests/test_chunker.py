@@ -0,0 +1,58 @@
+"""Chunks dos markdowns da base respeitando titulos, listas e pares de FAQ."""
+from __future__ import annotations
+
+from beachbot.rag.chunker import chunk_markdown
+
+DOC = """# CT Beach
+
+## Horarios
+
+Abrimos de segunda a sexta.
+
+### Sabado
+
+Das 8h as 12h.
+
+## FAQ
+
+**Posso levar acompanhante?**
+Sim, acompanhantes sao bem-vindos.
+
+**Tem estacionamento?**
+Sim, gratuito.
+"""
+
+
+def test_sections_start_new_chunks_with_heading_path():
+    chunks = chunk_markdown(DOC)
+    horarios = chunks[0]
+    assert horarios["headings"] == ["CT Beach", "Horarios"]
+    assert horarios["content"].startswith("CT Beach > Horarios\n\n")
+    # subtitulo abaixo do nivel de corte fica no texto do mesmo chunk
+    assert "### Sabado\nDas 8h as 12h." in horarios["content"]
+
+
+def test_each_faq_pair_is_its_own_chunk():
+    faq = [chunk for chunk in chunk_markdown(DOC) if chunk["headings"] == ["CT Beach", "FAQ"]]
+    assert len(faq) == 2
+    assert faq[0]["content"].endswith("**Posso levar acompanhante?**\nSim, acompanhantes sao bem-vindos.")
+    assert faq[1]["content"].endswith("**Tem estacionamento?**\nSim, gratuito.")
+
+
+def test_long_list_splits_between_items_with_overlap():
+    items = "\n".join(f"- Item {idx:02d} " + "x" * 30 for idx in range(10))
+    chunks = chunk_markdown(f"## Planos\n\n{items}\n", max_chars=120, overlap=45)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        body = chunk["content"].split("\n\n", 1)[1]
+        # nenhum item cortado no meio
+        assert all(line.startswith("- Item ") and line.endswith("x" * 30) for line in body.split("\n"))
+    first_last = chunks[0]["content"].split("\n")[-1]
+    assert chunks[1]["content"].split("\n\n", 1)[1].startswith(first_last)
+
+
+def test_oversized_paragraph_is_wrapped():
+    chunks = chunk_markdown("palavra " * 100, max_chars=200)
+    assert len(chunks) > 1
+    assert all(len(chunk["content"]) <= 200 for chunk in chunks)
+    assert all(chunk["headings"] == [] for chunk in chunks)
@@ -0,0 +1,77 @@
+"""Prazo do turno e tentativa paralela (hedge)."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from beachbot.core.deadline import TurnDeadline, TurnDeadlineExceeded
+
+
+def _attempt(delay: float, label: str, calls: list[tuple[str, object]], cancelled: list[str]):
+    async def run(model):
+        calls.append((label, model))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(label)
+            raise
+        return label
+
+    return run
+
+
+def test_fast_turn_has_no_hedge():
+    deadline = TurnDeadline(turn_seconds=1, hedge_after=0.05)
+    calls: list = []
+    assert asyncio.run(deadline.run(_attempt(0, "primary", calls, []))) == "primary"
+    assert calls == [("primary", None)]
+    assert deadline.stats.hedges == 0
+
+
+def test_slow_turn_hedges_with_hedge_attempt_and_cancels_loser():
+    deadline = TurnDeadline(turn_seconds=1, hedge_after=0.02, hedge_model="rapido")
+    calls: list = []
+    cancelled: list = []
+
+    async def scenario():
+        result = await deadline.run(
+            _attempt(0.5, "primary", calls, cancelled),
+            hedge_attempt=_attempt(0.01, "hedge", calls, cancelled),
+        )
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == "hedge"
+    assert calls == [("primary", None), ("hedge", "rapido")]
+    assert cancelled == ["primary"]
+    assert deadline.stats.hedges == 1 and deadline.stats.hedge_wins == 1
+
+
+def test_no_hedge_when_caller_forbids_it():
+    deadline = TurnDeadline(turn_seconds=0.1, hedge_after=0.01)
+    calls: list = []
+    with pytest.raises(TurnDeadlineExceeded):
+        asyncio.run(deadline.run(_attempt(1, "primary", calls, []), hedge=False))
+    assert calls == [("primary", None)]
+    assert deadline.stats.deadline_hits == 1
+
+
+def test_error_is_raised_when_all_attempts_fail():
+    deadline = TurnDeadline(turn_seconds=1, hedge_after=0.5)
+
+    async def broken(model):
+        raise RuntimeError("api fora")
+
+    with pytest.raises(RuntimeError, match="api fora"):
+        asyncio.run(deadline.run(broken))
+
+
+def test_hedge_after_uses_p95_with_floor():
+    deadline = TurnDeadline(turn_seconds=60, hedge_min=4)
+    assert deadline.hedge_after() == 30
+    deadline.stats.recent_durations.extend([1.0] * 19 + [10.0] * 5)
+    assert deadline.hedge_after() == 10.0
+    deadline.stats.recent_durations.clear()
+    deadline.stats.recent_durations.extend([1.0] * 30)
+    assert deadline.hedge_after() == 4
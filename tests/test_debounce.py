@@ -0,0 +1,88 @@
+"""Debounce por conversa e janela adaptativa."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from beachbot.core.debounce import AdaptiveWindow, DebounceScheduler
+
+
+def _stamps(*gaps: float) -> list[datetime]:
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    stamps = [ts]
+    for gap in gaps:
+        ts += timedelta(seconds=gap)
+        stamps.append(ts)
+    return stamps
+
+
+def test_burst_fires_once_with_total_count():
+    async def scenario():
+        scheduler = DebounceScheduler(0.05)
+        first = asyncio.create_task(scheduler.wait("c1"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(scheduler.wait("c1"))
+        await asyncio.sleep(0.01)
+        third = asyncio.create_task(scheduler.wait("c1"))
+        return await asyncio.gather(first, second, third), scheduler
+
+    results, scheduler = asyncio.run(scenario())
+    assert results == [0, 0, 3]
+    assert scheduler.stats.turns == 1
+    assert scheduler.stats.merged == 2
+    assert scheduler.pending() == 0
+
+
+def test_conversations_are_independent():
+    async def scenario():
+        scheduler = DebounceScheduler(0.02)
+        return await asyncio.gather(scheduler.wait("a"), scheduler.wait("b"))
+
+    assert asyncio.run(scenario()) == [1, 1]
+
+
+def test_timer_restarts_on_each_message():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        scheduler = DebounceScheduler(0.05)
+        started = loop.time()
+        first = asyncio.create_task(scheduler.wait("c1"))
+        await asyncio.sleep(0.03)
+        batch = await scheduler.wait("c1")
+        return batch, loop.time() - started, await first
+
+    batch, elapsed, first = asyncio.run(scenario())
+    assert (batch, first) == (2, 0)
+    assert elapsed >= 0.075
+
+
+def test_cancelled_wait_frees_the_slot():
+    async def scenario():
+        scheduler = DebounceScheduler(10)
+        task = asyncio.create_task(scheduler.wait("c1"))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return scheduler.pending()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_adaptive_window_defaults_for_new_sender():
+    window = AdaptiveWindow(min_seconds=3, max_seconds=15, default_seconds=15)
+    assert window.compute([]) == 15
+    assert window.compute(_stamps(60)) == 15
+
+
+def test_adaptive_window_minimum_for_single_message_senders():
+    window = AdaptiveWindow(min_seconds=3, max_seconds=15, default_seconds=15)
+    assert window.compute(_stamps(600, 900, 1200, 3600)) == 3
+
+
+def test_adaptive_window_follows_burst_cadence():
+    window = AdaptiveWindow(min_seconds=3, max_seconds=15, default_seconds=15, factor=2)
+    # rajadas com ~2 s entre mensagens e a atual chegando 2 s depois da anterior
+    assert window.compute(_stamps(2, 2, 2, 2)) == 4
+    # rajada em andamento mais lenta que o historico: janela cobre o intervalo atual
+    assert window.compute(_stamps(2, 2, 2, 5)) == 10
+    assert window.compute(_stamps(2, 2, 2, 14)) == 15
@@ -0,0 +1,118 @@
+"""Turno completo do handler com storage em memoria: cache de respostas do Knowledge Agent."""
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import pytest
+
+pytest.importorskip("agents")
+pytest.importorskip("atendentepro")
+
+from beachbot.core import handler as handler_module  # noqa: E402
+from beachbot.core.answer_cache import AnswerCache  # noqa: E402
+from beachbot.network import TurnResult  # noqa: E402
+
+
+class MemoryStorage:
+    """Mesmas funcoes de `async_db` usadas pelo handler, com uma conversa por remetente."""
+
+    def __init__(self) -> None:
+        self.conversations: dict[str, int] = {}
+        self.messages: dict[int, list[dict[str, Any]]] = {}
+        self.latencies: list[dict[str, Any]] = []
+        self._next_id = 0
+
+    def has_engine(self) -> bool:
+        return True
+
+    def get_session(self):
+        class _Session:
+            async def __aenter__(self):
+                return None
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Session()
+
+    def _append(self, convo_id: int, role: str, text: str) -> int:
+        self._next_id += 1
+        self.messages.setdefault(convo_id, []).append({"id": self._next_id, "role": role, "content": text})
+        return self._next_id
+
+    async def ingest_message(self, session, instance_id, sender, text, *, ts, wa_message_id=None):
+        convo_id = self.conversations.setdefault(sender, len(self.conversations) + 1)
+        return convo_id, convo_id, self._append(convo_id, "user", text)
+
+    async def fetch_recent_user_timestamps(self, session, client_id, limit=20):
+        return []
+
+    async def get_conversation_summary(self, session, conversation_id):
+        return None, None
+
+    async def fetch_last_messages(self, session, conversation_id, limit=20, *, with_ids=False):
+        return [dict(m) for m in self.messages.get(conversation_id, [])[-limit:]]
+
+    async def fetch_messages_after(self, session, conversation_id, after_id, limit=None):
+        return [dict(m) for m in self.messages.get(conversation_id, []) if after_id is None or m["id"] > after_id][:limit]
+
+    async def save_message(self, session, conversation_id, *, role, direction, text, ts, wa_message_id=None):
+        return SimpleNamespace(id=self._append(conversation_id, role, text))
+
+    async def touch_client_last_seen(self, session, client_id, ts):
+        return None
+
+    async def save_turn_latency(self, session, **fields):
+        self.latencies.append(fields)
+
+
+async def _embed(text: str) -> list[float]:
+    # "horarios" em qualquer forma cai no mesmo vetor; o resto fica ortogonal
+    return [1.0, 0.0] if "horario" in text else [0.0, 1.0]
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "postgresql://memoria")
+    monkeypatch.setenv("BUFFER_WINDOW_SECONDS", "0.01")
+    monkeypatch.setenv("BUFFER_MIN_SECONDS", "0")
+    monkeypatch.setenv("PRESENCE_ENABLED", "false")
+    monkeypatch.setenv("TURN_STREAMING", "false")
+    storage = MemoryStorage()
+    monkeypatch.setattr(handler_module, "storage", storage)
+    monkeypatch.setattr(handler_module, "history_cache", None)
+    runs: list[list[dict[str, str]]] = []
+
+    async def run_turn_detailed(network, messages, *, start_agent=None, model=None, handoffs=True):
+        runs.append(list(messages))
+        return TurnResult("Funcionamos de segunda a sexta, das 6h as 22h.", handler_module.KNOWLEDGE_AGENT)
+
+    monkeypatch.setattr(handler_module, "run_turn_detailed", run_turn_detailed)
+    handler = handler_module.MessageHandler(network=SimpleNamespace())
+    handler.answer_cache = AnswerCache(_embed, kb_path=None)
+    handler.storage, handler.runs = storage, runs
+    return handler
+
+
+def _say(handler, sender: str, *texts: str) -> list[Optional[str]]:
+    async def scenario():
+        replies = []
+        for text in texts:
+            replies.append(await handler.handle_message(sender, text, instance_id="inst"))
+        return replies
+
+    return asyncio.run(scenario())
+
+
+def test_faq_after_greeting_is_answered_from_cache(handler):
+    _say(handler, "5511900000001", "Quais os horarios?")
+    assert len(handler.runs) == 1
+
+    # outra conversa: cumprimenta, recebe a saudacao do bot e faz a mesma pergunta
+    replies = _say(handler, "5511900000002", "Oi, boa tarde!", "Quais os horários?")
+    assert len(handler.runs) == 2
+    assert replies[-1] == "Funcionamos de segunda a sexta, das 6h as 22h."
+    assert handler.answer_cache.stats.hits == 1
+    assert handler.storage.latencies[-1]["agent_path"] == "cache"
@@ -0,0 +1,164 @@
+"""Historico por orcamento de tokens com resumo atualizado fora do caminho da resposta."""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Optional
+
+from beachbot.core.history import (
+    SUMMARY_PREFIX,
+    HistoryBudget,
+    SummaryRefresher,
+    build_history,
+    refresh_summary,
+)
+
+
+class MemoryStorage:
+    """Storage em memoria com a mesma interface usada por `build_history`."""
+
+    def __init__(self, messages: list[dict[str, Any]]) -> None:
+        self.messages = messages
+        self.summary: Optional[str] = None
+        self.until_id: Optional[int] = None
+        self.after_calls = 0
+
+    async def fetch_last_messages(self, session, conversation_id, limit=20, *, with_ids=False):
+        return [dict(m) for m in self.messages[-limit:]]
+
+    async def fetch_messages_after(self, session, conversation_id, after_id, limit=None):
+        self.after_calls += 1
+        return [dict(m) for m in self.messages if after_id is None or m["id"] > after_id][:limit]
+
+    async def get_conversation_summary(self, session, conversation_id):
+        return self.summary, self.until_id
+
+    async def save_conversation_summary(self, session, conversation_id, summary, *, until_id, previous_until_id):
+        if self.until_id != previous_until_id:
+            return False
+        self.summary, self.until_id = summary, until_id
+        return True
+
+    def get_session(self):
+        storage = self
+
+        class _Session:
+            async def __aenter__(self):
+                return storage
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Session()
+
+
+def _conversation(count: int, size: int = 40) -> list[dict[str, Any]]:
+    roles = ("user", "assistant")
+    return [{"id": idx, "role": roles[idx % 2], "content": f"{idx:03d} " + "x" * size} for idx in range(1, count + 1)]
+
+
+def test_short_conversation_goes_verbatim_without_summary():
+    storage = MemoryStorage(_conversation(4))
+    turn = asyncio.run(build_history(storage, None, 1, budget=HistoryBudget(max_tokens=1000)))
+    assert [m["content"][:3] for m in turn.messages] == ["001", "002", "003", "004"]
+    assert turn.pending_summary is None
+
+
+def test_dropped_messages_stay_verbatim_until_summarized():
+    storage = MemoryStorage(_conversation(10))
+    budget = HistoryBudget(max_tokens=60, max_messages=60)
+    turn = asyncio.run(build_history(storage, None, 1, budget=budget))
+    # nada se perde no turno: as que sairam do orcamento vao na integra
+    assert len(turn.messages) == 10
+    pending = turn.pending_summary
+    assert pending is not None and [m["id"] for m in pending.dropped] == list(range(1, 7))
+
+    async def summarize(summary, messages):
+        return f"resumo de {len(messages)}"
+
+    assert asyncio.run(refresh_summary(storage, None, pending, summarize)) is True
+    after = asyncio.run(build_history(storage, None, 1, budget=budget))
+    assert after.messages[0] == {"role": "system", "content": SUMMARY_PREFIX + "resumo de 6"}
+    assert [m["content"][:3] for m in after.messages[1:]] == ["007", "008", "009", "010"]
+    assert after.pending_summary is None
+
+
+def test_lost_summary_race_keeps_messages_in_history():
+    storage = MemoryStorage(_conversation(10))
+    budget = HistoryBudget(max_tokens=60)
+    pending = asyncio.run(build_history(storage, None, 1, budget=budget)).pending_summary
+    # outro worker avancou o resumo ate a mensagem 2 no meio do caminho
+    storage.summary, storage.until_id = "resumo do outro worker", 2
+
+    async def summarize(summary, messages):
+        return "resumo perdido"
+
+    assert asyncio.run(refresh_summary(storage, None, pending, summarize)) is False
+    turn = asyncio.run(build_history(storage, None, 1, budget=budget))
+    assert turn.messages[0]["content"] == SUMMARY_PREFIX + "resumo do outro worker"
+    assert [m["content"][:3] for m in turn.messages[1:]] == [f"{idx:03d}" for idx in range(3, 11)]
+
+
+def test_summary_behind_window_sends_only_the_window():
+    storage = MemoryStorage(_conversation(100))
+    storage.summary, storage.until_id = "resumo antigo", 10
+    turn = asyncio.run(build_history(storage, None, 1, budget=HistoryBudget(max_tokens=60, max_messages=60)))
+    assert storage.after_calls == 1
+    # na integra so as 60 ultimas; o resumo avanca pelo lote mais antigo ainda nao resumido
+    assert len(turn.messages) == 1 + 60
+    assert turn.messages[1]["content"][:3] == "041"
+    assert [m["id"] for m in turn.pending_summary.dropped] == list(range(11, 71))
+
+
+def test_long_conversation_without_summary_is_capped_and_caught_up_in_batches():
+    storage = MemoryStorage(_conversation(500))
+    budget = HistoryBudget(max_tokens=60, max_messages=20)
+
+    async def summarize(summary, messages):
+        return f"{summary or ''}+{len(messages)}"
+
+    async def scenario():
+        sizes = []
+        for _ in range(30):
+            turn = await build_history(storage, None, 1, budget=budget)
+            sizes.append(len(turn.messages))
+            if turn.pending_summary is None:
+                break
+            await refresh_summary(storage, None, turn.pending_summary, summarize)
+        return sizes
+
+    sizes = asyncio.run(scenario())
+    assert max(sizes) <= 1 + 20
+    # lotes de 20 ate alcancar a janela; depois so o que saiu do orcamento
+    assert storage.until_id == 496
+    assert storage.summary.count("+20") == 24
+
+
+def test_window_covering_summary_uses_cache_only():
+    storage = MemoryStorage(_conversation(100))
+    storage.summary, storage.until_id = "resumo", 90
+    turn = asyncio.run(build_history(storage, None, 1, budget=HistoryBudget(max_tokens=1000, max_messages=60)))
+    assert storage.after_calls == 0
+    assert [m["content"][:3] for m in turn.messages[1:]] == [f"{idx:03d}" for idx in range(91, 101)]
+
+
+def test_refresher_runs_once_per_conversation():
+    storage = MemoryStorage(_conversation(10))
+    calls: list[int] = []
+
+    async def summarize(summary, messages):
+        calls.append(len(messages))
+        await asyncio.sleep(0.01)
+        return "resumo"
+
+    async def scenario():
+        refresher = SummaryRefresher(storage, summarize)
+        pending = (await build_history(storage, None, 1, budget=HistoryBudget(max_tokens=60))).pending_summary
+        refresher.schedule(pending)
+        refresher.schedule(pending)
+        await refresher.drain()
+        return refresher
+
+    refresher = asyncio.run(scenario())
+    assert calls == [6]
+    assert refresher.stats.snapshot() == {"scheduled": 1, "saved": 1, "conflicts": 0, "failures": 0, "skipped": 1}
+    assert storage.until_id == 6
@@ -0,0 +1,69 @@
+"""Cache write-through das janelas de historico por conversa."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from beachbot.storage.history_cache import HistoryCache
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _msgs(*texts: str) -> list[dict[str, str]]:
+    return [{"role": "user", "content": text} for text in texts]
+
+
+def test_hit_only_when_version_matches():
+    cache = HistoryCache(window=10)
+    cache.put(1, _msgs("a", "b"), T0, exhaustive=True)
+    assert cache.get(1, 5, T0) == _msgs("a", "b")
+    # outro processo escreveu na conversa: versao do banco mudou
+    assert cache.get(1, 5, T0 + timedelta(seconds=1)) is None
+    assert not cache.has(1)
+    assert cache.stats.snapshot()["invalidations"] == 1
+
+
+def test_append_extends_window_when_previous_version_matches():
+    cache = HistoryCache(window=10)
+    t1 = T0 + timedelta(seconds=1)
+    cache.put(1, _msgs("a"), T0, exhaustive=True)
+    cache.append(1, _msgs("b"), previous_version=T0, version=t1)
+    assert cache.get(1, 5, t1) == _msgs("a", "b")
+
+
+def test_append_drops_window_on_version_gap():
+    cache = HistoryCache(window=10)
+    cache.put(1, _msgs("a"), T0, exhaustive=True)
+    # a escrita anterior (de outro worker) nao passou por este cache
+    cache.append(1, _msgs("c"), previous_version=T0 + timedelta(seconds=1), version=T0 + timedelta(seconds=2))
+    assert not cache.has(1)
+
+
+def test_partial_window_misses_for_larger_limit():
+    cache = HistoryCache(window=3)
+    cache.put(1, _msgs("a", "b", "c"), T0, exhaustive=False)
+    assert cache.get(1, 2, T0) == _msgs("b", "c")
+    assert cache.get(1, 5, T0) is None
+
+
+def test_window_overflow_marks_window_partial():
+    cache = HistoryCache(window=2)
+    t1 = T0 + timedelta(seconds=1)
+    cache.put(1, _msgs("a", "b"), T0, exhaustive=True)
+    cache.append(1, _msgs("c"), previous_version=T0, version=t1)
+    assert cache.get(1, 2, t1) == _msgs("b", "c")
+    assert cache.get(1, 3, t1) is None
+
+
+def test_lru_eviction():
+    cache = HistoryCache(max_conversations=2, window=5)
+    for convo_id in (1, 2, 3):
+        cache.put(convo_id, _msgs("x"), T0, exhaustive=True)
+    assert not cache.has(1) and cache.has(2) and cache.has(3)
+    assert cache.stats.evictions == 1
+
+
+def test_returned_messages_are_copies():
+    cache = HistoryCache(window=5)
+    cache.put(1, _msgs("a"), T0, exhaustive=True)
+    cache.get(1, 1, T0)[0]["content"] = "mudou"
+    assert cache.get(1, 1, T0) == _msgs("a")
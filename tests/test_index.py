@@ -0,0 +1,94 @@
+"""Indice de embeddings: representacoes compactas, busca em blocos e re-score."""
+from __future__ import annotations
+
+import pickle
+
+import numpy as np
+import pytest
+
+from beachbot.rag.index import EmbeddingIndex
+from beachbot.rag.retriever import KnowledgeSnapshot, index_version
+
+
+def _index(rows: int = 50, dims: int = 16, seed: int = 0) -> EmbeddingIndex:
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((rows, dims)).astype(np.float32)
+    return EmbeddingIndex.from_embeddings(embeddings, [{"id": idx} for idx in range(rows)], model="m")
+
+
+def _query(index: EmbeddingIndex, row: int, seed: int = 1) -> np.ndarray:
+    noise = np.random.default_rng(seed).standard_normal(index.dim).astype(np.float32) * 0.1
+    return np.asarray(index.vectors[row], dtype=np.float32) + noise
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_blockwise_scores_match_whole_matrix(dtype):
+    base = _index()
+    compact = base.compact(dtype=dtype, keep_full=False)
+    query = _query(base, 7)
+    expected = np.asarray(compact.vectors, dtype=np.float32) @ (query / np.linalg.norm(query))
+    if compact.scales is not None:
+        expected = expected * compact.scales
+    blocked = EmbeddingIndex(compact.vectors, compact.chunks, scales=compact.scales, block_rows=7)
+    np.testing.assert_allclose(blocked.scores(query), expected, rtol=1e-5, atol=1e-6)
+    assert blocked.search(query, k=1)[0].chunk == {"id": 7}
+
+
+def test_scratch_memory_is_bounded_by_block():
+    compact = _index(rows=50, dims=16).compact(dtype="int8", keep_full=False)
+    compact.block_rows = 10
+    assert compact.scratch_nbytes == 50 * 4 + 10 * 16 * 4
+    assert compact.nbytes == 50 * 16 + 50 * 4
+
+
+def test_rescore_uses_exact_scores_for_candidates():
+    base = _index()
+    compact = base.compact(dims=8, dtype="int8")
+    compact.rescore = 5
+    query = _query(base, 3)
+    scores = compact.scores(query)
+    exact = base.scores(query)
+    # nao-candidatos ficam limitados ao menor score re-pontuado (empate no 5o lugar)
+    top = np.argsort(-scores)[:4]
+    np.testing.assert_allclose(scores[top], exact[top], rtol=1e-5)
+    assert np.count_nonzero(scores > scores[top[-1]]) == 3
+    assert int(top[0]) == 3
+
+
+def test_save_and_load_compact_index(tmp_path):
+    compact = _index().compact(dims=8, dtype="int8")
+    compact.save(tmp_path / "kb.pkl")
+    loaded = EmbeddingIndex.load(tmp_path / "kb.pkl")
+    assert isinstance(loaded.vectors, np.memmap)
+    assert loaded.dtype == "int8" and loaded.dim == 8 and loaded.full is not None
+    query = _query(compact, 11)
+    np.testing.assert_allclose(loaded.scores(query), compact.scores(query), rtol=1e-6)
+
+
+def test_null_query_has_no_scores():
+    assert _index().scores(np.zeros(16, dtype=np.float32)) is None
+
+
+def test_legacy_pickle_is_loaded_when_npy_is_missing(tmp_path):
+    items = [
+        {"chunk": {"source": "horarios.md", "content": "Segunda a sexta das 6h as 22h."}, "embedding": [3.0, 4.0]},
+        {"chunk": {"source": "planos.md", "content": "Plano mensal e trimestral."}, "embedding": [0.0, 2.0]},
+    ]
+    path = tmp_path / "kb.pkl"
+    path.write_bytes(pickle.dumps(items))
+    loaded = EmbeddingIndex.load(path)
+    assert loaded.dtype == "float32" and loaded.dim == 2
+    np.testing.assert_allclose(loaded.vectors, [[0.6, 0.8], [0.0, 1.0]], rtol=1e-6)
+    assert loaded.search([0.0, 1.0], k=1)[0].chunk["source"] == "planos.md"
+    # versao do hot reload vem do arquivo legado; o BM25 e montado em memoria
+    assert index_version(path).startswith("pkl-")
+    snapshot = KnowledgeSnapshot.load(path)
+    assert int(np.argmax(snapshot.lexical.scores("plano trimestral"))) == 1
+    # build novo (.npy + .meta.json) passa a ter precedencia sobre o pickle
+    EmbeddingIndex.from_embeddings([[1.0, 0.0]], [{"content": "novo"}]).save(path)
+    assert len(EmbeddingIndex.load(path)) == 1 and not index_version(path).startswith("pkl-")
+
+
+def test_missing_index_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        EmbeddingIndex.load(tmp_path / "kb.pkl")
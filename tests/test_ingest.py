@@ -0,0 +1,128 @@
+"""Ingestao em uma ida ao banco (INGEST_SQL), inclusive com remetentes novos concorrentes."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from beachbot.storage import async_db
+from beachbot.utils.metrics import DB_SECONDS
+
+
+def _item(sender: str, body: str, message_id: str | None = None) -> SimpleNamespace:
+    return SimpleNamespace(instance_id="inst", sender=sender, text=body, message_id=message_id)
+
+
+def _count(lines: list[str], operation: str) -> int:
+    prefix = f'beachbot_db_seconds_count{{op="{operation}"}} '
+    return next((int(line[len(prefix):]) for line in lines if line.startswith(prefix)), 0)
+
+
+def test_ingest_creates_client_and_conversation_once(async_url):
+    async def scenario():
+        engine = create_async_engine(async_url)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            async with sessions() as session:
+                first = await async_db.ingest_message(session, "inst", "5511900000001", "oi", wa_message_id="w1")
+                again = await async_db.ingest_message(session, "inst", "5511900000001", "oi", wa_message_id="w1")
+                later = await async_db.ingest_message(session, "inst", "5511900000001", "tudo bem?")
+            return first, again, later
+        finally:
+            await engine.dispose()
+
+    before = DB_SECONDS.render()
+    first, again, later = asyncio.run(scenario())
+    after = DB_SECONDS.render()
+    assert first[2] is not None
+    # reentrega do webhook: mesma conversa, mensagem nao gravada de novo
+    assert again[:2] == first[:2] and again[2] is None
+    assert later[:2] == first[:2] and later[2] is not None
+    # cada ingestao de uma mensagem e observada uma vez so, como ingest_messages
+    assert _count(after, "ingest_messages") - _count(before, "ingest_messages") == 3
+    assert _count(after, "ingest_message") == 0
+
+
+def test_concurrent_first_burst_shares_one_open_conversation(async_url):
+    senders = [f"55219{idx:08d}" for idx in range(10)]
+
+    async def burst(sessions, sender: str) -> set[int]:
+        ts = datetime.now(timezone.utc)
+
+        async def one(idx: int) -> int:
+            async with sessions() as session:
+                _, convo_id, message_id = await async_db.ingest_message(
+                    session, "inst", sender, f"msg {idx}", ts=ts + timedelta(milliseconds=idx), wa_message_id=f"{sender}-{idx}"
+                )
+                assert message_id is not None
+                return convo_id
+
+        return set(await asyncio.gather(*(one(idx) for idx in range(4))))
+
+    async def scenario():
+        engine = create_async_engine(async_url, pool_size=8)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            conversations = [await burst(sessions, sender) for sender in senders]
+            async with sessions() as session:
+                counts = (
+                    await session.execute(
+                        text(
+                            "SELECT c.phone, count(cv.id) AS open_convs, "
+                            "(SELECT count(*) FROM messages m JOIN conversations x ON x.id = m.conversation_id "
+                            " WHERE x.client_id = c.id) AS messages "
+                            "FROM clients c JOIN conversations cv ON cv.client_id = c.id AND cv.status = 'open' "
+                            "WHERE c.phone = ANY(:phones) GROUP BY c.id, c.phone"
+                        ),
+                        {"phones": senders},
+                    )
+                ).all()
+            return conversations, counts
+        finally:
+            await engine.dispose()
+
+    conversations, counts = asyncio.run(scenario())
+    assert all(len(ids) == 1 for ids in conversations)
+    assert len(counts) == len(senders)
+    assert all(row.open_convs == 1 and row.messages == 4 for row in counts)
+
+
+def test_concurrent_ingest_into_open_conversation_does_not_deadlock(async_url):
+    sender = "5531977000001"
+
+    async def scenario():
+        engine = create_async_engine(async_url, pool_size=8)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+        async def one(idx: int) -> int:
+            async with sessions() as session:
+                _, convo_id, message_id = await async_db.ingest_message(
+                    session, "inst", sender, f"msg {idx}", wa_message_id=f"dl-{idx}"
+                )
+                assert message_id is not None
+                return convo_id
+
+        try:
+            first = await one(0)
+            # rajadas na conversa ja aberta: todas inserem (KEY SHARE) e depois travam a conversa
+            results = []
+            for start in range(1, 81, 8):
+                results += await asyncio.gather(*(one(idx) for idx in range(start, start + 8)))
+            async with sessions() as session:
+                activity = (
+                    await session.execute(
+                        text("SELECT last_activity_at, (SELECT max(ts) FROM messages WHERE conversation_id = :id) "
+                             "FROM conversations WHERE id = :id"),
+                        {"id": first},
+                    )
+                ).one()
+            return first, set(results), activity
+        finally:
+            await engine.dispose()
+
+    first, conversations, activity = asyncio.run(scenario())
+    assert conversations == {first}
+    assert activity[0] == activity[1]
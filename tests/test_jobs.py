@@ -0,0 +1,93 @@
+"""Fila duravel inbound_jobs: deduplicacao, reserva, falha com retry e reservas vencidas."""
+from __future__ import annotations
+
+import asyncio
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from beachbot.storage import jobs
+from beachbot.storage.db import InboundJob, utcnow
+
+
+def test_queue_lifecycle(async_url):
+    sender = "5541900000001"
+
+    async def scenario():
+        engine = create_async_engine(async_url)
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            async with Session() as session:
+                first = await jobs.enqueue_inbound(session, instance_id="inst", sender=sender, text="a", wa_message_id="q-1")
+                again = await jobs.enqueue_inbound(session, instance_id="inst", sender=sender, text="a", wa_message_id="q-1")
+                second = await jobs.enqueue_inbound(session, instance_id="inst", sender=sender, text="b", wa_message_id="q-2")
+
+            # duas sessoes concorrentes nunca reservam o mesmo job
+            async with Session() as s1, Session() as s2:
+                claimed = await asyncio.gather(jobs.claim_sender_jobs(s1, "inst", sender), jobs.claim_sender_jobs(s2, "inst", sender))
+            ids = sorted(job.id for batch in claimed for job in batch)
+
+            async with Session() as session:
+                await jobs.complete_job(session, first)
+                await jobs.fail_job(session, second, "erro", retry_in=3600)
+                retried = (await session.execute(select(InboundJob).where(InboundJob.id == second))).scalar_one()
+                retried = (retried.status, retried.last_error)
+                retry_claim = await jobs.claim_sender_jobs(session, "inst", sender)
+
+                await session.execute(update(InboundJob).where(InboundJob.id == second).values(available_at=utcnow()))
+                await session.commit()
+                stale = await jobs.claim_sender_jobs(session, "inst", sender)
+                # reserva abandonada (worker caiu) volta para a fila
+                requeued = await jobs.requeue_stale_jobs(session, lease_seconds=-1)
+                final = (
+                    await session.execute(
+                        select(InboundJob).where(InboundJob.id == second).execution_options(populate_existing=True)
+                    )
+                ).scalar_one()
+                final = (final.status, final.locked_at, final.attempts)
+                # o banco e compartilhado: nao deixa job pendente para os testes do worker
+                await jobs.complete_job(session, second)
+            return first, again, second, ids, retried, retry_claim, stale, requeued, final
+        finally:
+            await engine.dispose()
+
+    first, again, second, ids, retried, retry_claim, stale, requeued, final = asyncio.run(scenario())
+    assert first is not None and again is None
+    assert ids == [first, second]
+    assert retried == ("pending", "erro")
+    # com retry_in o job so volta depois do intervalo, nem para quem drena o remetente
+    assert retry_claim == []
+    assert [job.id for job in stale] == [second]
+    assert requeued == (1, 0)
+    assert final == ("pending", None, 2)
+
+
+def test_stale_job_out_of_attempts_fails_instead_of_looping(async_url):
+    sender = "5541900000002"
+
+    async def scenario():
+        engine = create_async_engine(async_url)
+        Session = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            async with Session() as session:
+                job_id = await jobs.enqueue_inbound(session, instance_id="inst", sender=sender, text="x", wa_message_id="q-poison")
+                rounds = []
+                # cada reserva expira sem resposta: a mensagem trava o worker
+                for _ in range(3):
+                    claimed = await jobs.claim_sender_jobs(session, "inst", sender)
+                    rounds.append((len(claimed), await jobs.requeue_stale_jobs(session, lease_seconds=-1, max_attempts=3)))
+                row = (
+                    await session.execute(
+                        select(InboundJob).where(InboundJob.id == job_id).execution_options(populate_existing=True)
+                    )
+                ).scalar_one()
+                final = (row.status, row.attempts, row.last_error)
+                leftover = await jobs.claim_sender_jobs(session, "inst", sender)
+            return rounds, final, leftover
+        finally:
+            await engine.dispose()
+
+    rounds, final, leftover = asyncio.run(scenario())
+    assert rounds == [(1, (1, 0)), (1, (1, 0)), (1, (0, 1))]
+    assert final[:2] == ("failed", 3) and "3 tentativas" in final[2]
+    assert leftover == []
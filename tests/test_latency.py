@@ -0,0 +1,88 @@
+"""Registro de latencia por turno (turn_latency) e consulta do relatorio de percentis."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from beachbot.scripts.latency_report import latency_rows
+from beachbot.storage import async_db
+from beachbot.storage.db import TurnLatency
+
+T0 = datetime(2026, 1, 5, 12, 0, tzinfo=timezone.utc)
+
+
+def _turn(convo_id: int, *, agents: float, sent: bool, path: str, admitted: bool = True) -> dict:
+    started = T0 + timedelta(seconds=2)
+    admitted_at = started + timedelta(seconds=1) if admitted else None
+    ended = (admitted_at or started) + timedelta(seconds=agents)
+    return {
+        "conversation_id": convo_id,
+        "received_at": T0,
+        "debounce_fired_at": T0 + timedelta(seconds=1.5),
+        "turn_started_at": started,
+        "admitted_at": admitted_at,
+        "turn_ended_at": ended,
+        "sent_at": ended + timedelta(seconds=0.5) if sent else None,
+        "agent_path": path,
+        "inbound_count": 2,
+        "outcome": "answered",
+    }
+
+
+def test_save_turn_latency_and_report_percentiles(async_url, database_url):
+    async def record() -> int:
+        engine = create_async_engine(async_url)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            async with sessions() as session:
+                _, convo_id, _ = await async_db.ingest_message(session, "inst", "5531900000042", "oi")
+            turns = [
+                _turn(convo_id, agents=2.0, sent=True, path="Knowledge Agent"),
+                _turn(convo_id, agents=4.0, sent=True, path="Knowledge Agent"),
+                # envio nao confirmado: fica fora dos percentis de total, contado a parte
+                _turn(convo_id, agents=30.0, sent=False, path="Knowledge Agent"),
+                _turn(convo_id, agents=0.0, sent=True, path="cache", admitted=False),
+            ]
+            for fields in turns:
+                async with sessions() as session:
+                    await async_db.save_turn_latency(session, **fields)
+            return convo_id
+        finally:
+            await engine.dispose()
+
+    convo_id = asyncio.run(record())
+    engine = create_engine(database_url)
+    try:
+        with Session(engine) as session:
+            stored = session.scalars(
+                select(TurnLatency).where(TurnLatency.conversation_id == convo_id).order_by(TurnLatency.id)
+            ).all()
+            since = T0 - timedelta(minutes=1)
+            total = {
+                row.grp: row
+                for row in latency_rows(session, since=since, metric="total", group="path", tz="UTC", limit=10)
+            }
+            agents = {
+                row.grp: row
+                for row in latency_rows(session, since=since, metric="agents", group="path", tz="UTC", limit=10)
+            }
+            by_hour = latency_rows(session, since=since, metric="queue", group="hour", tz="UTC", limit=10)
+            session.execute(delete(TurnLatency).where(TurnLatency.conversation_id == convo_id))
+            session.commit()
+    finally:
+        engine.dispose()
+
+    assert len(stored) == 4 and stored[0].admitted_at == T0 + timedelta(seconds=3)
+    knowledge = total["Knowledge Agent"]
+    # total = 3 s ate a admissao + agentes + 0.5 s de envio; o turno sem envio nao entra
+    assert (knowledge.n, knowledge.unsent) == (2, 1)
+    assert knowledge.p50 == 6.5
+    # agentes contam a partir da admissao (sem historico/fila) e incluem o turno sem envio
+    assert agents["Knowledge Agent"].n == 3 and agents["Knowledge Agent"].p50 == 4.0
+    # resposta do cache nao passa pelos agentes
+    assert agents["cache"].n == 0 and agents["cache"].p50 is None
+    assert [(row.grp, row.n, row.p50) for row in by_hour] == [("2026-01-05 12:00", 4, 0.5)]
@@ -0,0 +1,71 @@
+"""BM25 com pesos pre-calculados e fusao com os scores vetoriais."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from beachbot.rag.lexical import LexicalIndex, fuse, minmax
+
+TEXTS = [
+    "Horarios de funcionamento: segunda a sexta das 6h as 22h.",
+    "Planos mensal, trimestral e semestral com valores diferentes.",
+    "Endereco do CT e estacionamento gratuito.",
+]
+
+
+def test_bm25_ranks_matching_chunk_first_with_light_stemming():
+    index = LexicalIndex.build(TEXTS)
+    scores = index.scores("qual o horario?")
+    assert int(np.argmax(scores)) == 0
+    assert scores[1] == 0 and scores[2] == 0
+    # "trimestrais" e "valor" casam com "trimestral" e "valores"
+    assert int(np.argmax(index.scores("planos trimestrais, qual o valor"))) == 1
+
+
+def test_no_matching_term_gives_zeros():
+    assert not LexicalIndex.build(TEXTS).scores("piscina aquecida").any()
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = LexicalIndex.build(TEXTS)
+    path = tmp_path / "kb.npy"
+    index.save(path)
+    loaded = LexicalIndex.load(path)
+    assert loaded.num_docs == 3
+    np.testing.assert_allclose(loaded.scores("estacionamento"), index.scores("estacionamento"), atol=1e-4)
+
+
+def test_minmax_spans_unit_interval():
+    np.testing.assert_allclose(minmax(np.array([0.78, 0.80, 0.82])), [0.0, 0.5, 1.0], atol=1e-6)
+    assert not minmax(np.array([0.5, 0.5])).any()
+
+
+def test_fuse_keeps_cosine_signal_in_narrow_band():
+    # cosseno favorece o chunk 0 (faixa estreita); o BM25 favorece o chunk 1.
+    # Com (cos + 1) / 2 e BM25 / max o chunk 1 vencia: 0.5 * 0.86 + 0.5 * 1 > 0.5 * 0.91 + 0.5 * 0.6
+    vector = np.array([0.82, 0.72, 0.70], dtype=np.float32)
+    lexical = np.array([3.0, 5.0, 0.0], dtype=np.float32)
+    fused = fuse(vector, lexical, 0.5)
+    assert int(np.argmax(fused)) == 0
+    np.testing.assert_allclose(fused, [0.5 * 1 + 0.5 * 0.6, 0.5 * (0.02 / 0.12) + 0.5 * 1, 0.0], atol=1e-5)
+
+
+def test_fuse_single_side_keeps_scores():
+    lexical = np.array([0.0, 2.0], dtype=np.float32)
+    vector = np.array([0.1, 0.3], dtype=np.float32)
+    assert fuse(None, lexical, 0.5) is lexical
+    assert fuse(vector, None, 0.5) is vector
+    with pytest.raises(ValueError):
+        fuse(None, None, 0.5)
+
+
+def test_load_or_build_rejects_sidecar_from_other_corpus(tmp_path):
+    path = tmp_path / "kb.npy"
+    LexicalIndex.build(TEXTS).save(path)
+    # mesma quantidade de chunks, conteudo editado (ex.: novo horario)
+    edited = [{"content": text} for text in TEXTS]
+    edited[0]["content"] = "Horarios de funcionamento: segunda a sabado das 7h as 23h, com piscina."
+    rebuilt = LexicalIndex.load_or_build(path, edited)
+    assert rebuilt.scores("piscina")[0] > 0
+    reused = LexicalIndex.load_or_build(path, [{"content": text} for text in TEXTS])
+    assert reused.corpus == LexicalIndex.load(path).corpus
@@ -0,0 +1,61 @@
+"""Renderizacao das metricas no formato texto do Prometheus."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from beachbot.utils.metrics import Registry, timed_async
+
+
+def test_counter_renders_sorted_series_with_escaped_labels():
+    registry = Registry()
+    turns = registry.counter("t_total", "Turnos.", ("outcome",))
+    turns.inc("error")
+    turns.inc("answered", amount=2)
+    turns.inc('com "aspas"')
+    assert registry.render() == (
+        "# HELP t_total Turnos.\n"
+        "# TYPE t_total counter\n"
+        't_total{outcome="answered"} 2\n'
+        't_total{outcome="com \\"aspas\\""} 1\n'
+        't_total{outcome="error"} 1\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    registry = Registry()
+    stage = registry.histogram("s_seconds", "Etapas.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        stage.observe(value, "agents")
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        's_seconds_bucket{stage="agents",le="0.1"} 2',
+        's_seconds_bucket{stage="agents",le="1"} 3',
+        's_seconds_bucket{stage="agents",le="+Inf"} 4',
+        's_seconds_sum{stage="agents"} 3.65',
+        's_seconds_count{stage="agents"} 4',
+    ]
+
+
+def test_unlabeled_metric_and_timers():
+    registry = Registry()
+    db = registry.histogram("db_seconds", "Banco.", buckets=(60.0,))
+    with db.time():
+        pass
+
+    @timed_async(db)
+    async def query() -> str:
+        return "ok"
+
+    assert asyncio.run(query()) == "ok"
+    rendered = registry.render()
+    assert 'db_seconds_bucket{le="60"} 2' in rendered
+    assert "db_seconds_count 2" in rendered
+
+
+def test_duplicate_metric_name_is_rejected():
+    registry = Registry()
+    registry.counter("x_total", "X.")
+    with pytest.raises(ValueError):
+        registry.histogram("x_total", "X.")
@@ -0,0 +1,77 @@
+"""Indicador "digitando..." e contagem de mensagens reenviadas."""
+from __future__ import annotations
+
+import asyncio
+
+from beachbot.core.presence import DuplicateTracker, PresenceStats, TypingIndicator
+
+
+def test_resent_message_counts_and_closes_duplicate_turn():
+    tracker = DuplicateTracker(window_seconds=60)
+    assert not tracker.observe(1, "Qual o horario de sabado?", busy=False)
+    tracker.turn_started(1)
+    assert tracker.observe(1, "qual o horário de sábado", busy=True)
+    tracker.turn_started(1)
+    snapshot = tracker.stats.snapshot()
+    assert snapshot["duplicates"] == 1 and snapshot["during_turn"] == 1
+    assert snapshot["duplicate_turns"] == 1
+
+
+def test_short_replies_are_not_resends():
+    tracker = DuplicateTracker(window_seconds=60)
+    for text in ("sim", "ok", "1", "sim", "Ok!", "1"):
+        assert not tracker.observe(1, text, busy=False)
+    tracker.turn_started(1)
+    snapshot = tracker.stats.snapshot()
+    assert snapshot["duplicates"] == 0 and snapshot["ignored"] == 6
+    assert snapshot["duplicate_turns"] == 0
+
+
+def test_interview_answers_are_not_resends():
+    tracker = DuplicateTracker(window_seconds=60)
+    assert not tracker.observe(1, "Joao da Silva", busy=False, interviewing=True)
+    assert not tracker.observe(1, "Joao da Silva", busy=False, interviewing=True)
+    assert tracker.stats.duplicates == 0
+
+
+def test_conversations_are_tracked_separately():
+    tracker = DuplicateTracker(window_seconds=60)
+    tracker.observe(1, "quero agendar aula", busy=False)
+    assert not tracker.observe(2, "quero agendar aula", busy=False)
+
+
+def test_typing_indicator_refreshes_survives_failures_and_stops():
+    calls: list[int] = []
+
+    async def presence() -> None:
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("evolution fora")
+
+    async def scenario() -> PresenceStats:
+        stats = PresenceStats()
+        typing = TypingIndicator(presence, refresh_seconds=0.01, stats=stats)
+        typing.start()
+        typing.start()
+        await asyncio.sleep(0.05)
+        await typing.stop()
+        count = len(calls)
+        await asyncio.sleep(0.03)
+        assert len(calls) == count
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats.started == 1
+    assert stats.failures == 1
+    assert stats.refreshes >= 2
+
+
+def test_typing_indicator_without_presence_is_noop():
+    async def scenario() -> PresenceStats:
+        stats = PresenceStats()
+        typing = TypingIndicator(None, refresh_seconds=0.01, stats=stats)
+        typing.start()
+        await typing.stop()
+        return stats
+
+    assert asyncio.run(scenario()).started == 0
@@ -0,0 +1,54 @@
+"""Cache LRU de embeddings de consultas com persistencia em .npz."""
+from __future__ import annotations
+
+import asyncio
+
+from beachbot.rag.query_cache import QueryEmbeddingCache, query_key
+
+
+def _saved(tmp_path, count: int, model: str = "m1"):
+    path = tmp_path / "queries.npz"
+    cache = QueryEmbeddingCache(max_entries=100, path=path)
+    cache.use_model(model)
+    for idx in range(count):
+        cache.put(f"pergunta {idx}", [float(idx), 1.0])
+    cache.save()
+    return path
+
+
+def test_wrap_embeds_once_per_normalized_query():
+    calls: list[str] = []
+
+    async def embedder(text: str) -> list[float]:
+        calls.append(text)
+        return [1.0, 0.0]
+
+    cache = QueryEmbeddingCache(max_entries=10)
+    embed = cache.wrap(embedder)
+    asyncio.run(embed("Qual o horário?"))
+    asyncio.run(embed("qual  o HORARIO?"))
+    assert calls == ["Qual o horário?"]
+    assert cache.stats.hits == 1 and cache.stats.misses == 1
+
+
+def test_reload_keeps_most_recent_entries(tmp_path):
+    path = _saved(tmp_path, 5)
+    cache = QueryEmbeddingCache(max_entries=2, path=path)
+    cache.use_model("m1")
+    assert cache.get(query_key("pergunta 4")) is not None
+    assert cache.get(query_key("pergunta 0")) is None
+    assert cache.snapshot()["entries"] == 2
+
+
+def test_disabled_cache_loads_nothing(tmp_path):
+    path = _saved(tmp_path, 5)
+    cache = QueryEmbeddingCache(max_entries=0, path=path)
+    cache.use_model("m1")
+    assert cache.snapshot()["entries"] == 0
+
+
+def test_other_model_file_is_ignored(tmp_path):
+    path = _saved(tmp_path, 3, model="m1")
+    cache = QueryEmbeddingCache(max_entries=10, path=path)
+    cache.use_model("m2")
+    assert cache.snapshot()["entries"] == 0
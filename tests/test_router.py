@@ -0,0 +1,78 @@
+"""Atalho de triagem por palavras-chave: so pula a triagem com casamento forte."""
+from __future__ import annotations
+
+import pytest
+import yaml
+
+from beachbot.core.router import TRIAGE_CONFIG_PATH, KeywordRouter
+
+
+@pytest.fixture
+def router(monkeypatch) -> KeywordRouter:
+    for name in ("KEYWORD_ROUTER_ENABLED", "KEYWORD_ROUTER_MIN_HITS", "KEYWORD_ROUTER_MARGIN"):
+        monkeypatch.delenv(name, raising=False)
+    return KeywordRouter.from_config()
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Fiz a aula experimental ontem",
+        "quero cancelar meu plano mensal",
+        "o ct estava cheio hoje",
+        "valeu, falo com o atendente depois",
+    ],
+)
+def test_single_generic_keyword_goes_to_triage(router, text):
+    decision = router.route(text)
+    assert decision.agent is None
+    assert decision.reason == "weak"
+
+
+def test_overlapping_keywords_count_once(router):
+    # "aula experimental" ocupa o trecho; "experimental" nao conta de novo
+    assert router.hits("quero a aula experimental") == {"Interview Agent": ["aula experimental"]}
+    assert router.route("quero a aula experimental").reason == "weak"
+
+
+def test_two_distinct_keywords_route(router):
+    decision = router.route("Quais os valores do plano mensal e do trimestral")
+    assert decision.agent == "Knowledge Agent"
+    assert decision.reason == "keyword"
+
+
+def test_interview_intent_routes(router):
+    decision = router.route("quero agendar uma aula experimental")
+    assert decision.agent == "Interview Agent"
+
+
+def test_booking_verbs_count_as_one_keyword(router):
+    # "agendar"/"marcar" sao do mesmo grupo: sozinhos nao pulam a triagem
+    assert router.route("quero agendar/marcar uma quadra").reason == "weak"
+    assert router.route("quero marcar uma aula experimental").agent == "Interview Agent"
+
+
+def test_router_only_keywords_stay_out_of_triage_config():
+    triage = yaml.safe_load(TRIAGE_CONFIG_PATH.read_text(encoding="utf-8"))
+    assert "agendar" not in triage["keywords"]["Interview Agent"]
+
+
+def test_competing_agent_needs_margin(router):
+    # 2 do Knowledge contra 1 do Escalation: vantagem insuficiente
+    decision = router.route("quero pagar o valor do plano mensal")
+    assert decision.agent is None
+    assert decision.reason == "ambiguous"
+
+
+def test_question_about_flow_agent_goes_to_triage(router):
+    decision = router.route("quanto custa agendar a aula experimental?")
+    assert decision.agent is None
+    assert decision.reason == "question"
+
+
+def test_stats_count_weak_matches(router):
+    router.stats.record(router.route("plano mensal"))
+    router.stats.record(router.route("horarios e valores"))
+    snapshot = router.stats.snapshot()
+    assert snapshot["weak"] == 1 and snapshot["routed"] == 1
+    assert snapshot["hit_rate"] == 0.5
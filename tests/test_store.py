@@ -0,0 +1,44 @@
+"""Store de embeddings por hash do conteudo do chunk."""
+from __future__ import annotations
+
+import numpy as np
+
+from beachbot.rag.store import ChunkStore, chunk_hash
+
+
+def test_round_trip_and_retain(tmp_path):
+    store = ChunkStore(tmp_path, "text-embedding-3-large")
+    store.put(chunk_hash("a"), [1.0, 0.0])
+    store.put(chunk_hash("b"), [0.0, 1.0])
+    store.save()
+
+    loaded = ChunkStore(tmp_path, "text-embedding-3-large")
+    assert len(loaded) == 2 and chunk_hash("a") in loaded
+    np.testing.assert_array_equal(loaded.get(chunk_hash("b")), [0.0, 1.0])
+    # "a" saiu da base
+    assert loaded.retain([chunk_hash("b")]) == 1
+    loaded.save()
+    assert chunk_hash("a") not in ChunkStore(tmp_path, "text-embedding-3-large")
+
+
+def test_models_never_share_vectors(tmp_path):
+    large = ChunkStore(tmp_path, "text-embedding-3-large")
+    large.put(chunk_hash("a"), [1.0, 0.0])
+    large.save()
+    assert len(ChunkStore(tmp_path, "text-embedding-3-small")) == 0
+    assert ChunkStore(tmp_path, "org/modelo:v1").vectors_path.name == "org_modelo_v1.npy"
+
+
+def test_inconsistent_files_start_empty(tmp_path):
+    store = ChunkStore(tmp_path, "m")
+    store.put(chunk_hash("a"), [1.0, 0.0])
+    store.put(chunk_hash("b"), [0.0, 1.0])
+    store.save()
+    # build interrompido entre os dois arquivos: hashes e matriz nao batem
+    store.keys_path.write_text('["%s"]' % chunk_hash("a"), encoding="utf-8")
+    assert len(ChunkStore(tmp_path, "m")) == 0
+
+
+def test_empty_store_saves(tmp_path):
+    ChunkStore(tmp_path, "m").save()
+    assert len(ChunkStore(tmp_path, "m")) == 0
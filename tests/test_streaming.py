@@ -0,0 +1,107 @@
+"""Entrega em paragrafos durante o turno: divisao dos deltas e restante da resposta final."""
+from __future__ import annotations
+
+import asyncio
+
+from beachbot.core.streaming import ParagraphSplitter, StreamStats, TurnClock, remainder, split_paragraphs
+
+ANSWER = (
+    "Temos aulas de segunda a sexta, das 6h as 22h, e aos sabados pela manha.\n\n"
+    "O plano mensal custa R$ 300 e o trimestral sai por R$ 810.\n\n"
+    "Quer agendar uma aula experimental?"
+)
+
+
+def _deltas(text: str, size: int = 7) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_paragraph_released_only_after_blank_line():
+    splitter = ParagraphSplitter(min_chars=10)
+    assert splitter.feed("Primeiro paragrafo") == []
+    assert splitter.feed(" completo.\n") == []
+    # linha "em branco" com espacos tambem separa
+    assert splitter.feed("  \nSegundo") == ["Primeiro paragrafo completo."]
+    assert splitter.feed(" ainda aberto") == []
+
+
+def test_short_paragraphs_are_joined_until_min_chars():
+    splitter = ParagraphSplitter(min_chars=40)
+    ready = splitter.feed("Oi!\n\nClaro, te explico os planos do CT agora mesmo.\n\nResto")
+    assert ready == ["Oi!\n\nClaro, te explico os planos do CT agora mesmo."]
+
+
+def test_reset_discards_partial_text():
+    splitter = ParagraphSplitter(min_chars=40)
+    splitter.feed("Oi!\n\nVou verificar")
+    splitter.reset()
+    assert splitter.feed(" outra coisa\n\n") == []
+
+
+def test_remainder_without_early_messages_is_whole_answer():
+    assert remainder(ANSWER, []) == (ANSWER, True)
+
+
+def test_remainder_skips_paragraphs_already_sent():
+    first, second, third = split_paragraphs(ANSWER)
+    assert remainder(ANSWER, [first]) == (f"{second}\n\n{third}", True)
+    # um envio pode juntar varios paragrafos curtos
+    assert remainder(ANSWER, [f"{first}\n\n{second}"]) == (third, True)
+    assert remainder(ANSWER, [first, second, third]) == ("", True)
+
+
+def test_remainder_ignores_text_written_before_a_tool_call():
+    first, second, third = split_paragraphs(ANSWER)
+    # "Vou consultar..." saiu antes da ferramenta e nao esta na resposta final
+    assert remainder(ANSWER, ["Vou consultar os horarios para voce.", first]) == (f"{second}\n\n{third}", False)
+    assert remainder(ANSWER, ["Outra resposta que foi descartada."]) == (ANSWER, False)
+
+
+def test_streamed_turn_delivers_answer_once_in_order():
+    # mesmo fluxo de run_turn_streamed: ate max_messages - 1 antecipadas, o restante no fim
+    async def scenario(max_messages: int) -> list[str]:
+        delivered: list[str] = []
+        clock = TurnClock()
+
+        async def deliver(text: str) -> bool:
+            delivered.append(text)
+            return True
+
+        send = clock.wrap(deliver)
+        splitter = ParagraphSplitter(min_chars=40)
+        sent: list[str] = []
+        for delta in _deltas(ANSWER):
+            for paragraph in splitter.feed(delta):
+                if len(sent) < max_messages - 1:
+                    sent.append(paragraph)
+                    await send(paragraph)
+        rest, matched = remainder(ANSWER, sent)
+        assert matched
+        if rest:
+            await send(rest)
+        assert clock.messages == len(delivered) and clock.acked_at is not None
+        return delivered
+
+    three = asyncio.run(scenario(3))
+    assert three == split_paragraphs(ANSWER)
+    two = asyncio.run(scenario(2))
+    assert len(two) == 2 and "\n\n".join(two) == ANSWER
+
+
+def test_unconfirmed_send_has_no_ack_and_stats_count_early_messages():
+    async def scenario() -> TurnClock:
+        clock = TurnClock()
+
+        async def refused(text: str) -> bool:
+            return False
+
+        await clock.wrap(refused)("oi")
+        return clock
+
+    clock = asyncio.run(scenario())
+    assert clock.first_sent_at is not None and clock.acked_at is None
+    stats = StreamStats()
+    clock.messages = 3
+    stats.record(clock, streamed=True)
+    stats.record(TurnClock(), streamed=False)
+    assert stats.snapshot()["turns"] == 1 and stats.early_messages == 2
@@ -0,0 +1,71 @@
+"""Fila duravel: desligamento do pool devolve os jobs em andamento na hora."""
+from __future__ import annotations
+
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from beachbot.storage import async_db, jobs
+from beachbot.storage.db import InboundJob
+from beachbot.webhook.worker import InboundWorkerPool
+
+
+def test_stop_returns_inflight_jobs_and_restart_replays_them(async_url, monkeypatch):
+    async def scenario():
+        engine = create_async_engine(async_url)
+        monkeypatch.setattr(async_db, "engine", engine)
+        monkeypatch.setattr(async_db, "SessionLocal", async_sessionmaker(engine, expire_on_commit=False))
+        try:
+            async with async_db.get_session() as session:
+                job_id = await jobs.enqueue_inbound(
+                    session, instance_id="inst", sender="5531900000001", text="oi", wa_message_id="stop-1"
+                )
+
+            started = asyncio.Event()
+            cancelled = asyncio.Event()
+
+            async def stuck(parsed, replay: bool) -> None:
+                started.set()
+                try:
+                    await asyncio.Event().wait()
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+
+            pool = InboundWorkerPool(stuck, concurrency=1, poll_interval=0.05, lease_seconds=300)
+            await pool.start()
+            await asyncio.wait_for(started.wait(), timeout=5)
+            await pool.stop()
+            async with async_db.get_session() as session:
+                after_stop = (await session.execute(select(InboundJob).where(InboundJob.id == job_id))).scalar_one()
+
+            # novo processo: o job volta sem esperar a reserva expirar, como replay
+            replays: list[bool] = []
+            done = asyncio.Event()
+
+            async def finish(parsed, replay: bool) -> None:
+                replays.append(replay)
+                done.set()
+
+            pool = InboundWorkerPool(finish, concurrency=1, poll_interval=0.05, lease_seconds=300)
+            await pool.start()
+            await asyncio.wait_for(done.wait(), timeout=5)
+            for _ in range(100):
+                async with async_db.get_session() as session:
+                    status = (await session.execute(select(InboundJob.status).where(InboundJob.id == job_id))).scalar_one()
+                if status == "done":
+                    break
+                await asyncio.sleep(0.05)
+            await pool.stop()
+            return after_stop, cancelled.is_set(), replays, status
+        finally:
+            await engine.dispose()
+
+    after_stop, cancelled, replays, status = asyncio.run(scenario())
+    assert after_stop.status == "pending"
+    assert after_stop.locked_at is None
+    assert after_stop.attempts == 1
+    assert cancelled
+    assert replays == [True]
+    assert status == "done"